@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import json
+import shutil
+import zipfile
+import hashlib
+import tempfile
+import fcntl
+from urllib import request
+
+
+def main(argv):
+	## default values
+	store_dir = os.path.join(os.path.abspath(os.getcwd()), ArtifactStore.NAME_DEFAULT_FOLDER)
+	add_path = None
+	name = None
+	sha3_256 = None
+	url = None
+	fetch = []
+	verify = False
+	allow_unverified = False
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"d:a:n:f:vh",["store-dir=","add=","name=","sha3-256=","url=",
+			"fetch=","verify","allow-unverified","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(ArtifactStore.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-d", "--store-dir"):
+			store_dir = os.path.abspath(arg)
+		elif opt in ("-a", "--add"):
+			add_path = os.path.abspath(arg)
+		elif opt in ("-n", "--name"):
+			name = arg
+		elif opt == "--sha3-256":
+			sha3_256 = arg.lower()
+		elif opt == "--url":
+			url = arg
+		elif opt in ("-f", "--fetch"):
+			if arg == "all":
+				fetch = ArtifactStore.get_known_names()
+			else:
+				fetch = arg.split(",")
+		elif opt in ("-v", "--verify"):
+			verify = True
+		elif opt == "--allow-unverified":
+			allow_unverified = True
+		else:
+			print (help_str())
+			sys.exit(ArtifactStore.EXIT_ERROR)
+
+	store = ArtifactStore(store_dir, allow_unverified=allow_unverified)
+	try:
+		if add_path is not None:
+			if name is None:
+				print("--add needs the --name of the artifact, e.g. " + get_sqlite_artifact_name("3.45.3"))
+				sys.exit(ArtifactStore.EXIT_ERROR)
+			store.add(name, add_path, sha3_256=sha3_256)
+		if len(fetch) > 1 and (sha3_256 is not None or url is not None):
+			print("--sha3-256 and --url belong to a single artifact to --fetch")
+			sys.exit(ArtifactStore.EXIT_ERROR)
+		for artifact in fetch:
+			if sha3_256 is not None or url is not None:
+				store.fetch(artifact, url=url, sha3_256=sha3_256)
+			else:
+				store.get(artifact)
+		if verify:
+			for artifact in store.get_names():
+				store.verify(artifact)
+	except ArtifactError as err:
+		print(str(err))
+		sys.exit(ArtifactStore.EXIT_ERROR)
+	store.print_index()
+
+
+## releases of the sqlite amalgamation that can be fetched by version.
+## sqlite.org publishes the SHA3-256 sum of each download next to it, a
+## download is fetched with that sum (--sha3-256), or unverified on request
+SQLITE_RELEASES = {
+	"3.16.2": "https://sqlite.org/2017/sqlite-amalgamation-3160200.zip",
+	"3.22.0": "https://sqlite.org/2018/sqlite-amalgamation-3220000.zip",
+	"3.31.1": "https://sqlite.org/2020/sqlite-amalgamation-3310100.zip",
+	"3.35.5": "https://sqlite.org/2021/sqlite-amalgamation-3350500.zip",
+	"3.39.4": "https://sqlite.org/2022/sqlite-amalgamation-3390400.zip",
+	"3.45.3": "https://sqlite.org/2024/sqlite-amalgamation-3450300.zip",
+}
+
+## the TPC-C benchmark, which has no releases and publishes no sums. By
+## default its master branch is fetched, a commit can be fetched with --url
+TPCC_ARTIFACT = "py-tpcc"
+URL_TPCC_ARCHIVE = "https://github.com/apavlo/py-tpcc/archive/{commit}.zip"
+TPCC_DEFAULT_COMMIT = "master"
+
+
+class ArtifactError(Exception):
+	""" an artifact is missing, or its archive does not match its checksum
+	or has no checksum to be verified against and is not allowed unverified """
+
+
+class ArtifactStore:
+	""" A folder of source archives, the sqlite amalgamations of several
+	versions and the py-tpcc bundle, each pinned to its SHA3-256 sum in an
+	index. An archive is downloaded at most once, when it is first asked
+	for, and only kept if it matches the sum it is fetched with. A store
+	that allows unverified downloads pins the sum of the first download
+	instead. From then on, and on nodes without network access that got a
+	copy of the folder, an archive is only read and verified against its
+	pinned sum. An archive that is added has to match the pinned sum of its
+	name, if there is one """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	JSON_INDENT = 4
+
+	NAME_DEFAULT_FOLDER = 'artifacts'
+	NAME_INDEX_FILE = 'artifacts.json'
+	NAME_LOCK_FILE = 'artifacts.lock'
+	## written into an extracted folder, names the archive it came from
+	NAME_STAMP_FILE = '.artifact-sha3-256'
+
+	SIZE_READ_BLOCK = 1 << 20
+
+	def __init__(self, store_dir, offline=False, allow_unverified=False):
+		self.store_dir = store_dir
+		## an offline store never downloads, missing artifacts are an error
+		self.offline = offline
+		## downloads without a sum to check are trusted and pinned
+		self.allow_unverified = allow_unverified
+		if not os.path.exists(self.store_dir):
+			os.makedirs(self.store_dir)
+		self.index_path = os.path.join(self.store_dir, ArtifactStore.NAME_INDEX_FILE)
+		self.lock_path = os.path.join(self.store_dir, ArtifactStore.NAME_LOCK_FILE)
+
+
+	@staticmethod
+	def get_known_names():
+		""" returns the names of all artifacts with a known download url """
+		return [get_sqlite_artifact_name(version) for version in sorted(SQLITE_RELEASES)] + [TPCC_ARTIFACT]
+
+	@staticmethod
+	def get_url(name):
+		""" returns the download url of an artifact, or None if it is not known """
+		if name == TPCC_ARTIFACT:
+			return URL_TPCC_ARCHIVE.format(commit=TPCC_DEFAULT_COMMIT)
+		for version, url in SQLITE_RELEASES.items():
+			if get_sqlite_artifact_name(version) == name:
+				return url
+		return None
+
+	def read_index(self):
+		if not os.path.isfile(self.index_path):
+			return {}
+		with open(self.index_path) as json_data:
+			return json.load(json_data)
+
+	def write_index(self, index):
+		tmp_path = self.index_path + ".tmp"
+		with open(tmp_path, 'w') as f:
+			f.write(json.dumps(index, indent=ArtifactStore.JSON_INDENT, sort_keys=True))
+		os.replace(tmp_path, self.index_path)
+
+	def get_names(self):
+		return sorted(self.read_index())
+
+	def add(self, name, path, url=None, sha3_256=None):
+		""" copies the archive at path into the store under name and pins
+		its checksum, after checking it against sha3_256. Returns the path
+		of the stored archive """
+		checksum = get_sha3_256(path)
+		if sha3_256 is not None and checksum != sha3_256:
+			raise ArtifactError("checksum of " + path + " is " + checksum + ", expected " + sha3_256)
+		with open(self.lock_path, 'a') as lock:
+			fcntl.flock(lock, fcntl.LOCK_EX)
+			index = self.read_index()
+			entry = index.get(name, {})
+			if entry.get("sha3_256", checksum) != checksum:
+				raise ArtifactError("checksum of " + path + " is " + checksum + ", but " + name +
+					" is pinned to " + entry["sha3_256"])
+			entry["file"] = name + os.path.splitext(path)[1]
+			entry["sha3_256"] = checksum
+			if url is not None:
+				entry["url"] = url
+			stored_path = os.path.join(self.store_dir, entry["file"])
+			if os.path.abspath(path) != os.path.abspath(stored_path):
+				shutil.copyfile(path, stored_path + ".tmp")
+				os.replace(stored_path + ".tmp", stored_path)
+			index[name] = entry
+			self.write_index(index)
+		print("stored " + name + " (sha3-256 " + checksum + ")")
+		return stored_path
+
+	def fetch(self, name, url=None, sha3_256=None):
+		""" downloads an artifact into the store. The download has to match
+		sha3_256 or the sum name is pinned to; without either of them
+		nothing is downloaded, unless the store allows unverified downloads """
+		entry = self.read_index().get(name, {})
+		if url is None:
+			url = entry.get("url", ArtifactStore.get_url(name))
+		if url is None:
+			raise ArtifactError("there is no url for " + name + ", fetch it with artifacts.py --fetch " + name +
+				" --url archive-url --sha3-256 sum or add its archive with artifacts.py --add")
+		if self.offline:
+			raise ArtifactError(name + " is not in the artifact store " + self.store_dir +
+				" and the store is offline. Fetch it on a machine with network access with " +
+				"artifacts.py --fetch " + name + " and copy the store, or add the archive with artifacts.py --add")
+		expected = sha3_256 or entry.get("sha3_256")
+		if expected is None and not self.allow_unverified:
+			raise ArtifactError("there is no SHA3-256 sum to verify a download of " + name + " against. " +
+				"Fetch it with artifacts.py --fetch " + name + " --sha3-256 sum, with the sum from the page " +
+				"it is published on, add an archive you trust with artifacts.py --add, or download it " +
+				"unverified with --allow-unverified")
+		if expected is None:
+			print("warning: " + name + " is downloaded without a checksum to verify it against, " +
+				"its first download is trusted and pinned")
+		print("downloading " + url)
+		with tempfile.TemporaryDirectory(dir=self.store_dir) as tmp_dir:
+			tmp_path = os.path.join(tmp_dir, os.path.basename(url))
+			try:
+				request.urlretrieve(url, tmp_path)
+			except OSError as err:
+				raise ArtifactError("could not download " + name + " from " + url + ": " + str(err))
+			return self.add(name, tmp_path, url=url, sha3_256=expected)
+
+	def get(self, name):
+		""" returns the path of the verified archive of an artifact, which
+		is downloaded if the store does not have it yet """
+		entry = self.read_index().get(name)
+		if entry is None or not os.path.isfile(os.path.join(self.store_dir, entry["file"])):
+			return self.fetch(name)
+		return self.verify(name)
+
+	def verify(self, name):
+		""" returns the path of the archive of an artifact after checking it
+		against its pinned checksum """
+		entry = self.read_index()[name]
+		path = os.path.join(self.store_dir, entry["file"])
+		checksum = get_sha3_256(path)
+		if checksum != entry["sha3_256"]:
+			raise ArtifactError("archive " + path + " is corrupt: its checksum is " + checksum +
+				", " + name + " is pinned to " + entry["sha3_256"])
+		return path
+
+	def extract(self, name, destination, expected_file):
+		""" extracts an artifact into the folder destination, unless it holds
+		the same archive already. The folder of the archive that contains
+		expected_file, a path relative to it, becomes destination """
+		path = self.get(name)
+		checksum = self.read_index()[name]["sha3_256"]
+		if get_stamp(destination) == checksum and os.path.exists(os.path.join(destination, expected_file)):
+			return destination
+		print("extracting " + name + " to " + destination)
+		parent = os.path.dirname(destination)
+		if not os.path.exists(parent):
+			os.makedirs(parent)
+		tmp_dir = tempfile.mkdtemp(dir=parent)
+		try:
+			with zipfile.ZipFile(path, 'r') as zip_ref:
+				zip_ref.extractall(tmp_dir)
+			root = find_root(tmp_dir, expected_file)
+			if root is None:
+				raise ArtifactError(name + " does not contain " + expected_file)
+			with open(os.path.join(root, ArtifactStore.NAME_STAMP_FILE), 'w') as f:
+				f.write(checksum)
+			if os.path.exists(destination):
+				shutil.rmtree(destination)
+			os.rename(root, destination)
+		finally:
+			shutil.rmtree(tmp_dir, ignore_errors=True)
+		return destination
+
+	def print_index(self):
+		index = self.read_index()
+		print("__ artifact store " + self.store_dir + " __")
+		for name in sorted(index):
+			print("{:<20} {:<40} {}".format(name, index[name]["file"], index[name]["sha3_256"]))
+
+
+def get_sqlite_artifact_name(version):
+	return "sqlite-" + version
+
+
+def get_sha3_256(path):
+	sha3_256 = hashlib.sha3_256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(ArtifactStore.SIZE_READ_BLOCK), b''):
+			sha3_256.update(block)
+	return sha3_256.hexdigest()
+
+
+def get_stamp(folder):
+	""" returns the checksum of the archive folder was extracted from, or None """
+	stamp_path = os.path.join(folder, ArtifactStore.NAME_STAMP_FILE)
+	if not os.path.isfile(stamp_path):
+		return None
+	with open(stamp_path) as f:
+		return f.read().strip()
+
+
+def find_root(folder, expected_file):
+	""" returns the shallowest folder below folder that contains expected_file """
+	for path, dirs, files in os.walk(folder):
+		dirs.sort()
+		if os.path.exists(os.path.join(path, expected_file)):
+			return path
+	return None
+
+
+def help_str():
+	return ("USAGE: artifacts.py [-d artifacts] [-a archive.zip -n sqlite-3.45.3 [--sha3-256 checksum]]\n"
+		"\t[-f sqlite-3.45.3,py-tpcc | -f all | -f py-tpcc --url archive-url --sha3-256 checksum] [-v]\n"
+		"\t[--allow-unverified]   fetch archives without a checksum and pin the sum of the download")
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
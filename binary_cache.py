@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import json
+import time
+import shutil
+import hashlib
+import platform
+import subprocess
+from locked_json import LockedJsonFile
+from build_modes import BUILD_MARCH
+
+
+def main(argv):
+	## default values
+	cache_dir = os.path.join(os.path.abspath(os.getcwd()), BinaryCache.NAME_DEFAULT_FOLDER)
+	show_stats = False
+	clear = False
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"d:sh",["cache-dir=","stats","help","clear"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(BinaryCache.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-d", "--cache-dir"):
+			cache_dir = os.path.abspath(arg)
+		elif opt in ("-s", "--stats"):
+			show_stats = True
+		elif opt == "--clear":
+			clear = True
+		else:
+			print (help_str())
+			sys.exit(BinaryCache.EXIT_ERROR)
+
+	cache = BinaryCache(cache_dir)
+	if clear:
+		cache.clear()
+	if show_stats or not clear:
+		cache.print_stats()
+
+
+class BinaryCache:
+	""" A persistent, content-addressed store of compiled sqlite3 binaries.
+	Binaries are keyed by the compile features, the amalgamation version and
+	the compiler identity, binaries built for the native cpu also by the cpu
+	of the host, and evicted least recently used first once the
+	cache grows beyond its size limit """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	JSON_INDENT = 4
+
+	NAME_DEFAULT_FOLDER = 'binary-cache'
+	NAME_INDEX_FILE = 'index.json'
+	NAME_LOCK_FILE = 'index.lock'
+	NAME_ENTRIES_FOLDER = 'entries'
+
+	DEFAULT_MAX_SIZE_MB = 2048
+
+
+	def __init__(self, cache_dir, max_size_mb=DEFAULT_MAX_SIZE_MB):
+		self.cache_dir = cache_dir
+		self.max_size = int(max_size_mb * 1024 * 1024)
+		self.index_path = os.path.join(self.cache_dir, BinaryCache.NAME_INDEX_FILE)
+		self.lock_path = os.path.join(self.cache_dir, BinaryCache.NAME_LOCK_FILE)
+		self.entries_path = os.path.join(self.cache_dir, BinaryCache.NAME_ENTRIES_FOLDER)
+		self.compiler_ids = {}
+
+		if not os.path.exists(self.entries_path):
+			os.makedirs(self.entries_path, exist_ok=True)
+
+
+	def get_key(self, features, source_version, compile_command):
+		""" returns a stable hash for a features dict built from a given
+		amalgamation version with the compiler used in compile_command """
+		key_content = {}
+		key_content["features"] = features
+		key_content["source_version"] = source_version
+		key_content["compiler"] = self.get_compiler_id(compile_command)
+		## a cache shared between hosts must not hand out binaries for another cpu
+		if features.get(BUILD_MARCH) == "native":
+			key_content["host_cpu"] = get_host_cpu()
+		canonical = json.dumps(key_content, sort_keys=True, separators=(',', ':'))
+		return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+	def get_compiler_id(self, compile_command):
+		""" returns the identity of the compiler that compile_command calls,
+		i.e. its name, the command template and its version string """
+		compiler = compile_command.split()[0]
+		if compiler not in self.compiler_ids:
+			try:
+				version = subprocess.check_output([compiler, "--version"], stderr=subprocess.STDOUT)
+				version = version.decode('utf-8', 'replace').splitlines()[0]
+			except (OSError, subprocess.CalledProcessError, IndexError):
+				version = "unknown"
+			self.compiler_ids[compiler] = compiler + " " + version
+		return self.compiler_ids[compiler] + "|" + compile_command
+
+	def fetch(self, key, destination):
+		""" copies the cached binary for key to destination. Returns True on
+		a cache hit and False on a miss """
+		entry_file = os.path.join(self.entries_path, key)
+		with self._locked_index() as index:
+			entry = index["entries"].get(key)
+			if entry is None or not os.path.isfile(entry_file):
+				index["entries"].pop(key, None)
+				index["stats"]["misses"] += 1
+				return False
+			destination_dir = os.path.dirname(destination)
+			if destination_dir and not os.path.exists(destination_dir):
+				os.makedirs(destination_dir)
+			shutil.copy2(entry_file, destination)
+			entry["last_used"] = time.time()
+			index["stats"]["hits"] += 1
+			return True
+
+	def store(self, key, binary):
+		""" adds a freshly compiled binary to the cache and evicts the least
+		recently used entries if the size limit is exceeded """
+		entry_file = os.path.join(self.entries_path, key)
+		tmp_file = entry_file + ".tmp" + str(os.getpid())
+		shutil.copy2(binary, tmp_file)
+		os.replace(tmp_file, entry_file)
+		with self._locked_index() as index:
+			now = time.time()
+			index["entries"][key] = {
+				"size": os.path.getsize(entry_file),
+				"created": now,
+				"last_used": now
+			}
+			self._evict(index)
+
+	def get_stats(self):
+		""" returns hits, misses and evictions together with the current
+		number of entries and their size in bytes """
+		with self._locked_index() as index:
+			stats = dict(index["stats"])
+			stats["entries"] = len(index["entries"])
+			stats["size"] = sum(entry["size"] for entry in index["entries"].values())
+			stats["max_size"] = self.max_size
+		lookups = stats["hits"] + stats["misses"]
+		stats["hit_rate"] = stats["hits"] / lookups if lookups > 0 else 0.0
+		return stats
+
+	def print_stats(self):
+		""" prints a one line summary of the cache statistics """
+		stats = self.get_stats()
+		print("binary cache: " + str(stats["hits"]) + " hits, " + str(stats["misses"]) + " misses (" +
+			str(round(100 * stats["hit_rate"])) + "% hit rate), " + str(stats["evictions"]) + " evictions, " +
+			str(stats["entries"]) + " entries using " + str(round(stats["size"] / (1024 * 1024), 1)) + "/" +
+			str(round(stats["max_size"] / (1024 * 1024))) + " MB")
+
+	def clear(self):
+		""" removes all cached binaries and resets the statistics """
+		with self._locked_index() as index:
+			for key in list(index["entries"]):
+				self._remove_entry(index, key)
+			index["stats"] = BinaryCache._empty_stats()
+
+	def _evict(self, index):
+		""" removes least recently used entries until the cache fits """
+		entries = index["entries"]
+		total = sum(entry["size"] for entry in entries.values())
+		by_age = sorted(entries, key=lambda k: entries[k]["last_used"])
+		for key in by_age:
+			if total <= self.max_size:
+				break
+			total -= entries[key]["size"]
+			self._remove_entry(index, key)
+			index["stats"]["evictions"] += 1
+
+	def _remove_entry(self, index, key):
+		entry_file = os.path.join(self.entries_path, key)
+		if os.path.exists(entry_file):
+			os.remove(entry_file)
+		index["entries"].pop(key, None)
+
+	def _locked_index(self):
+		return LockedJsonFile(self.index_path, self.lock_path,
+			lambda: {"entries": {}, "stats": BinaryCache._empty_stats()})
+
+	@staticmethod
+	def _empty_stats():
+		return {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def get_host_cpu():
+	""" returns the model and the feature flags of the cpu of this host,
+	which decide what -march=native compiles for """
+	cpu = {"machine": platform.machine()}
+	try:
+		with open("/proc/cpuinfo") as f:
+			for line in f:
+				name, _, value = line.partition(":")
+				name = name.strip()
+				if name in ("model name", "flags", "Features", "CPU part") and name not in cpu:
+					cpu[name] = value.strip()
+	except OSError:
+		cpu["processor"] = platform.processor()
+	return cpu
+
+
+def help_str():
+	return "USAGE: binary_cache.py [-d binary-cache] [--stats] [--clear]"
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import math
+import random
+import statistics
+
+
+## bisection halves the bracket each step, 100 steps get below float precision
+T_QUANTILE_ITERATIONS = 100
+
+
+def t_quantile(p, df):
+	""" returns the p quantile of Student's t distribution with df degrees
+	of freedom. Closed forms for one and two degrees of freedom, otherwise
+	t_cdf is inverted by bisection, which is accurate to float precision
+	also for the few cycles an adaptive run starts with """
+	if df == 1:
+		return math.tan(math.pi * (p - 0.5))
+	if df == 2:
+		return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+	if p < 0.5:
+		return -t_quantile(1 - p, df)
+	low = 0.0
+	high = 1.0
+	while t_cdf(high, df) < p:
+		low = high
+		high *= 2
+	for i in range(T_QUANTILE_ITERATIONS):
+		middle = (low + high) / 2
+		if t_cdf(middle, df) < p:
+			low = middle
+		else:
+			high = middle
+	return (low + high) / 2
+
+
+def t_cdf(t, df):
+	""" returns the probability that Student's t distribution with df
+	degrees of freedom is at most t """
+	tail = regularized_beta(df / (df + t * t), df / 2, 0.5) / 2
+	return 1 - tail if t >= 0 else tail
+
+
+def regularized_beta(x, a, b):
+	""" returns the regularized incomplete beta function I_x(a, b), by its
+	continued fraction (modified Lentz's method) """
+	if x <= 0:
+		return 0.0
+	if x >= 1:
+		return 1.0
+	## the continued fraction converges fast for x below the mean of the beta distribution
+	if x > (a + 1) / (a + b + 2):
+		return 1 - regularized_beta(1 - x, b, a)
+	front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) +
+		b * math.log(1 - x)) / a
+	tiny = 1e-300
+	c = 1.0
+	d = 1 - (a + b) * x / (a + 1)
+	d = 1 / (d if abs(d) > tiny else tiny)
+	fraction = d
+	for m in range(1, 300):
+		## the even and the odd step of the continued fraction
+		for numerator in (m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+				-(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))):
+			d = 1 + numerator * d
+			d = 1 / (d if abs(d) > tiny else tiny)
+			c = 1 + numerator / c
+			c = c if abs(c) > tiny else tiny
+			fraction *= c * d
+		if abs(c * d - 1) < 1e-15:
+			break
+	return front * fraction
+
+
+def mean_confidence_interval(values, confidence=0.95):
+	""" returns (mean, low, high) of the two sided confidence interval of
+	the mean of values. Needs at least two values """
+	n = len(values)
+	mean = statistics.mean(values)
+	if n < 2:
+		return (mean, float("-inf"), float("inf"))
+	half_width = t_quantile(0.5 + confidence / 2, n - 1) * statistics.stdev(values) / math.sqrt(n)
+	return (mean, mean - half_width, mean + half_width)
+
+
+def relative_half_width(mean, low, high):
+	""" returns the half width of a confidence interval relative to its mean """
+	if mean == 0 or math.isinf(low) or math.isinf(high):
+		return float("inf")
+	return (high - low) / 2 / abs(mean)
+
+
+def find_outliers(values, threshold=3.5):
+	""" returns the indices of values whose modified z-score (based on the
+	median absolute deviation) exceeds threshold """
+	if len(values) < 3:
+		return []
+	median = statistics.median(values)
+	mad = statistics.median([abs(value - median) for value in values])
+	if mad == 0:
+		return []
+	return [i for i, value in enumerate(values) if 0.6745 * abs(value - median) / mad > threshold]
+
+
+def geometric_mean(values):
+	""" returns the geometric mean of positive values, the mean that fits ratios """
+	return math.exp(statistics.mean(math.log(value) for value in values))
+
+
+def bootstrap_confidence_interval(values, statistic=statistics.mean, confidence=0.95, resamples=2000, seed=None):
+	""" returns (estimate, low, high) of the percentile bootstrap interval
+	of statistic over values. Unlike the t interval it makes no assumption
+	about the distribution, which suits ratios """
+	rnd = random.Random(seed)
+	n = len(values)
+	estimate = statistic(values)
+	if n < 2:
+		return (estimate, float("-inf"), float("inf"))
+	estimates = sorted(statistic(rnd.choices(values, k=n)) for i in range(resamples))
+	low = estimates[int((1 - confidence) / 2 * resamples)]
+	high = estimates[min(resamples - 1, int((1 + confidence) / 2 * resamples))]
+	return (estimate, low, high)
+
+
+def speedup_statistics(baseline_costs, candidate_costs, confidence=0.95, resamples=2000, seed=None):
+	""" returns the speedup of a candidate over the baseline from paired
+	costs: the geometric mean of the per pair ratios baseline/candidate,
+	so that above one is faster, with its bootstrap confidence interval """
+	ratios = [baseline / candidate for baseline, candidate in zip(baseline_costs, candidate_costs)]
+	speedup, low, high = bootstrap_confidence_interval(ratios, geometric_mean, confidence, resamples, seed)
+	result = {}
+	result["pairs"] = len(ratios)
+	result["speedup"] = speedup
+	result["ci_low"] = low
+	result["ci_high"] = high
+	result["confidence"] = confidence
+	## the interval does not contain one, so the difference is real
+	result["significant"] = low > 1 or high < 1
+	result["baseline_mean"] = statistics.mean(baseline_costs)
+	result["candidate_mean"] = statistics.mean(candidate_costs)
+	return result
+
+
+class RepetitionPolicy:
+	""" Decides how often a config is benchmarked. The first warmup cycles
+	are thrown away; afterwards cycles are repeated until the confidence
+	interval of the mean cost is narrower than target (relative to the
+	mean), but at least min_cycles and at most max_cycles times """
+	STOP_CONVERGED = "converged"
+	STOP_MAX_CYCLES = "max-cycles"
+
+	DEFAULT_WARMUP = 1
+	DEFAULT_MIN_CYCLES = 3
+	DEFAULT_MAX_CYCLES = 30
+	DEFAULT_TARGET = 0.02
+	DEFAULT_CONFIDENCE = 0.95
+
+	def __init__(self, warmup=DEFAULT_WARMUP, min_cycles=DEFAULT_MIN_CYCLES, max_cycles=DEFAULT_MAX_CYCLES,
+			target=DEFAULT_TARGET, confidence=DEFAULT_CONFIDENCE):
+		self.warmup = warmup
+		self.min_cycles = max(2, min_cycles)
+		self.max_cycles = max(self.min_cycles, max_cycles)
+		self.target = target
+		self.confidence = confidence
+
+
+	def evaluate(self, costs):
+		""" returns the statistics of the given costs: mean, confidence
+		interval, its relative half width and the indices of outliers.
+		Outliers are left out of the interval """
+		outliers = find_outliers(costs)
+		kept = [cost for i, cost in enumerate(costs) if i not in outliers]
+		if len(kept) < 2:
+			kept = costs
+		mean, low, high = mean_confidence_interval(kept, self.confidence)
+		result = {}
+		result["cycles"] = len(costs)
+		result["mean"] = mean
+		result["ci_low"] = low
+		result["ci_high"] = high
+		result["relative_ci"] = relative_half_width(mean, low, high)
+		result["confidence"] = self.confidence
+		result["target"] = self.target
+		result["outliers"] = outliers
+		return result
+
+	def get_stop_reason(self, costs):
+		""" returns why benchmarking can stop after the given costs, or None
+		if another cycle is needed """
+		if len(costs) >= self.max_cycles:
+			return RepetitionPolicy.STOP_MAX_CYCLES
+		if len(costs) < self.min_cycles:
+			return None
+		if self.evaluate(costs)["relative_ci"] <= self.target:
+			return RepetitionPolicy.STOP_CONVERGED
+		return None
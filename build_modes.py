@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+import os
+import sys
+import subprocess
+
+
+## Build options choose the compiler and its flags instead of setting a
+## sqlite macro. They live in the features of a config like every other
+## option, so samplers, the influence model and the optimizer treat the
+## build mode as one more dimension
+BUILD_COMPILER = "BUILD_COMPILER"
+BUILD_OPT_LEVEL = "BUILD_OPT_LEVEL"
+BUILD_MARCH = "BUILD_MARCH"
+BUILD_LTO = "BUILD_LTO"
+BUILD_PGO = "BUILD_PGO"
+## the release of sqlite whose amalgamation is built, see artifacts
+BUILD_SQLITE_VERSION = "BUILD_SQLITE_VERSION"
+BUILD_OPTIONS = [BUILD_COMPILER, BUILD_OPT_LEVEL, BUILD_MARCH, BUILD_LTO, BUILD_PGO, BUILD_SQLITE_VERSION]
+
+DEFAULT_SQLITE_VERSION = "3.16.2"
+
+## the build mode of a config that does not set a build option, which is
+## how sqlite is built for production
+DEFAULT_BUILD_MODE = {
+	"compiler": "gcc",
+	"opt_level": "-O2",
+	"march": None,
+	"lto": False,
+	"pgo": False,
+	"sqlite_version": DEFAULT_SQLITE_VERSION,
+}
+
+LTO_FLAGS = {"gcc": "-flto=auto", "clang": "-flto"}
+
+## phases of a profile guided build
+PGO_GENERATE = "generate"
+PGO_USE = "use"
+
+## flags of the instrumented build and of the build that uses the profile
+PGO_FLAGS = {
+	"gcc": {
+		PGO_GENERATE: "-fprofile-generate={profile_dir} -fprofile-update=atomic",
+		PGO_USE: "-fprofile-use={profile_dir} -fprofile-correction -Wno-missing-profile",
+	},
+	"clang": {
+		PGO_GENERATE: "-fprofile-instr-generate={profile_dir}/%p.profraw",
+		PGO_USE: "-fprofile-instr-use={profile_dir}/default.profdata",
+	},
+}
+
+## clang writes raw profiles that have to be merged before they can be used
+PGO_MERGE_COMMANDS = {
+	"clang": "llvm-profdata merge -o {profile_dir}/default.profdata {profile_dir}/*.profraw",
+}
+
+## a training run for the shell, a mix of loading, indexed and full scans,
+## sorting and updates, similar in spirit to the benchmark
+TRAINING_SQL = """
+CREATE TABLE t (id INTEGER PRIMARY KEY, k INTEGER, v TEXT);
+BEGIN;
+WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 50000)
+	INSERT INTO t SELECT x, abs(random()) % 50000, hex(randomblob(40)) FROM c;
+COMMIT;
+CREATE INDEX t_k ON t (k);
+SELECT count(*), sum(length(v)) FROM t WHERE k BETWEEN 1000 AND 2000;
+SELECT v FROM t ORDER BY v LIMIT 1 OFFSET 49999;
+SELECT k % 100, count(*), max(v) FROM t GROUP BY 1 ORDER BY 2 DESC LIMIT 5;
+SELECT count(*) FROM t AS a JOIN t AS b ON a.k = b.id WHERE a.id < 5000;
+UPDATE t SET v = hex(randomblob(20)) WHERE id % 7 = 0;
+DELETE FROM t WHERE id % 11 = 0;
+CREATE TEMP TABLE s AS SELECT * FROM t ORDER BY k;
+VACUUM;
+"""
+
+## size of the micro-workloads that train a libsqlite3.so
+TRAINING_SCALE = 0.2
+
+
+def is_build_option(option):
+	return option in BUILD_OPTIONS
+
+
+def split_features(features):
+	""" returns the sqlite macros of features and its build mode """
+	macros = {option: value for option, value in features.items() if not is_build_option(option)}
+	return (macros, get_build_mode(features))
+
+
+def get_build_mode(features):
+	""" returns the complete build mode of features, with the defaults
+	for the build options it does not set """
+	build_mode = dict(DEFAULT_BUILD_MODE)
+	if BUILD_COMPILER in features:
+		build_mode["compiler"] = features[BUILD_COMPILER]
+	if BUILD_OPT_LEVEL in features:
+		build_mode["opt_level"] = features[BUILD_OPT_LEVEL]
+	if BUILD_MARCH in features:
+		build_mode["march"] = features[BUILD_MARCH]
+	build_mode["lto"] = BUILD_LTO in features
+	build_mode["pgo"] = BUILD_PGO in features
+	if BUILD_SQLITE_VERSION in features:
+		build_mode["sqlite_version"] = str(features[BUILD_SQLITE_VERSION])
+	return build_mode
+
+
+def get_sqlite_versions(features_list):
+	""" returns the sorted sqlite versions a list of features dicts is built with """
+	return sorted(set(get_build_mode(features)["sqlite_version"] for features in features_list))
+
+
+def get_build_flags(build_mode, pgo_phase=None, profile_dir=None):
+	""" returns the compiler flags of a build mode. The profile flags are
+	only added for a phase of a profile guided build """
+	flags = [build_mode["opt_level"]]
+	if build_mode["march"]:
+		flags.append("-march=" + build_mode["march"])
+	if build_mode["lto"]:
+		flags.append(LTO_FLAGS.get(build_mode["compiler"], "-flto"))
+	if build_mode["pgo"] and pgo_phase is not None:
+		flags.append(PGO_FLAGS[build_mode["compiler"]][pgo_phase].format(profile_dir=profile_dir))
+	return " ".join(flags)
+
+
+def get_build_mode_name(build_mode):
+	""" returns a short name of a build mode, e.g. gcc-O2-lto, which
+	names the sqlite version unless it is the default one """
+	name = build_mode["compiler"] + build_mode["opt_level"]
+	if build_mode["march"]:
+		name += "-" + build_mode["march"]
+	if build_mode["lto"]:
+		name += "-lto"
+	if build_mode["pgo"]:
+		name += "-pgo"
+	if build_mode["sqlite_version"] != DEFAULT_SQLITE_VERSION:
+		name += "-sqlite-" + build_mode["sqlite_version"]
+	return name
+
+
+def parse_build_flags(command):
+	""" returns the build options of a compile command, the counterpart of
+	get_build_flags. A profile guided build is only recognized by the flags
+	of its final build, see SQLiteBenchmarker.get_export_string. Options
+	that have their default value are left out """
+	tokens = command.split()
+	features = {}
+	if not tokens:
+		return features
+	if tokens[0] != DEFAULT_BUILD_MODE["compiler"]:
+		features[BUILD_COMPILER] = tokens[0]
+	for token in tokens[1:]:
+		if token.startswith("-O") and token != DEFAULT_BUILD_MODE["opt_level"]:
+			features[BUILD_OPT_LEVEL] = token
+		elif token.startswith("-march="):
+			features[BUILD_MARCH] = token[len("-march="):]
+		elif token.startswith("-flto"):
+			features[BUILD_LTO] = None
+		elif token.startswith("-fprofile-use") or token.startswith("-fprofile-instr-use"):
+			features[BUILD_PGO] = None
+	return features
+
+
+def run_training(output, profile_dir, library=False):
+	""" runs the training workload on an instrumented build, which writes
+	its profile into profile_dir when it exits. A libsqlite3.so is trained
+	with the micro-workloads in a process of its own, the shell with
+	TRAINING_SQL. Returns the exit code """
+	if library:
+		workloads_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workloads.py")
+		command = [sys.executable, workloads_script, "-l", output, "-d", profile_dir, "-s", str(TRAINING_SCALE)]
+		return subprocess.call(command, cwd=profile_dir, stdout=subprocess.DEVNULL)
+	db_path = os.path.join(profile_dir, "training.db")
+	result = subprocess.run([output, db_path], input=TRAINING_SQL.encode('utf-8'), cwd=profile_dir,
+		stdout=subprocess.DEVNULL)
+	if os.path.exists(db_path):
+		os.remove(db_path)
+	return result.returncode
+
+
+def get_merge_command(build_mode, profile_dir):
+	""" returns the command that prepares the profile for use, or None """
+	merge_command = PGO_MERGE_COMMANDS.get(build_mode["compiler"])
+	if merge_command is None:
+		return None
+	return merge_command.format(profile_dir=profile_dir)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import time
+from locked_json import LockedJsonFile
+
+
+def main(argv):
+	## default values
+	base_dir = os.path.abspath(os.getcwd())
+	show_configs = False
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"w:vh",["workingdir=","verbose","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(CampaignManifest.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-w", "--workingdir"):
+			base_dir = os.path.abspath(arg)
+		elif opt in ("-v", "--verbose"):
+			show_configs = True
+		else:
+			print (help_str())
+			sys.exit(CampaignManifest.EXIT_ERROR)
+
+	manifest = CampaignManifest(base_dir)
+	if not manifest.exists():
+		print("no campaign manifest in " + base_dir)
+		sys.exit(CampaignManifest.EXIT_ERROR)
+	manifest.print_summary(show_configs)
+
+
+class CampaignManifest:
+	""" The state of a benchmark campaign on disk. It lists every planned
+	config with its status: pending, compiled, benchmarking (with the number
+	of cycles done so far), benchmarked or failed. Every change is written
+	through right away, so a campaign that has been interrupted can be
+	resumed where it stopped """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	JSON_INDENT = 4
+
+	NAME_MANIFEST_FILE = 'campaign-manifest.json'
+	NAME_LOCK_FILE = 'campaign-manifest.lock'
+
+	STATUS_PENDING = "pending"
+	STATUS_COMPILED = "compiled"
+	STATUS_BENCHMARKING = "benchmarking"
+	STATUS_BENCHMARKED = "benchmarked"
+	STATUS_FAILED = "failed"
+
+	## configs with these states are not touched again when resuming
+	FINISHED_STATES = [STATUS_BENCHMARKED, STATUS_FAILED]
+
+
+	def __init__(self, base_dir):
+		self.base_dir = base_dir
+		self.manifest_path = os.path.join(self.base_dir, CampaignManifest.NAME_MANIFEST_FILE)
+		self.lock_path = os.path.join(self.base_dir, CampaignManifest.NAME_LOCK_FILE)
+
+
+	def exists(self):
+		return os.path.isfile(self.manifest_path)
+
+	def create(self, campaign, config_files, cycles_planned, options=None):
+		""" starts a new campaign over config_files, replacing any manifest
+		of an earlier campaign. options are the settings the campaign has
+		been started with, so that it can be resumed with the same ones """
+		with self._locked() as manifest:
+			manifest.clear()
+			manifest["campaign"] = campaign
+			manifest["created"] = time.time()
+			manifest["options"] = options if options is not None else {}
+			manifest["configs"] = {}
+			for config_file in config_files:
+				entry = {}
+				entry["config_file"] = os.path.basename(config_file)
+				entry["status"] = CampaignManifest.STATUS_PENDING
+				entry["cycles_done"] = 0
+				entry["cycles_planned"] = cycles_planned
+				manifest["configs"][CampaignManifest.get_config_name(config_file)] = entry
+
+	def load(self):
+		""" returns the whole manifest """
+		with self._locked(write=False) as manifest:
+			return manifest
+
+	def get_campaign(self):
+		return self.load()["campaign"]
+
+	def get_options(self):
+		return self.load().get("options", {})
+
+	def get_entry(self, config_name):
+		""" returns the manifest entry of a config, or None if it is not
+		part of the campaign """
+		return self.load()["configs"].get(config_name)
+
+	def get_unfinished(self):
+		""" returns the file names of all configs that still need work """
+		configs = self.load()["configs"]
+		return sorted(entry["config_file"] for entry in configs.values()
+			if entry["status"] not in CampaignManifest.FINISHED_STATES)
+
+	def get_cycles_done(self, config_name):
+		entry = self.get_entry(config_name)
+		if entry is None:
+			return 0
+		return entry["cycles_done"]
+
+	def is_compiled(self, config_name):
+		""" true if the config has been compiled earlier in this campaign """
+		entry = self.get_entry(config_name)
+		return entry is not None and entry["status"] in (CampaignManifest.STATUS_COMPILED,
+			CampaignManifest.STATUS_BENCHMARKING, CampaignManifest.STATUS_BENCHMARKED)
+
+	def set_compiled(self, config_name):
+		with self._locked() as manifest:
+			entry = self._get_or_add_entry(manifest, config_name)
+			if entry["status"] == CampaignManifest.STATUS_PENDING:
+				entry["status"] = CampaignManifest.STATUS_COMPILED
+
+	def set_failed(self, config_name, exit_code):
+		with self._locked() as manifest:
+			entry = self._get_or_add_entry(manifest, config_name)
+			entry["status"] = CampaignManifest.STATUS_FAILED
+			entry["exit_code"] = exit_code
+
+	def add_cycle(self, config_name):
+		""" counts one more cycle of config_name, after its measurement has
+		been written """
+		with self._locked() as manifest:
+			entry = self._get_or_add_entry(manifest, config_name)
+			entry["status"] = CampaignManifest.STATUS_BENCHMARKING
+			entry["cycles_done"] += 1
+
+	def set_benchmarked(self, config_name):
+		with self._locked() as manifest:
+			entry = self._get_or_add_entry(manifest, config_name)
+			entry["status"] = CampaignManifest.STATUS_BENCHMARKED
+			entry["finished"] = time.time()
+
+	def get_summary(self):
+		""" returns the number of configs per status """
+		summary = {}
+		for entry in self.load()["configs"].values():
+			summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+		return summary
+
+	def print_summary(self, show_configs=False):
+		manifest = self.load()
+		summary = self.get_summary()
+		print("campaign \"" + manifest["campaign"] + "\": " + str(len(manifest["configs"])) + " configs, " +
+			", ".join(str(summary[status]) + " " + status for status in sorted(summary)))
+		if show_configs:
+			for config_name in sorted(manifest["configs"]):
+				entry = manifest["configs"][config_name]
+				cycles = str(entry["cycles_done"])
+				if entry["cycles_planned"] is not None:
+					cycles += "/" + str(entry["cycles_planned"])
+				print(config_name + ": " + entry["status"] + " (" + cycles + " cycles)")
+
+	@staticmethod
+	def _get_or_add_entry(manifest, config_name):
+		""" configs that have not been planned, e.g. benchmarked on their
+		own, are added on first use """
+		if config_name not in manifest["configs"]:
+			entry = {}
+			entry["config_file"] = config_name + ".cfg"
+			entry["status"] = CampaignManifest.STATUS_PENDING
+			entry["cycles_done"] = 0
+			entry["cycles_planned"] = None
+			manifest["configs"][config_name] = entry
+		return manifest["configs"][config_name]
+
+	@staticmethod
+	def get_config_name(config_file):
+		""" returns the name of a config file without folder and extension """
+		return os.path.splitext(os.path.basename(config_file))[0]
+
+	@staticmethod
+	def clean(base_dir):
+		""" deletes the manifest of the last campaign """
+		for name in (CampaignManifest.NAME_MANIFEST_FILE, CampaignManifest.NAME_LOCK_FILE):
+			path = os.path.join(base_dir, name)
+			if os.path.exists(path):
+				os.remove(path)
+
+	def _locked(self, write=True):
+		return LockedJsonFile(self.manifest_path, self.lock_path, lambda: {"campaign": None, "configs": {}}, write)
+
+
+def help_str():
+	return "USAGE: campaign.py [-w workingdir] [-v]"
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -10,6 +10,9 @@ import datetime
 import random
 import shutil
 from sqlite_bmk import SQLiteBenchmarker
+from samplers import get_sampler, SAMPLING_RANDOM, CoveringArraySampler
+from constraints import ConstraintStore
+from tracing import traced
 
 
 def main(argv):
@@ -17,13 +20,16 @@ def main(argv):
 	options_file = ''
 	base_dir=os.path.abspath(os.getcwd())
 	num_random = 30
+	seed = None
+	sampling = SAMPLING_RANDOM
+	strength = CoveringArraySampler.DEFAULT_STRENGTH
 	found_options = False
 	cleanonly = False
 
 	## first read terminal arguments
 	try:
-		opts, args = getopt.getopt(argv,"o:whr:",["optionsfile=","workingdir","help", "num-random=", "clean"])
-	except (getopt.GetoptError, err):
+		opts, args = getopt.getopt(argv,"o:whr:s:",["optionsfile=","workingdir","help", "num-random=", "seed=", "sampling=", "strength=", "clean"])
+	except getopt.GetoptError as err:
 		print(str(err))
 		print(help_str())
 		sys.exit(ConfigCreator.EXIT_ERROR)
@@ -37,6 +43,12 @@ def main(argv):
 		elif opt in ("-r", "--num-random"):
 			num_random = arg
 			found_options = True
+		elif opt in ("-s", "--seed"):
+			seed = int(arg)
+		elif opt == "--sampling":
+			sampling = arg
+		elif opt == "--strength":
+			strength = int(arg)
 		elif opt == "--clean":
 			cleanonly = True
 		else:
@@ -51,11 +63,11 @@ def main(argv):
 		print (help_str())
 		sys.exit(ConfigCreator.EXIT_ERROR)
 
-	generator = ConfigCreator(base_dir=base_dir,options_file=options_file)
+	generator = ConfigCreator(base_dir=base_dir,options_file=options_file,seed=seed,
+		constraints=ConstraintStore(base_dir))
 
 	#non_default = generator.generate_non_default_single_option("SQLITE_TEMP_STORE")
-	generator.generate_and_write_one_for_each_option()
-	generator.generate_set_randomly(int(num_random))
+	generator.generate(sampling, int(num_random), strength)
 
 
 
@@ -67,14 +79,27 @@ class ConfigCreator:
 
 	JSON_INDENT = 4
 
-	def __init__(self, base_dir, options_file):
+	## length of the config id in file names
+	LENGTH_ID_IN_FILE_NAME = 16
+
+	## how many draws generate_set_randomly may spend per requested config
+	MAX_DRAWS_PER_CONFIG = 100
+
+	def __init__(self, base_dir, options_file, seed=None, results_store=None, constraints=None):
 		self.base_dir = base_dir
 		self.options_file = options_file
+		## options that are known not to compile together are never combined
+		self.constraints = constraints
+		## a seeded generator makes the sampled configs reproducible
+		self.random = random.Random(seed)
 
 		## read list of all possible config flags ("features"/"options")
 		with open(self.options_file) as json_data:
 			json_data = json.load(json_data)
 			self.options = self.parse_options(json_data)
+
+		## configs that exist already are never generated again
+		self.known_ids = ConfigCreator.get_existing_ids(self.base_dir, results_store)
 		print('Finished initialising.')
 
 
@@ -83,8 +108,11 @@ class ConfigCreator:
 		""" generates and returns all possible values for all options given as json """
 		options = {}
 		possible_options = {}
-		if "compile-options" in json:
-			json_options = json["compile-options"]
+		## build options (compiler and flags) are sampled like the sqlite options
+		for section in ["compile-options", "build-options"]:
+			if section not in json:
+				continue
+			json_options = json[section]
 
 			# We allow
 			#  - unary options (take effect on existence)
@@ -101,6 +129,7 @@ class ConfigCreator:
 					val_type = value["type"]
 					val_default = value["default"]
 					val_dict["default"] = val_default
+					val_dict["type"] = val_type
 					if val_type == "list":
 						# list type option
 						vals = value["values"]
@@ -124,7 +153,14 @@ class ConfigCreator:
 	def write_config(self,
 		config,
 		suffix = ""):
-		""" wites a file for a given configuration dict """
+		""" wites a file for a given configuration dict, named after its
+		content, and returns its path. Returns None without writing anything
+		if the config has been generated or measured before or is known not
+		to compile """
+		config_id = ConfigCreator.get_config_id(config)
+		if config_id in self.known_ids or not self.is_allowed(config):
+			return None
+		self.known_ids.add(config_id)
 
 		config_wrapper = {}
 		config_wrapper["features"] = config
@@ -132,20 +168,51 @@ class ConfigCreator:
 		config_folder = os.path.join(self.base_dir, 'compile-configs')
 		config_folder_exists = os.path.exists(config_folder)
 
-		json_conf = json.dumps(config_wrapper, ConfigCreator.JSON_INDENT, sort_keys=True)
+		json_conf = json.dumps(config_wrapper, indent=ConfigCreator.JSON_INDENT, sort_keys=True)
 
 		if not config_folder_exists:
 			os.mkdir(config_folder)
 		config_file_name = "config_"
-		if suffix is not "":
+		if suffix != "":
 			config_file_name += suffix + "_"
-		config_file_name += str(hash(json_conf))
+		config_file_name += config_id[:ConfigCreator.LENGTH_ID_IN_FILE_NAME]
 		complete_path = os.path.join(config_folder, config_file_name)
 		complete_path +=  ".cfg"
 		with open(complete_path, 'w') as f:
 			f.seek(0)
 			f.write(json_conf)
 			f.truncate()
+		return complete_path
+
+	def is_allowed(self, config):
+		""" false if config contains options that do not compile together """
+		return self.constraints is None or self.constraints.violates(config) is None
+
+
+	@traced("generate-configs")
+	def generate(self, sampling=SAMPLING_RANDOM, num_random=0, strength=CoveringArraySampler.DEFAULT_STRENGTH):
+		""" generates and writes configs with the given sampling strategy.
+		random writes one config for each option plus num_random random
+		configs; the strategies of the samplers module write their design,
+		latin-hypercube with num_random samples """
+		if sampling == SAMPLING_RANDOM:
+			self.generate_and_write_one_for_each_option()
+			return self.generate_set_randomly(num_random)
+		sampler = get_sampler(sampling, num_samples=num_random, strength=strength)
+		return self.generate_with_sampler(sampler)
+
+
+	def generate_with_sampler(self, sampler):
+		""" writes the configs of a sampler from the samplers module and
+		returns how many of them have not been known before """
+		written = 0
+		configs = sampler.generate(self.options, self.random)
+		for config in configs:
+			if self.write_config(config, suffix=sampler.NAME):
+				written += 1
+		print(sampler.NAME + ": " + str(len(configs)) + " configs, " + str(written) + " new")
+		return written
+
 
 	def generate_randomly(self):
 		"""generates and returns a config with random values for each option"""
@@ -153,26 +220,37 @@ class ConfigCreator:
 		for feature, f_desc in self.options.items():
 			if f_desc is None:
 				#unary option
-				on = bool(random.getrandbits(1))
+				on = bool(self.random.getrandbits(1))
 				if on:
 					rand_conf[feature] = None
 			else:
 				possible_values = f_desc["values"]
-				val = random.choice(possible_values)
+				val = self.random.choice(possible_values)
 				rand_conf[feature] = val
 		return rand_conf
 
 
 	def generate_set_randomly(self,num):
-		""" generates a set of random configs and writes them to seperate files """
-		for i in range(num):
-			self.generate_rand_and_write()
+		""" generates a set of num random configs, that have been neither
+		generated nor measured before, and writes them to seperate files.
+		Returns how many configs have been written, which is less than num
+		once the space of configs is exhausted """
+		written = 0
+		draws = 0
+		max_draws = num * ConfigCreator.MAX_DRAWS_PER_CONFIG
+		while written < num and draws < max_draws:
+			draws += 1
+			if self.generate_rand_and_write():
+				written += 1
+		if written < num:
+			print("found only " + str(written) + " new random configs in " + str(draws) + " draws")
+		return written
 
 
 	def generate_rand_and_write(self):
-		""" generates a random config and writes it to a file """
+		""" generates a random config and writes it to a file, unless it is known """
 		random_config = self.generate_randomly()
-		self.write_config(random_config, suffix="rnd")
+		return self.write_config(random_config, suffix="rnd")
 
 
 	def generate_and_write_one_for_each_option(self):
@@ -183,7 +261,8 @@ class ConfigCreator:
 
 
 	def generate_non_default_single_option(self, option):
-		""" generates and returns a value for an option which is not its default value """
+		""" generates and returns a value for an option which is not its
+		default value, preferring values that have not been used before """
 		if option not in self.options:
 			raise ValueError('Can find no non-default value for option ' +
 				option + " since it is not in the parsed set of options")
@@ -195,17 +274,65 @@ class ConfigCreator:
 			possible_vals = [None]
 		else:
 			val_default = option_desc["default"]
-			possible_vals = option_desc["values"]
-			if val_default in possible_vals:
-				possible_vals.remove(val_default)
+			possible_vals = [val for val in option_desc["values"] if val != val_default]
+
+		new_vals = [val for val in possible_vals
+			if ConfigCreator.get_config_id({option: val}) not in self.known_ids]
+		if new_vals:
+			possible_vals = new_vals
 
-		val = random.choice(possible_vals)
+		val = self.random.choice(possible_vals)
 		rand_conf = {}
 		rand_conf[option] = val
 		return rand_conf
 
 
 	@staticmethod
+	def get_config_id(features):
+		""" returns the content address of a features dict, see
+		SQLiteBenchmarker.get_id_from_config """
+		return SQLiteBenchmarker.get_id_from_config(features)
+
+
+	@staticmethod
+	def get_existing_ids(base_dir, results_store=None):
+		""" returns the ids of all configs in the config folder and of all
+		configs with measurements in the results store """
+		known_ids = set()
+		config_folder = os.path.join(base_dir, 'compile-configs')
+		if os.path.exists(config_folder):
+			for filename in os.listdir(config_folder):
+				with open(os.path.join(config_folder, filename)) as json_data:
+					config = json.load(json_data)
+				known_ids.add(ConfigCreator.get_config_id(config["features"]))
+		if results_store is not None:
+			for config in results_store.iter_configs():
+				if results_store.count_measurements(config["config_id"]) > 0:
+					known_ids.add(ConfigCreator.get_config_id(config["features"]))
+		return known_ids
+
+
+	@staticmethod
+	def get_unmeasured_config_files(base_dir, results_store=None):
+		""" returns the names of the config files in the config folder that
+		have no measurements, neither in the file nor in the results store """
+		unmeasured = []
+		config_folder = os.path.join(base_dir, 'compile-configs')
+		for filename in sorted(os.listdir(config_folder)):
+			with open(os.path.join(config_folder, filename)) as json_data:
+				config = json.load(json_data)
+			if config.get("measurements"):
+				continue
+			if results_store is not None:
+				config_id = SQLiteBenchmarker.get_id_from_config(config["features"])
+				if results_store.count_measurements(config_id) > 0:
+					continue
+			unmeasured.append(filename)
+		return unmeasured
+
+
+	@staticmethod
+	@traced("write-all-in-one-config")
 	def write_all_in_one_config_file(base_dir):
 		""" writes all configs in one file """
 		file_content = ''
@@ -252,7 +379,8 @@ def milli_str(milli):
 	return str(int(round(milli)))
 
 def help_str():
-	return "USAGE: config-creator.py -o compile-options.json"
+	return ("USAGE: config-creator.py -o compile-options.json [-r num-random] [-s seed]\n"
+		"\t[--sampling random|pairwise|twise|plackett-burman|latin-hypercube] [--strength t]")
 
 
 if __name__ == "__main__":
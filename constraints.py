@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import math
+import time
+from locked_json import LockedJsonFile
+from build_modes import BUILD_SQLITE_VERSION, DEFAULT_SQLITE_VERSION
+
+
+def main(argv):
+	## default values
+	base_dir = os.path.abspath(os.getcwd())
+	show_failures = False
+	clear = False
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"w:fh",["workingdir=","failures","clear","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(ConstraintStore.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-w", "--workingdir"):
+			base_dir = os.path.abspath(arg)
+		elif opt in ("-f", "--failures"):
+			show_failures = True
+		elif opt == "--clear":
+			clear = True
+		else:
+			print (help_str())
+			sys.exit(ConstraintStore.EXIT_ERROR)
+
+	constraints = ConstraintStore(base_dir)
+	if clear:
+		constraints.clear()
+		return
+	data = constraints.load()
+	print(str(len(data["failures"])) + " compile failures, " + str(len(data["constraints"])) + " constraints")
+	for constraint in data["constraints"]:
+		print("  never together: " + get_features_string(constraint))
+	if show_failures:
+		for failure in data["failures"]:
+			print("\n" + failure["config_name"] + " (exit code " + str(failure["exit_code"]) + "): " +
+				get_features_string(failure["features"]))
+			print(failure["stderr"])
+
+
+class ConstraintStore:
+	""" Remembers configs that failed to compile, with the end of their
+	compiler output, and the constraints learned from them. A constraint is
+	a minimal set of options (with their values) that does not compile;
+	a config that contains all options of a constraint is never generated
+	or compiled again. The store lives next to the configs and survives a
+	fresh start, since it describes the sqlite source and the compiler """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	JSON_INDENT = 4
+
+	NAME_CONSTRAINTS_FILE = 'compile-constraints.json'
+	NAME_LOCK_FILE = 'compile-constraints.lock'
+
+	## number of characters of the compiler output that are kept per failure
+	MAX_STDERR_LENGTH = 4000
+
+
+	def __init__(self, base_dir):
+		self.base_dir = base_dir
+		self.constraints_path = os.path.join(self.base_dir, ConstraintStore.NAME_CONSTRAINTS_FILE)
+		self.lock_path = os.path.join(self.base_dir, ConstraintStore.NAME_LOCK_FILE)
+		self.constraints = None
+
+
+	def load(self):
+		""" returns the failures and constraints """
+		with self._locked(write=False) as data:
+			return data
+
+	def get_constraints(self):
+		""" returns the constraints, read once """
+		if self.constraints is None:
+			self.constraints = self.load()["constraints"]
+		return self.constraints
+
+	def violates(self, features):
+		""" returns the first constraint that is contained in features, or None """
+		for constraint in self.get_constraints():
+			if is_subset(constraint, features):
+				return constraint
+		return None
+
+	def add_failure(self, config_name, features, exit_code, stderr, constraint=None):
+		""" records a failed compile and the constraint learned from it """
+		if isinstance(stderr, bytes):
+			stderr = stderr.decode('utf-8', 'replace')
+		failure = {}
+		failure["config_name"] = config_name
+		failure["features"] = features
+		failure["exit_code"] = exit_code
+		failure["stderr"] = stderr[-ConstraintStore.MAX_STDERR_LENGTH:]
+		failure["time"] = time.time()
+		if constraint is not None:
+			failure["constraint"] = constraint
+		with self._locked() as data:
+			data["failures"].append(failure)
+			## an empty constraint would forbid every config (of its sqlite version)
+			learned = any(option != BUILD_SQLITE_VERSION for option in constraint or {})
+			if learned and not any(is_subset(known, constraint) for known in data["constraints"]):
+				data["constraints"] = [known for known in data["constraints"] if not is_subset(constraint, known)]
+				data["constraints"].append(constraint)
+			self.constraints = data["constraints"]
+
+	def clear(self):
+		with self._locked() as data:
+			data["failures"] = []
+			data["constraints"] = []
+		self.constraints = None
+
+	def _locked(self, write=True):
+		return LockedJsonFile(self.constraints_path, self.lock_path, lambda: {"failures": [], "constraints": []}, write)
+
+	def __getstate__(self):
+		## constraints are read again in worker processes
+		return {"base_dir": self.base_dir}
+
+	def __setstate__(self, state):
+		self.__init__(state["base_dir"])
+
+
+def is_subset(constraint, features):
+	""" true if features sets every option of constraint to the same value.
+	Features without a sqlite version are built with the default one """
+	for option, value in constraint.items():
+		if option == BUILD_SQLITE_VERSION:
+			if str(features.get(option, DEFAULT_SQLITE_VERSION)) != str(value):
+				return False
+		elif option not in features or features[option] != value:
+			return False
+	return True
+
+
+def minimize_failure(features, fails, max_tests):
+	""" Delta debugging (ddmin): returns a minimal subset of features for
+	which fails(subset) is still true, trying at most max_tests subsets. If
+	the budget runs out, the smallest failing subset found so far is
+	returned """
+	items = sorted(features.items())
+	results = {}
+	tests = [0]
+
+	def test(subset):
+		key = tuple(option for option, value in subset)
+		if key not in results:
+			if tests[0] >= max_tests:
+				return False
+			tests[0] += 1
+			results[key] = fails(dict(subset))
+		return results[key]
+
+	granularity = 2
+	while len(items) >= 2:
+		chunk = int(math.ceil(len(items) / granularity))
+		subsets = [items[i:i + chunk] for i in range(0, len(items), chunk)]
+		reduced = False
+		for subset in subsets:
+			if test(subset):
+				items = subset
+				granularity = 2
+				reduced = True
+				break
+		if not reduced and granularity > 2:
+			for i in range(len(subsets)):
+				complement = [item for j, subset in enumerate(subsets) if j != i for item in subset]
+				if test(complement):
+					items = complement
+					granularity = max(granularity - 1, 2)
+					reduced = True
+					break
+		if not reduced:
+			if granularity >= len(items) or tests[0] >= max_tests:
+				break
+			granularity = min(len(items), granularity * 2)
+	return dict(items)
+
+
+def get_features_string(features):
+	return " ".join("-D" + option + ("" if value is None else "=" + str(value))
+		for option, value in sorted(features.items()))
+
+
+def help_str():
+	return "USAGE: constraints.py [-w workingdir] [-f] [--clear]"
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
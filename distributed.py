@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import json
+import time
+import uuid
+import hmac
+import ipaddress
+import socket
+import socketserver
+import threading
+from sqlite_bmk import SQLiteBenchmarker
+from binary_cache import BinaryCache
+from bmk_statistics import RepetitionPolicy, mean_confidence_interval
+from constraints import ConstraintStore
+from artifacts import ArtifactStore
+from storage import StoragePolicy, install_hooks
+
+
+def main(argv):
+	## default values
+	base_dir = os.path.abspath(os.getcwd())
+	address = None
+	node = socket.gethostname()
+	use_cache = True
+	cache_dir = None
+	cache_size_mb = BinaryCache.DEFAULT_MAX_SIZE_MB
+	artifacts_dir = None
+	offline = False
+	allow_unverified = False
+	token = None
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"c:w:n:h",["coordinator=","workingdir=","node=","cache-dir=","cache-size=",
+			"no-cache","artifacts-dir=","offline","allow-unverified","token-file=","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(Worker.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-c", "--coordinator"):
+			address = parse_address(arg, "localhost")
+		elif opt in ("-w", "--workingdir"):
+			base_dir = os.path.abspath(arg)
+		elif opt in ("-n", "--node"):
+			node = arg
+		elif opt == "--cache-dir":
+			cache_dir = os.path.abspath(arg)
+		elif opt == "--cache-size":
+			cache_size_mb = int(arg)
+		elif opt == "--no-cache":
+			use_cache = False
+		elif opt == "--artifacts-dir":
+			artifacts_dir = os.path.abspath(arg)
+		elif opt == "--offline":
+			offline = True
+		elif opt == "--allow-unverified":
+			allow_unverified = True
+		elif opt == "--token-file":
+			try:
+				token = read_token(arg)
+			except (OSError, ValueError) as err:
+				print(str(err))
+				sys.exit(Worker.EXIT_ERROR)
+		else:
+			print (help_str())
+			sys.exit(Worker.EXIT_ERROR)
+
+	if address is None:
+		print (help_str())
+		sys.exit(Worker.EXIT_ERROR)
+
+	if not os.path.exists(base_dir):
+		os.makedirs(base_dir)
+	cache = None
+	if use_cache:
+		if cache_dir is None:
+			cache_dir = os.path.join(base_dir, BinaryCache.NAME_DEFAULT_FOLDER)
+		cache = BinaryCache(cache_dir, max_size_mb=cache_size_mb)
+	if artifacts_dir is None:
+		artifacts_dir = os.path.join(base_dir, ArtifactStore.NAME_DEFAULT_FOLDER)
+	artifacts = ArtifactStore(artifacts_dir, offline=offline, allow_unverified=allow_unverified)
+	worker = Worker(base_dir, address, node, cache=cache, artifacts=artifacts, token=token)
+	worker.run()
+
+
+class Coordinator:
+	""" Owns the queue of configs of a campaign and hands them out to
+	workers on other nodes over a small TCP protocol: one JSON request per
+	connection, answered by one JSON line. A worker claims a config and gets
+	a lease on it, which it keeps alive with heartbeats while it compiles and
+	benchmarks. Measurements are streamed back and appended to the results
+	store of the coordinator, which stays its only writer. A lease that is
+	not renewed in time, e.g. because the worker died, is taken away and the
+	config is queued again, until it has been tried max_attempts times.
+	With a token, requests that do not carry the same token are refused.
+	The coordinator listens on localhost unless it is given another address,
+	which should only be done together with a token """
+	DEFAULT_PORT = 7733
+	DEFAULT_LEASE_SECONDS = 60
+	DEFAULT_MAX_ATTEMPTS = 3
+
+	STATUS_PENDING = "pending"
+	STATUS_LEASED = "leased"
+	STATUS_DONE = "done"
+	STATUS_FAILED = "failed"
+
+	## exit code of a config that lost its lease too often
+	EXIT_LEASE_EXPIRED = 3
+
+	## how often expired leases are looked for
+	REAP_SECONDS = 1.0
+	## how long the coordinator keeps answering after the last config, so
+	## that waiting workers learn that the campaign is done
+	LINGER_SECONDS = 3.0
+
+	def __init__(self, base_dir, config_files, num_cycles, results_store, campaign, manifest=None,
+			address=("localhost", DEFAULT_PORT), lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS,
+			worker_options=None, token=None):
+		self.base_dir = base_dir
+		self.num_cycles = num_cycles
+		self.results_store = results_store
+		self.campaign = campaign
+		self.manifest = manifest
+		self.address = address
+		self.lease_seconds = lease_seconds
+		self.max_attempts = max_attempts
+		self.worker_options = worker_options if worker_options is not None else {}
+		self.token = token
+		self.lock = threading.Lock()
+		## set once the coordinator accepts requests, self.address then has the port it listens on
+		self.listening = threading.Event()
+
+		## the queue in the order the configs are handed out
+		self.queue = {}
+		for config_file in config_files:
+			entry = {}
+			entry["config_file"] = config_file
+			entry["status"] = Coordinator.STATUS_PENDING
+			entry["attempts"] = 0
+			entry["nodes"] = []
+			self.queue[SQLiteBenchmarker.get_config_name(config_file)] = entry
+		## active leases by id
+		self.leases = {}
+
+
+	def run(self):
+		""" serves the queue until every config is done or failed and
+		returns the number of configs per status """
+		server = _CoordinatorServer(self.address, _CoordinatorHandler)
+		server.coordinator = self
+		thread = threading.Thread(target=server.serve_forever, daemon=True)
+		thread.start()
+		self.address = server.server_address
+		self.listening.set()
+		print("coordinator listening on " + format_address(server.server_address) + " with " +
+			str(len(self.queue)) + " configs")
+		try:
+			while not self.is_finished():
+				time.sleep(Coordinator.REAP_SECONDS)
+				self.requeue_expired()
+			time.sleep(Coordinator.LINGER_SECONDS)
+		finally:
+			server.shutdown()
+			server.server_close()
+		self.print_report()
+		return self.get_summary()
+
+	def handle(self, request):
+		""" answers a request of a worker """
+		if self.token is not None and not hmac.compare_digest(str(request.get("token", "")).encode('utf-8'),
+				self.token.encode('utf-8')):
+			return {"ok": False, "error": "wrong token"}
+		op = request.get("op")
+		with self.lock:
+			if op == "claim":
+				return self.claim(request["node"])
+			if op == "measurements":
+				return {"ok": True, "measurements": list(self.results_store.iter_measurements(request["config_id"],
+					self.campaign))}
+			if op == "config_info":
+				return {"ok": True, "info": self.results_store.get_config_info(request["config_id"], self.campaign)}
+
+			## everything else is only accepted from the holder of a lease
+			lease = self.leases.get(request.get("lease"))
+			if lease is None:
+				return {"ok": False, "error": "lease expired"}
+			if op == "heartbeat":
+				lease["expires"] = time.time() + self.lease_seconds
+			elif op == "add_config":
+				self.results_store.add_config(request["config_id"], lease["config_name"], request["features"],
+					request["command"])
+			elif op == "measurement":
+				self.results_store.append_measurement(request["config_id"], self.campaign, request["measurement"],
+					request["cost"])
+				if self.manifest is not None:
+					self.manifest.add_cycle(lease["config_name"])
+			elif op == "set_config_info":
+				self.results_store.set_config_info(request["config_id"], self.campaign, request["key"],
+					request["value"])
+			elif op == "finish":
+				self.finish(request["lease"], request["exit_code"])
+			else:
+				return {"ok": False, "error": "unknown request " + str(op)}
+			return {"ok": True}
+
+	def claim(self, node):
+		""" leases the next pending config to node. Tells the worker to wait
+		while other workers still hold leases, or that the campaign is done """
+		for config_name, entry in self.queue.items():
+			if entry["status"] != Coordinator.STATUS_PENDING:
+				continue
+			lease_id = uuid.uuid4().hex
+			self.leases[lease_id] = {"config_name": config_name, "node": node,
+				"expires": time.time() + self.lease_seconds}
+			entry["status"] = Coordinator.STATUS_LEASED
+			entry["attempts"] += 1
+			entry["nodes"].append(node)
+			with open(entry["config_file"]) as json_data:
+				features = json.load(json_data)["features"]
+			print("leased \"" + config_name + "\" to " + node + " (attempt " + str(entry["attempts"]) + ")")
+
+			reply = {}
+			reply["lease"] = lease_id
+			reply["lease_seconds"] = self.lease_seconds
+			reply["config_name"] = config_name
+			reply["config"] = {"features": features}
+			reply["num_cycles"] = self.num_cycles
+			reply["campaign"] = self.campaign
+			reply["options"] = self.worker_options
+			return reply
+		if self.leases:
+			return {"wait": True}
+		return {"done": True}
+
+	def finish(self, lease_id, exit_code):
+		""" closes a lease with the outcome of its config """
+		lease = self.leases.pop(lease_id)
+		entry = self.queue[lease["config_name"]]
+		if exit_code == SQLiteBenchmarker.EXIT_SUCCESS:
+			entry["status"] = Coordinator.STATUS_DONE
+			if self.manifest is not None:
+				self.manifest.set_benchmarked(lease["config_name"])
+		else:
+			entry["status"] = Coordinator.STATUS_FAILED
+			if self.manifest is not None:
+				self.manifest.set_failed(lease["config_name"], exit_code)
+		print("\"" + lease["config_name"] + "\" " + entry["status"] + " on " + lease["node"] + " (" +
+			str(self.count(Coordinator.STATUS_DONE) + self.count(Coordinator.STATUS_FAILED)) + "/" +
+			str(len(self.queue)) + ")")
+
+	def requeue_expired(self):
+		""" takes away the leases whose worker stopped sending heartbeats """
+		now = time.time()
+		with self.lock:
+			for lease_id, lease in list(self.leases.items()):
+				if lease["expires"] > now:
+					continue
+				del self.leases[lease_id]
+				entry = self.queue[lease["config_name"]]
+				if entry["attempts"] >= self.max_attempts:
+					entry["status"] = Coordinator.STATUS_FAILED
+					if self.manifest is not None:
+						self.manifest.set_failed(lease["config_name"], Coordinator.EXIT_LEASE_EXPIRED)
+					print("lease of \"" + lease["config_name"] + "\" on " + lease["node"] + " expired, giving up")
+				else:
+					entry["status"] = Coordinator.STATUS_PENDING
+					print("lease of \"" + lease["config_name"] + "\" on " + lease["node"] + " expired, queued again")
+
+	def count(self, status):
+		return sum(1 for entry in self.queue.values() if entry["status"] == status)
+
+	def is_finished(self):
+		with self.lock:
+			return self.count(Coordinator.STATUS_PENDING) + self.count(Coordinator.STATUS_LEASED) == 0
+
+	def get_summary(self):
+		summary = {}
+		for entry in self.queue.values():
+			summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+		return summary
+
+	def print_report(self):
+		""" prints the outcome of the queue and the mean cost per node. With
+		configs handed out in no particular order, a node whose mean is off
+		points to a biased host """
+		summary = self.get_summary()
+		print("__ distributed run finished: " + ", ".join(str(summary[status]) + " " + status
+			for status in sorted(summary)) + " __")
+		for node, costs in sorted(get_costs_by_node(self.results_store, self.campaign).items()):
+			mean, low, high = mean_confidence_interval(costs)
+			print("  " + node + ": " + str(len(costs)) + " measurements, mean " + str(round(mean, 4)) + " s [" +
+				str(round(low, 4)) + ", " + str(round(high, 4)) + "]")
+
+
+class _CoordinatorServer(socketserver.ThreadingTCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+	""" reads one request line and writes the answer of the coordinator """
+
+	def handle(self):
+		line = self.rfile.readline()
+		if not line:
+			return
+		try:
+			reply = self.server.coordinator.handle(json.loads(line.decode('utf-8')))
+		except Exception as err:
+			reply = {"ok": False, "error": str(err)}
+		self.wfile.write((json.dumps(reply) + "\n").encode('utf-8'))
+
+
+class Worker:
+	""" Claims configs from a coordinator until the campaign is done. Each
+	config is compiled and benchmarked in the working folder of the worker
+	with SQLiteBenchmarker, whose results store and manifest forward to the
+	coordinator. A heartbeat thread renews the lease meanwhile. Measurements
+	are tagged with the node, so that bias between hosts can be checked """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	POLL_SECONDS = 1.0
+	REQUEST_TIMEOUT = 60
+	## the coordinator is given up after this many failed connections in a row
+	MAX_CONNECT_FAILURES = 5
+
+	def __init__(self, base_dir, address, node, cache=None, artifacts=None, token=None):
+		self.base_dir = base_dir
+		self.address = address
+		self.node = node
+		self.cache = cache
+		self.token = token
+		## the sources of a sqlite version are prepared when the first config needs it
+		self.artifacts = artifacts
+		self.prepared_versions = set()
+		self.config_folder = os.path.join(self.base_dir, 'compile-configs')
+
+
+	def request(self, request):
+		if self.token is not None:
+			request["token"] = self.token
+		return send_request(self.address, request, Worker.REQUEST_TIMEOUT)
+
+	def run(self):
+		""" works on configs until the coordinator has none left, returns
+		how many configs have been worked on """
+		done = 0
+		failures = 0
+		print("worker " + self.node + " asking " + format_address(self.address) + " for work")
+		while True:
+			try:
+				reply = self.request({"op": "claim", "node": self.node})
+			except OSError as err:
+				failures += 1
+				if failures >= Worker.MAX_CONNECT_FAILURES:
+					print("coordinator not reachable (" + str(err) + "), stopping")
+					break
+				time.sleep(Worker.POLL_SECONDS)
+				continue
+			failures = 0
+			if "error" in reply:
+				print("coordinator refused the worker: " + reply["error"] + ", stopping")
+				break
+			if reply.get("done"):
+				break
+			if reply.get("wait"):
+				time.sleep(Worker.POLL_SECONDS)
+				continue
+			self.process(reply)
+			done += 1
+		print("worker " + self.node + " finished after " + str(done) + " configs")
+		return done
+
+	def process(self, claim):
+		""" compiles and benchmarks a claimed config and reports the outcome """
+		if not os.path.exists(self.config_folder):
+			os.makedirs(self.config_folder)
+		config_file = os.path.join(self.config_folder, claim["config_name"] + ".cfg")
+		with open(config_file, 'w') as f:
+			f.write(json.dumps(claim["config"], indent=4, sort_keys=True))
+
+		print("\n\n__ Worker " + self.node + ": config \"" + claim["config_name"] + "\" __")
+		heartbeat = _Heartbeat(self, claim["lease"], claim["lease_seconds"])
+		heartbeat.start()
+		try:
+			self.prepare_sources(config_file)
+			options = dict(claim["options"])
+			if options.get("repetition") is not None:
+				options["repetition"] = RepetitionPolicy(**options["repetition"])
+			## syncs of the in-process driver are only counted if the worker runs with the sync counter preloaded
+			if options.get("storage") is not None:
+				options["storage"] = StoragePolicy(**options["storage"])
+				install_hooks(self.base_dir)
+			bmk = SQLiteBenchmarker(base_dir=self.base_dir, config_file=config_file, num_cycles=claim["num_cycles"],
+				cache=self.cache, results_store=RemoteResultsStore(self, claim["lease"]), campaign=claim["campaign"],
+				manifest=RemoteManifest(), constraints=ConstraintStore(self.base_dir),
+				node=self.node, **options)
+			c_result = bmk.compile()
+			if c_result == SQLiteBenchmarker.EXIT_SUCCESS:
+				c_result = bmk.run_benchmark()
+		except Exception as err:
+			print("config \"" + claim["config_name"] + "\" failed: " + str(err))
+			c_result = SQLiteBenchmarker.EXIT_ERROR
+		finally:
+			heartbeat.stop()
+		try:
+			self.request({"op": "finish", "lease": claim["lease"], "exit_code": c_result})
+		except OSError as err:
+			print("could not report the outcome: " + str(err))
+
+	def prepare_sources(self, config_file):
+		versions = [version for version in SQLiteBenchmarker.get_sqlite_versions([config_file])
+			if version not in self.prepared_versions]
+		if versions:
+			SQLiteBenchmarker.prepare_sources(self.base_dir, versions, self.artifacts)
+			self.prepared_versions.update(versions)
+
+
+class _Heartbeat(threading.Thread):
+	""" renews a lease four times per lease period until stopped """
+
+	def __init__(self, worker, lease, lease_seconds):
+		threading.Thread.__init__(self, daemon=True)
+		self.worker = worker
+		self.lease = lease
+		self.interval = lease_seconds / 4
+		self.stopped = threading.Event()
+
+	def run(self):
+		while not self.stopped.wait(self.interval):
+			try:
+				reply = self.worker.request({"op": "heartbeat", "lease": self.lease})
+				if not reply["ok"]:
+					print("lost the lease, the config has been handed to another worker")
+					return
+			except OSError:
+				## the next heartbeat may get through, the lease is not lost yet
+				pass
+
+	def stop(self):
+		self.stopped.set()
+		self.join()
+
+
+class RemoteResultsStore:
+	""" The part of ResultsStore that SQLiteBenchmarker uses, forwarded to
+	the coordinator under the lease of the config """
+
+	def __init__(self, worker, lease):
+		self.worker = worker
+		self.lease = lease
+
+
+	def add_config(self, config_id, config_name, features, command):
+		self.send({"op": "add_config", "config_id": config_id, "features": features, "command": command})
+
+	def append_measurement(self, config_id, campaign, measurement, cost):
+		self.send({"op": "measurement", "config_id": config_id, "measurement": measurement, "cost": cost})
+
+	def set_config_info(self, config_id, campaign, key, value):
+		self.send({"op": "set_config_info", "config_id": config_id, "key": key, "value": value})
+
+	def get_config_info(self, config_id, campaign=None):
+		return self.worker.request({"op": "config_info", "config_id": config_id})["info"]
+
+	def iter_measurements(self, config_id, campaign=None):
+		""" the measurements the coordinator has of config_id in the campaign """
+		return iter(self.worker.request({"op": "measurements", "config_id": config_id})["measurements"])
+
+	def send(self, request):
+		request["lease"] = self.lease
+		reply = self.worker.request(request)
+		if not reply["ok"]:
+			print("coordinator refused " + request["op"] + ": " + reply.get("error", ""))
+
+	def close(self):
+		pass
+
+
+class RemoteManifest:
+	""" Stands in for the campaign manifest on a worker. The coordinator
+	keeps the manifest up to date from the streamed measurements and the
+	outcome of the config; the worker resumes after the measurements the
+	coordinator has of the config """
+
+	def is_compiled(self, config_name):
+		## the worker has its own build folder and compiles every config
+		return False
+
+	def set_compiled(self, config_name):
+		pass
+
+	def set_failed(self, config_name, exit_code):
+		pass
+
+	def add_cycle(self, config_name):
+		pass
+
+	def set_benchmarked(self, config_name):
+		pass
+
+
+def get_costs_by_node(results_store, campaign=None):
+	""" returns the costs of all measurements of the campaign by the node
+	that took them """
+	costs = {}
+	for config in results_store.iter_configs():
+		for measurement in results_store.iter_measurements(config["config_id"], campaign):
+			node = measurement.get("node", "local")
+			costs.setdefault(node, []).append(SQLiteBenchmarker.get_cost(measurement))
+	return costs
+
+
+def send_request(address, request, timeout):
+	""" sends one request to the coordinator and returns its answer """
+	with socket.create_connection(address, timeout=timeout) as sock:
+		sock.sendall((json.dumps(request) + "\n").encode('utf-8'))
+		with sock.makefile('rb') as f:
+			line = f.readline()
+	if not line:
+		raise ConnectionError("no answer from the coordinator")
+	return json.loads(line.decode('utf-8'))
+
+
+def parse_address(arg, default_host=""):
+	""" parses host:port or a port alone """
+	host, separator, port = arg.rpartition(":")
+	if not separator:
+		host = default_host
+	return (host, int(port))
+
+
+def is_loopback(host):
+	""" tells whether host only accepts connections from this machine """
+	if host == "localhost":
+		return True
+	try:
+		return ipaddress.ip_address(host).is_loopback
+	except ValueError:
+		return False
+
+
+def read_token(path):
+	""" reads the token that coordinator and workers share from the first
+	line of the file path, which keeps it out of the process list """
+	with open(path) as f:
+		token = f.readline().strip()
+	if not token:
+		raise ValueError("the token file " + path + " is empty")
+	return token
+
+
+def format_address(address):
+	return (address[0] or "*") + ":" + str(address[1])
+
+
+def help_str():
+	return ("USAGE: distributed.py -c host:port [-w workingdir] [-n node] [--cache-dir dir] [--no-cache]\n"
+		"\t[--artifacts-dir dir] [--offline] [--allow-unverified] [--token-file file]")
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
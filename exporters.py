@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import io
+import json
+import time
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+import xml.dom.minidom as minidom
+
+
+def main(argv):
+	""" benchmarks the streaming exporters against building the whole
+	document in memory, for growing numbers of configs """
+	## default values
+	sizes = [10, 100, 1000]
+	num_measurements = 10
+	legacy = True
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"s:m:h",["sizes=","measurements=","no-legacy","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-s", "--sizes"):
+			sizes = [int(size) for size in arg.split(",")]
+		elif opt in ("-m", "--measurements"):
+			num_measurements = int(arg)
+		elif opt == "--no-legacy":
+			legacy = False
+		else:
+			print (help_str())
+			sys.exit(EXIT_ERROR)
+
+	exporters = [("streaming", write_json_results, write_xml_results)]
+	if legacy:
+		exporters.append(("in-memory", write_json_results_in_memory, write_xml_results_in_memory))
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		print("configs measurements exporter   json-s  xml-s   peak-mb  size-mb")
+		for num_configs in sizes:
+			for name, write_json, write_xml in exporters:
+				json_path = os.path.join(tmp_dir, 'all-in-one-results.json')
+				xml_path = os.path.join(tmp_dir, 'all-in-one-results.xml')
+				tracemalloc.start()
+				start = time.perf_counter()
+				write_json(json_path, get_synthetic_results(num_configs, num_measurements))
+				json_seconds = time.perf_counter() - start
+				start = time.perf_counter()
+				write_xml(xml_path, get_synthetic_results(num_configs, num_measurements))
+				xml_seconds = time.perf_counter() - start
+				peak = tracemalloc.get_traced_memory()[1]
+				tracemalloc.stop()
+				size = os.path.getsize(json_path) + os.path.getsize(xml_path)
+				print("%7d %12d %-10s %7.2f %7.2f %8.1f %8.1f" % (num_configs, num_measurements, name,
+					json_seconds, xml_seconds, peak / 2 ** 20, size / 2 ** 20))
+
+
+## exit flags
+EXIT_SUCCESS = 0
+EXIT_ERROR = 2
+
+
+## indentation of the all-in-one files
+JSON_INDENT = 4
+XML_INDENT = "   "
+
+## config level nodes of a result in the XML file, in this order
+XML_RESULT_INFO_KEYS = ["statistics", "racing", "ab"]
+
+
+def write_json_results(path, results):
+	""" writes the all-in-one json file {"results": [...]} one result, and
+	inside a result one measurement, at a time. results may be any iterable
+	of result dicts whose "measurements" may be iterators as well. The file
+	matches json.dumps(..., indent=4, sort_keys=True) of the whole list """
+	with open(path, 'w') as f:
+		f.write('{\n' + _indent(1) + '"results": [')
+		first_result = True
+		for result in results:
+			f.write('\n' if first_result else ',\n')
+			first_result = False
+			_write_json_result(f, result, 2)
+		if not first_result:
+			f.write('\n' + _indent(1))
+		f.write(']\n}')
+
+
+def _write_json_result(f, result, level):
+	f.write(_indent(level) + '{')
+	first_key = True
+	for key in sorted(result):
+		f.write('\n' if first_key else ',\n')
+		first_key = False
+		f.write(_indent(level + 1) + json.dumps(key) + ': ')
+		if key == "measurements":
+			f.write('[')
+			first_measurement = True
+			for measurement in result[key]:
+				f.write('\n' if first_measurement else ',\n')
+				first_measurement = False
+				f.write(_indent(level + 2) + _dumps_nested(measurement, level + 2))
+			if not first_measurement:
+				f.write('\n' + _indent(level + 1))
+			f.write(']')
+		else:
+			f.write(_dumps_nested(result[key], level + 1))
+	f.write('\n' + _indent(level) + '}')
+
+
+def _dumps_nested(value, level):
+	""" dumps value as it would appear level indentations deep """
+	return json.dumps(value, indent=JSON_INDENT, sort_keys=True).replace('\n', '\n' + _indent(level))
+
+
+def _indent(level):
+	return " " * (JSON_INDENT * level)
+
+
+def write_xml_results(path, results):
+	""" writes the all-in-one XML file one measurement at a time. Only the
+	element of the current measurement is built in memory. Every element is
+	pretty printed by minidom, so the file matches the in-memory exporter
+	byte for byte """
+	with open(path, 'w') as f:
+		f.write('<?xml version="1.0" ?>\n')
+		empty = True
+		for result in results:
+			if empty:
+				f.write('<results>\n')
+				empty = False
+			## the result without its measurements, which end up as the empty last child
+			result_node = ET.Element("result", id=result["id"])
+			ET.SubElement(result_node, "id").text = result["id"]
+			ET.SubElement(result_node, "command").text = result["command"]
+			for key in XML_RESULT_INFO_KEYS:
+				if key in result:
+					add_counters_node(result_node, key, result[key])
+			ET.SubElement(result_node, "measurements")
+			head, placeholder, tail = _get_pretty_xml(result_node, 1).rpartition(
+				'\n' + XML_INDENT * 2 + '<measurements/>\n')
+			f.write(head + '\n')
+
+			# add one node for each benchmark run
+			first_measurement = True
+			for i, measurement in enumerate(result["measurements"]):
+				if first_measurement:
+					f.write(XML_INDENT * 2 + '<measurements>\n')
+					first_measurement = False
+				f.write(_get_pretty_xml(get_measurement_node(i, measurement), 3))
+			if first_measurement:
+				f.write(XML_INDENT * 2 + '<measurements/>\n')
+			else:
+				f.write(XML_INDENT * 2 + '</measurements>\n')
+			f.write(tail)
+		f.write('<results/>\n' if empty else '</results>\n')
+
+
+def _get_pretty_xml(element, level):
+	""" returns element as minidom pretty prints it level indentations deep """
+	out = io.StringIO()
+	minidom.parseString(ET.tostring(element)).documentElement.writexml(out, XML_INDENT * level, XML_INDENT, '\n')
+	return out.getvalue()
+
+
+def get_measurement_node(i, measurement):
+	""" returns the XML element of the i-th measurement of a result """
+	measurement_node = ET.Element("measurement", id=str(i))
+	cost_in_seconds_node = ET.SubElement(measurement_node, "cost-in-seconds")
+	cost_in_seconds_node.text = str(measurement["cost_in_seconds"])
+	finish_node = ET.SubElement(measurement_node, "finish")
+	finish_node.text = str(measurement["finish"])
+	start_node = ET.SubElement(measurement_node, "start")
+	start_node.text = str(measurement["start"])
+	start_human_readable_node = ET.SubElement(measurement_node, "start-human-readable")
+	start_human_readable_node.text = str(measurement["start_human_readable"])
+	if "duration_ns" in measurement:
+		duration_node = ET.SubElement(measurement_node, "duration-ns")
+		duration_node.text = str(measurement["duration_ns"])
+	if "tpmC" in measurement:
+		tpmc_node = ET.SubElement(measurement_node, "tpmC")
+		tpmc_node.text = str(measurement["tpmC"])
+	if "transactions" in measurement:
+		add_transactions_node(measurement_node, measurement["transactions"])
+	if "workloads" in measurement:
+		add_workloads_node(measurement_node, measurement["workloads"])
+	if "node" in measurement:
+		node_node = ET.SubElement(measurement_node, "node")
+		node_node.text = str(measurement["node"])
+	if "build" in measurement:
+		add_counters_node(measurement_node, "build", measurement["build"])
+	if "storage" in measurement:
+		add_counters_node(measurement_node, "storage", measurement["storage"])
+	if "io" in measurement:
+		add_counters_node(measurement_node, "io", measurement["io"])
+	if "rusage" in measurement:
+		add_counters_node(measurement_node, "rusage", measurement["rusage"])
+	if "perf_counters" in measurement:
+		add_counters_node(measurement_node, "perf-counters", measurement["perf_counters"])
+	return measurement_node
+
+
+def add_transactions_node(parent, transactions):
+	""" appends the per transaction type metrics of a measurement to the
+	XML node parent """
+	transactions_node = ET.SubElement(parent, "transactions")
+	for txn in sorted(transactions):
+		txn_info = transactions[txn]
+		txn_node = ET.SubElement(transactions_node, "transaction", type=txn)
+		count_node = ET.SubElement(txn_node, "count")
+		count_node.text = str(txn_info["count"])
+		rate_node = ET.SubElement(txn_node, "rate")
+		rate_node.text = str(txn_info["rate"])
+		add_latency_node(txn_node, txn_info.get("latency_ns", {}))
+
+
+def add_latency_node(parent, latency):
+	""" appends a latency summary with its histogram to parent """
+	latency_node = ET.SubElement(parent, "latency-ns")
+	for key in sorted(latency):
+		if key == "histogram":
+			histogram_node = ET.SubElement(latency_node, "histogram")
+			for upper in sorted(latency["histogram"], key=int):
+				bucket_node = ET.SubElement(histogram_node, "bucket", le=upper)
+				bucket_node.text = str(latency["histogram"][upper])
+		else:
+			value_node = ET.SubElement(latency_node, key)
+			value_node.text = str(latency[key])
+
+
+def add_workloads_node(parent, workloads):
+	""" appends the metrics of the micro-workloads of a measurement to the
+	XML node parent """
+	workloads_node = ET.SubElement(parent, "workloads")
+	for name in sorted(workloads):
+		metrics = workloads[name]
+		workload_node = ET.SubElement(workloads_node, "workload", name=name)
+		for key in sorted(metrics):
+			if key == "latency_ns":
+				add_latency_node(workload_node, metrics[key])
+			elif key == "rusage":
+				add_counters_node(workload_node, "rusage", metrics[key])
+			else:
+				value_node = ET.SubElement(workload_node, key.replace("_", "-"))
+				value_node.text = str(metrics[key])
+
+
+def add_counters_node(parent, name, counters):
+	""" appends a flat dict of counters as XML node name to parent """
+	_fill_counters_node(ET.SubElement(parent, name), counters)
+
+
+def _fill_counters_node(counters_node, counters):
+	for key in sorted(counters):
+		counter_node = ET.SubElement(counters_node, key.replace("_", "-"))
+		counter_node.text = str(counters[key])
+
+
+def write_json_results_in_memory(path, results):
+	""" the former exporter, which materializes all results first """
+	results = [dict(result, measurements=list(result["measurements"])) for result in results]
+	with open(path, 'w') as f:
+		f.write(json.dumps({"results": results}, indent=JSON_INDENT, sort_keys=True))
+
+
+def write_xml_results_in_memory(path, results):
+	""" the former exporter, which builds the whole tree and pretty prints
+	it with minidom """
+	root = ET.Element("results")
+	for result in results:
+		result_node = ET.SubElement(root, "result", id=result["id"])
+		ET.SubElement(result_node, "id").text = result["id"]
+		ET.SubElement(result_node, "command").text = result["command"]
+		for key in XML_RESULT_INFO_KEYS:
+			if key in result:
+				add_counters_node(result_node, key, result[key])
+		measurements_node = ET.SubElement(result_node, "measurements")
+		for i, measurement in enumerate(result["measurements"]):
+			measurements_node.append(get_measurement_node(i, measurement))
+	xmlstr = minidom.parseString(ET.tostring(root)).toprettyxml(indent=XML_INDENT)
+	with open(path, 'w') as f:
+		f.write(xmlstr)
+
+
+def get_synthetic_results(num_configs, num_measurements):
+	""" yields results shaped like those of an in-process run """
+	for n in range(num_configs):
+		result = {}
+		result["id"] = "%064x" % n
+		result["command"] = "gcc -o sqlite3 shell.c sqlite3.c -lpthread -ldl -DX" + str(n)
+		result["statistics"] = {"cycles": num_measurements, "mean": 1.0, "ci_low": 0.98, "ci_high": 1.02}
+		result["measurements"] = (get_synthetic_measurement(i) for i in range(num_measurements))
+		yield result
+
+
+def get_synthetic_measurement(i):
+	start = 1.7e12 + i * 1000.0
+	latency = {"mean": 52000.0, "min": 21000, "max": 910000, "p50": 48000, "p95": 120000, "p99": 300000,
+		"histogram": {str(1 << bit): 100 * bit for bit in range(14, 21)}}
+	measurement = {}
+	measurement["cost_in_seconds"] = 1.0
+	measurement["start"] = start
+	measurement["finish"] = start + 1000.0
+	measurement["start_human_readable"] = "2026-01-01T00:00:00.000000"
+	measurement["duration_ns"] = 1000000000
+	measurement["tpmC"] = 4200.0
+	measurement["transactions"] = {txn: {"count": 700, "rate": 700.0, "latency_ns": latency}
+		for txn in ["DELIVERY", "NEW_ORDER", "ORDER_STATUS", "PAYMENT", "STOCK_LEVEL"]}
+	measurement["rusage"] = {"user_time": 0.9, "system_time": 0.1, "max_rss_kb": 20000}
+	return measurement
+
+
+def help_str():
+	return "USAGE: exporters.py [-s 10,100,1000] [-m measurements per config] [--no-legacy]"
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import json
+import math
+import itertools
+import numpy as np
+from build_modes import parse_build_flags, BUILD_PGO, BUILD_SQLITE_VERSION, DEFAULT_SQLITE_VERSION
+from config_creator import ConfigCreator
+from results_store import ResultsStore
+from bmk_statistics import t_quantile
+
+
+def main(argv):
+	## default values
+	base_dir = os.path.abspath(os.getcwd())
+	options_file = os.path.join(base_dir, 'compile-options.json')
+	store_path = os.path.join(base_dir, ResultsStore.NAME_DEFAULT_FILE)
+	results_file = None
+	campaign = None
+	num_interaction_options = InfluenceModel.DEFAULT_INTERACTION_OPTIONS
+	ridge = InfluenceModel.DEFAULT_RIDGE
+	log_cost = False
+	confidence = InfluenceModel.DEFAULT_CONFIDENCE
+	top = None
+	predict_files = []
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"o:s:r:i:n:p:h",["optionsfile=","store=","results=","campaign=",
+			"interactions=","ridge=","log","confidence=","top=","predict=","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(InfluenceModel.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-o", "--optionsfile"):
+			options_file = os.path.abspath(arg)
+		elif opt in ("-s", "--store"):
+			store_path = os.path.abspath(arg)
+		elif opt in ("-r", "--results"):
+			results_file = os.path.abspath(arg)
+		elif opt == "--campaign":
+			campaign = arg
+		elif opt in ("-i", "--interactions"):
+			num_interaction_options = int(arg)
+		elif opt == "--ridge":
+			ridge = float(arg)
+		elif opt == "--log":
+			log_cost = True
+		elif opt == "--confidence":
+			confidence = float(arg)
+		elif opt in ("-n", "--top"):
+			top = int(arg)
+		elif opt in ("-p", "--predict"):
+			predict_files.append(os.path.abspath(arg))
+		else:
+			print (help_str())
+			sys.exit(InfluenceModel.EXIT_ERROR)
+
+	if results_file is not None:
+		groups = load_groups_from_results_file(results_file, log_cost)
+	elif os.path.isfile(store_path):
+		store = ResultsStore(store_path)
+		groups = load_groups_from_store(store, campaign, log_cost)
+	else:
+		print("neither a results store nor a results file to fit to")
+		sys.exit(InfluenceModel.EXIT_ERROR)
+
+	options = {}
+	if os.path.isfile(options_file):
+		with open(options_file) as json_data:
+			options = ConfigCreator.parse_options(json.load(json_data))
+	encoder = FeatureEncoder(options, [group["features"] for group in groups])
+
+	model = InfluenceModel(encoder, ridge=ridge, log_cost=log_cost, confidence=confidence)
+	model.fit(groups, num_interaction_options)
+	model.print_effects(top)
+
+	for predict_file in predict_files:
+		with open(predict_file) as json_data:
+			features = json.load(json_data)["features"]
+		print("predicted cost of " + os.path.basename(predict_file) + ": " +
+			str(round(model.predict(features), 4)) + " s")
+
+
+class FeatureEncoder:
+	""" Turns features dicts into rows of numbers. A unary option is one
+	column that is 1 if it is set. A list option has one column per value
+	other than its default (treatment coding). A range option is one column,
+	the distance of its value from the default relative to the width of the
+	range, so its coefficient is the effect of going over the whole range.
+	Options that are not set take their default, i.e. all their columns are
+	0. Options found in the data but not in options are treated as unary if
+	they never have a value and as list options otherwise """
+
+	def __init__(self, options, features_list=()):
+		self.options = dict(options)
+		observed = {}
+		for features in features_list:
+			for option, value in features.items():
+				observed.setdefault(option, set()).add(value)
+		for option, values in observed.items():
+			if option in self.options:
+				continue
+			if values == {None}:
+				self.options[option] = None
+			else:
+				values = sorted((value for value in values if value is not None), key=str)
+				self.options[option] = {"type": "list", "values": values, "default": None}
+
+		## the columns, as (name of the term, option, kind, value)
+		self.columns = []
+		for option in sorted(self.options):
+			desc = self.options[option]
+			if desc is None:
+				self.columns.append((option, option, "unary", None))
+			elif desc.get("type") == "range":
+				values = desc["values"]
+				name = option + " (" + str(values[0]) + ".." + str(values[-1]) + ")"
+				self.columns.append((name, option, "range", (desc["default"], values[-1] - values[0])))
+			else:
+				for value in desc["values"]:
+					if value != desc["default"]:
+						self.columns.append((option + "=" + str(value), option, "list", value))
+
+
+	def get_terms(self):
+		""" returns the names of the columns """
+		return [column[0] for column in self.columns]
+
+	def get_options_of_columns(self):
+		return [column[1] for column in self.columns]
+
+	def encode(self, features):
+		""" returns the row of a features dict """
+		row = []
+		for name, option, kind, info in self.columns:
+			if kind == "unary":
+				row.append(1.0 if option in features else 0.0)
+			elif kind == "range":
+				default, width = info
+				value = features.get(option, default)
+				row.append((float(value) - default) / width if width else 0.0)
+			else:
+				row.append(1.0 if option in features and features[option] == info else 0.0)
+		return row
+
+
+class InfluenceModel:
+	""" A performance-influence model: the cost of a config as the sum of an
+	intercept, one main effect per encoded option column and the pairwise
+	interactions of the options with the strongest main effects. It is a
+	ridge regression fitted to the measurements of every config; since
+	repeated measurements of a config share their row, only one row per
+	config is needed and the fit takes milliseconds even for 100k
+	measurements. With log_cost the effects are relative (log of the
+	factor on the cost) instead of seconds """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	DEFAULT_RIDGE = 1e-6
+	DEFAULT_INTERACTION_OPTIONS = 4
+	DEFAULT_CONFIDENCE = 0.95
+
+	def __init__(self, encoder, ridge=DEFAULT_RIDGE, log_cost=False, confidence=DEFAULT_CONFIDENCE):
+		self.encoder = encoder
+		self.ridge = ridge
+		self.log_cost = log_cost
+		self.confidence = confidence
+		self.interactions = []
+		self.coefficients = None
+
+
+	def fit(self, groups, num_interaction_options=DEFAULT_INTERACTION_OPTIONS, interactions=None):
+		""" fits the model to groups of measurements, one group per config
+		with its features, count, sum and sum of squares of the cost. The
+		interactions are given as pairs of column indices, or chosen among
+		the columns of the num_interaction_options options with the largest
+		main effects """
+		self.interactions = []
+		self.fit_terms(groups)
+		if interactions is None:
+			interactions = self.get_strongest_pairs(num_interaction_options)
+		if interactions:
+			self.interactions = interactions
+			self.fit_terms(groups)
+		return self
+
+	def fit_terms(self, groups):
+		""" least squares on one row per config, weighted by the number of
+		measurements of the config """
+		x = np.array([self.get_row(group["features"]) for group in groups])
+		counts = np.array([group["count"] for group in groups], dtype=float)
+		sums = np.array([group["sum"] for group in groups], dtype=float)
+		sums_of_squares = np.array([group["sum_of_squares"] for group in groups], dtype=float)
+		means = sums / counts
+		## terms that are 0 for every config cannot be estimated
+		self.observed = np.any(x != 0, axis=0)
+
+		gram = x.T @ (x * counts[:, None])
+		penalty = self.ridge * max(1.0, np.trace(gram) / len(gram)) * np.eye(len(gram))
+		## the intercept is not penalized
+		penalty[0, 0] = 0.0
+		inverse = np.linalg.pinv(gram + penalty)
+		self.coefficients = inverse @ (x.T @ sums)
+
+		## residuals of the measurements: between the configs and around their means
+		predicted = x @ self.coefficients
+		within = np.sum(sums_of_squares - counts * means ** 2)
+		between = np.sum(counts * (means - predicted) ** 2)
+		self.num_measurements = int(np.sum(counts))
+		self.num_configs = len(groups)
+		dof = self.num_measurements - np.linalg.matrix_rank(gram)
+		residual_sum = max(0.0, within) + between
+		total_sum = np.sum(sums_of_squares) - np.sum(sums) ** 2 / self.num_measurements
+		self.r_squared = 1.0 - residual_sum / total_sum if total_sum > 0 else 0.0
+		if dof > 0:
+			sigma_squared = residual_sum / dof
+			self.standard_errors = np.sqrt(np.maximum(0.0, sigma_squared * np.diag(inverse @ gram @ inverse)))
+			self.t = t_quantile(0.5 + self.confidence / 2, dof)
+			## posterior covariance of the ridge estimate, which stays wide
+			## along terms the measured configs say little about
+			self.prediction_covariance = sigma_squared * inverse
+		else:
+			self.standard_errors = np.full(len(gram), np.inf)
+			self.t = 0.0
+			self.prediction_covariance = None
+
+	def get_row(self, features):
+		""" returns the encoded row of a features dict with intercept and
+		interaction columns """
+		row = self.encoder.encode(features)
+		return [1.0] + row + [row[a] * row[b] for a, b in self.interactions]
+
+	def get_terms(self):
+		terms = self.encoder.get_terms()
+		return ["(intercept)"] + terms + [terms[a] + " x " + terms[b] for a, b in self.interactions]
+
+	def get_strongest_pairs(self, num_options):
+		""" returns the pairs of columns of different options among the
+		num_options options with the largest absolute main effect """
+		if num_options < 2:
+			return []
+		column_options = self.encoder.get_options_of_columns()
+		strength = {}
+		for i, option in enumerate(column_options):
+			strength[option] = max(strength.get(option, 0.0), abs(self.coefficients[i + 1]))
+		strongest = sorted(strength, key=lambda option: -strength[option])[:num_options]
+		columns = [i for i, option in enumerate(column_options) if option in strongest]
+		return [(a, b) for a, b in itertools.combinations(columns, 2) if column_options[a] != column_options[b]]
+
+	def predict(self, features):
+		""" returns the predicted cost of a config in seconds """
+		prediction = float(np.dot(self.get_row(features), self.coefficients))
+		if self.log_cost:
+			return math.exp(prediction)
+		return prediction
+
+	def get_prediction_std(self, features):
+		""" returns the standard deviation of the predicted (log) cost of a
+		config, or 0 if the model has no residual degrees of freedom """
+		if self.prediction_covariance is None:
+			return 0.0
+		row = np.array(self.get_row(features))
+		return float(math.sqrt(max(0.0, row @ self.prediction_covariance @ row)))
+
+	def get_effects(self):
+		""" returns all terms but the intercept with their effect and its
+		confidence interval, ranked by the absolute effect. Terms that
+		never occur in the measured configs are left out """
+		effects = []
+		for term, coefficient, error, observed in zip(self.get_terms(), self.coefficients, self.standard_errors,
+				self.observed):
+			if not observed:
+				continue
+			effect = {}
+			effect["term"] = term
+			effect["effect"] = float(coefficient)
+			effect["ci_low"] = float(coefficient - self.t * error)
+			effect["ci_high"] = float(coefficient + self.t * error)
+			effects.append(effect)
+		return sorted(effects[1:], key=lambda effect: -abs(effect["effect"]))
+
+	def print_effects(self, top=None):
+		unit = "log cost" if self.log_cost else "s"
+		print("fitted " + str(len(self.coefficients)) + " terms to " + str(self.num_measurements) +
+			" measurements of " + str(self.num_configs) + " configs, R^2 " + str(round(self.r_squared, 3)))
+		print("intercept: " + str(round(float(self.coefficients[0]), 4)) + " " + unit)
+		effects = self.get_effects()
+		if top is not None:
+			effects = effects[:top]
+		width = max([len(effect["term"]) for effect in effects] + [4])
+		print("term".ljust(width) + "  effect (" + unit + ")  " + str(int(100 * self.confidence)) + "% ci")
+		for effect in effects:
+			significant = "*" if effect["ci_low"] > 0 or effect["ci_high"] < 0 else " "
+			print(effect["term"].ljust(width) + "  " + ("%+.4f" % effect["effect"]).rjust(12) + " " + significant +
+				"  [" + ("%+.4f" % effect["ci_low"]) + ", " + ("%+.4f" % effect["ci_high"]) + "]")
+
+
+def get_groups(features_by_id, costs, log_cost=False):
+	""" sums up (config id, cost) pairs into one group per config """
+	groups = {}
+	for config_id, cost in costs:
+		if config_id not in features_by_id:
+			continue
+		if log_cost:
+			cost = math.log(cost)
+		if config_id not in groups:
+			groups[config_id] = {"features": features_by_id[config_id], "count": 0, "sum": 0.0, "sum_of_squares": 0.0}
+		group = groups[config_id]
+		group["count"] += 1
+		group["sum"] += cost
+		group["sum_of_squares"] += cost * cost
+	return list(groups.values())
+
+
+def load_groups_from_store(store, campaign=None, log_cost=False):
+	""" returns the measurement groups of all configs in a results store """
+	features_by_id = {config["config_id"]: config["features"] for config in store.iter_configs()}
+	return get_groups(features_by_id, store.iter_costs(campaign), log_cost)
+
+
+def load_groups_from_results_file(path, log_cost=False):
+	""" returns the measurement groups of an all-in-one-results.json file,
+	with the features recovered from the compile commands and the sqlite
+	version and profile guided builds from the build the measurements were
+	taken with """
+	with open(path) as json_data:
+		results = json.load(json_data)["results"]
+	features_by_id = {}
+	costs = []
+	for result in results:
+		features_by_id[result["id"]] = parse_compile_command(result["command"])
+		for measurement in result["measurements"]:
+			build = measurement.get("build", {})
+			version = build.get("sqlite_version", DEFAULT_SQLITE_VERSION)
+			if version != DEFAULT_SQLITE_VERSION:
+				features_by_id[result["id"]][BUILD_SQLITE_VERSION] = version
+			if build.get("pgo"):
+				features_by_id[result["id"]][BUILD_PGO] = None
+			if "duration_ns" in measurement:
+				costs.append((result["id"], measurement["duration_ns"] / 1e9))
+			else:
+				costs.append((result["id"], measurement["cost_in_seconds"]))
+	return get_groups(features_by_id, costs, log_cost)
+
+
+def parse_compile_command(command):
+	""" returns the features dict of a compile command: every -DNAME is a
+	unary option, every -DNAME=value an option with a (numeric) value, and
+	the compiler and its flags are the build options """
+	features = parse_build_flags(command)
+	for token in command.split():
+		if not token.startswith("-D"):
+			continue
+		option, separator, value = token[2:].partition("=")
+		if not separator:
+			features[option] = None
+			continue
+		try:
+			features[option] = int(value)
+		except ValueError:
+			features[option] = value
+	return features
+
+
+def help_str():
+	return ("USAGE: influence_model.py [-o compile-options.json] [-s results.db | -r all-in-one-results.json]\n"
+		"\t[--campaign name] [-i interaction options] [--ridge lambda] [--log] [-n top] [-p config.cfg]")
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
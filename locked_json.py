@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+import os
+import json
+import fcntl
+
+
+class LockedJsonFile:
+	""" context manager that holds an exclusive lock on a json file that
+	several processes share, like the binary cache index, the campaign
+	manifest and the compile constraints. Yields the parsed file, or
+	default() if it does not exist yet, and, unless write is False or the
+	block raised, writes it back atomically on exit """
+	JSON_INDENT = 4
+
+	def __init__(self, path, lock_path, default, write=True):
+		self.path = path
+		self.lock_path = lock_path
+		self.default = default
+		self.write = write
+
+	def __enter__(self):
+		self.lock_file = open(self.lock_path, 'w')
+		fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+		self.data = self.default()
+		if os.path.isfile(self.path):
+			with open(self.path) as json_data:
+				self.data = json.load(json_data)
+		return self.data
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		try:
+			if self.write and exc_type is None:
+				tmp_path = self.path + ".tmp"
+				with open(tmp_path, 'w') as f:
+					f.write(json.dumps(self.data, indent=LockedJsonFile.JSON_INDENT, sort_keys=True))
+					f.flush()
+					os.fsync(f.fileno())
+				os.replace(tmp_path, self.path)
+		finally:
+			fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+			self.lock_file.close()
+		return False
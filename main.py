@@ -10,6 +10,20 @@ import datetime
 import random
 from sqlite_bmk import SQLiteBenchmarker
 from config_creator import ConfigCreator
+from binary_cache import BinaryCache
+from scheduler import PipelineScheduler, ConcurrentBenchmarkRunner, RacingScheduler, ABScheduler
+from bmk_statistics import RepetitionPolicy
+from results_store import ResultsStore
+from campaign import CampaignManifest
+from samplers import SAMPLING_RANDOM, SAMPLERS, CoveringArraySampler
+from optimizer import SequentialOptimizer
+from constraints import ConstraintStore
+from distributed import Coordinator, parse_address, read_token, is_loopback
+from workloads import TPCC, parse_workloads
+from tracing import Tracer, TRACER, read_events, write_chrome_trace, print_summary
+from artifacts import ArtifactStore, ArtifactError
+from build_modes import BUILD_SQLITE_VERSION, DEFAULT_SQLITE_VERSION
+from storage import StoragePolicy, install_hooks, get_preload_hint
 
 #import sqlite-bmk
 #import config-creator
@@ -18,20 +32,70 @@ def main(argv):
 	options_file = ''
 	base_dir=os.path.abspath(os.getcwd())
 	num_random = 100
+	seed = None
+	sampling = SAMPLING_RANDOM
+	strength = CoveringArraySampler.DEFAULT_STRENGTH
 	num_cycles = 3
+	jobs = 1
+	pipeline = False
+	parallel_runs = 1
+	in_process = False
+	snapshot = False
+	adaptive = False
+	race = False
+	ab = False
+	serve_address = None
+	token = None
+	lease_seconds = Coordinator.DEFAULT_LEASE_SECONDS
+	ab_order = ABScheduler.ORDER_ALTERNATE
+	optimize = False
+	precheck = False
+	minimize = True
+	workloads = [TPCC]
+	tracing = False
+	storage_options = {}
+	drop_fraction = RacingScheduler.DEFAULT_DROP_FRACTION
+	budget_hours = None
+	use_results_store = True
+	results_store_path = os.path.join(base_dir, ResultsStore.NAME_DEFAULT_FILE)
+	campaign = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+	resume = False
+	warmup = RepetitionPolicy.DEFAULT_WARMUP
+	min_cycles = RepetitionPolicy.DEFAULT_MIN_CYCLES
+	max_cycles = RepetitionPolicy.DEFAULT_MAX_CYCLES
+	target_ci = RepetitionPolicy.DEFAULT_TARGET
+	confidence = RepetitionPolicy.DEFAULT_CONFIDENCE
+	queue_depth = None
+	use_cache = True
+	cache_dir = os.path.join(base_dir, BinaryCache.NAME_DEFAULT_FOLDER)
+	cache_size_mb = BinaryCache.DEFAULT_MAX_SIZE_MB
+	artifacts_dir = os.path.join(base_dir, ArtifactStore.NAME_DEFAULT_FOLDER)
+	offline = False
+	allow_unverified = False
 	found_options = False
 	config_folder = os.path.join(base_dir, "compile-configs")
 
 	## first read terminal arguments
 	try:
-		opts, args = getopt.getopt(argv,"o:hf:r:c:",["optionsfile=", "help", "fresh-start", "clean=", "random=", "cycles="])
-	except (getopt.GetoptError, err):
+		opts, args = getopt.getopt(argv,"o:hf:r:c:j:",["optionsfile=", "help", "fresh-start", "clean=",
+			"random=", "seed=", "sampling=", "strength=", "optimize", "budget=",
+			"cycles=", "adaptive", "warmup=", "min-cycles=", "max-cycles=", "target-ci=", "confidence=",
+			"race", "drop-fraction=", "ab", "ab-order=",
+			"jobs=", "pipeline", "queue-depth=", "parallel-runs=", "in-process", "snapshot", "workloads=",
+			"cache-dir=", "cache-size=", "no-cache", "precheck", "no-minimize", "artifacts-dir=", "offline",
+			"allow-unverified", "db-location=", "journal-mode=", "synchronous=", "page-cache=",
+			"results-store=", "no-results-store", "campaign=", "resume", "serve=", "lease=", "token-file=",
+			"trace"])
+	except getopt.GetoptError as err:
 		print(str(err))
 		print(help_str())
 		sys.exit(2)
 	#print(opts)
 	for opt, arg in opts:
-		if opt in ("-o", "--optionsfile"):
+		if opt in ("-h", "--help"):
+			print (help_str())
+			sys.exit(0)
+		elif opt in ("-o", "--optionsfile"):
 			options_file = os.path.abspath(arg)
 			found_options = True
 		elif opt == "--clean":
@@ -46,6 +110,104 @@ def main(argv):
 			found_options = True
 		elif opt in ("-c", "--cycles"):
 			num_cycles = int(arg)
+		elif opt in ("-j", "--jobs"):
+			jobs = int(arg)
+		elif opt == "--cache-dir":
+			cache_dir = os.path.abspath(arg)
+		elif opt == "--cache-size":
+			cache_size_mb = int(arg)
+		elif opt == "--artifacts-dir":
+			artifacts_dir = os.path.abspath(arg)
+		elif opt == "--offline":
+			offline = True
+		elif opt == "--allow-unverified":
+			allow_unverified = True
+		elif opt == "--no-cache":
+			use_cache = False
+		elif opt == "--pipeline":
+			pipeline = True
+		elif opt == "--queue-depth":
+			queue_depth = int(arg)
+		elif opt == "--parallel-runs":
+			parallel_runs = int(arg)
+		elif opt == "--in-process":
+			in_process = True
+		elif opt == "--snapshot":
+			snapshot = True
+		elif opt == "--adaptive":
+			adaptive = True
+		elif opt == "--warmup":
+			warmup = int(arg)
+		elif opt == "--min-cycles":
+			min_cycles = int(arg)
+		elif opt == "--max-cycles":
+			max_cycles = int(arg)
+		elif opt == "--target-ci":
+			target_ci = float(arg)
+		elif opt == "--confidence":
+			confidence = float(arg)
+		elif opt == "--race":
+			race = True
+		elif opt == "--serve":
+			serve_address = parse_address(arg, "localhost")
+		elif opt == "--token-file":
+			try:
+				token = read_token(arg)
+			except (OSError, ValueError) as err:
+				print(str(err))
+				sys.exit(2)
+		elif opt == "--lease":
+			lease_seconds = float(arg)
+		elif opt == "--ab":
+			ab = True
+		elif opt == "--ab-order":
+			if arg not in ABScheduler.ORDERS:
+				print("unknown A/B order " + arg + ", use one of " + ", ".join(ABScheduler.ORDERS))
+				print (help_str())
+				sys.exit(2)
+			ab_order = arg
+		elif opt == "--optimize":
+			optimize = True
+		elif opt == "--precheck":
+			precheck = True
+		elif opt == "--no-minimize":
+			minimize = False
+		elif opt == "--workloads":
+			try:
+				workloads = parse_workloads(arg)
+			except ValueError as err:
+				print(str(err))
+				print (help_str())
+				sys.exit(2)
+		elif opt == "--trace":
+			tracing = True
+		elif opt == "--db-location":
+			storage_options["location"] = arg
+		elif opt == "--journal-mode":
+			storage_options["journal_mode"] = arg
+		elif opt == "--synchronous":
+			storage_options["synchronous"] = arg
+		elif opt == "--page-cache":
+			storage_options["cache"] = arg
+		elif opt == "--drop-fraction":
+			drop_fraction = float(arg)
+		elif opt == "--budget":
+			budget_hours = float(arg)
+		elif opt == "--results-store":
+			results_store_path = os.path.abspath(arg)
+		elif opt == "--no-results-store":
+			use_results_store = False
+		elif opt == "--campaign":
+			campaign = arg
+		elif opt == "--seed":
+			seed = int(arg)
+		elif opt == "--sampling":
+			sampling = arg
+		elif opt == "--strength":
+			strength = int(arg)
+		elif opt == "--resume":
+			resume = True
+			found_options = True
 		else:
 			print (help_str())
 			sys.exit(2)
@@ -53,15 +215,214 @@ def main(argv):
 	if not found_options:
 		print (help_str())
 		sys.exit(2)
+	if optimize and budget_hours is None:
+		print("--optimize needs a --budget in hours")
+		sys.exit(2)
+	if serve_address is not None and not use_results_store:
+		print("--serve needs the results store, the workers stream their results into it")
+		sys.exit(2)
+	## anyone who reaches the coordinator could claim configs and write results
+	if serve_address is not None and token is None and not is_loopback(serve_address[0]):
+		print("--serve on another address than localhost needs a --token-file, which the workers share")
+		sys.exit(2)
+	## a campaign runs in one mode, the flags of any other mode would be ignored
+	modes = [flag for flag, used in [("--optimize", optimize), ("--serve", serve_address is not None), ("--ab", ab),
+		("--race", race), ("--pipeline", pipeline), ("--parallel-runs", parallel_runs > 1)] if used]
+	if len(modes) > 1:
+		print(" and ".join(modes) + " cannot be combined, choose one of them")
+		sys.exit(2)
+	## in-process runs would share one process and its GIL, and could not be pinned to their own cpus;
+	## micro-workloads always run in-process
+	if in_process and parallel_runs > 1:
+		print("--in-process cannot be combined with --parallel-runs, the runs would share one process")
+		sys.exit(2)
+	if parallel_runs > 1 and [name for name in workloads if name != TPCC]:
+		print("micro-workloads cannot be combined with --parallel-runs, they run inside this process")
+		sys.exit(2)
+
+	## time the phases of the campaign, compile workers included
+	if tracing:
+		TRACER.enable(os.path.join(base_dir, Tracer.NAME_TRACE_FOLDER))
+
+	## measurements are appended to the results store instead of rewriting config files
+	results_store = None
+	if use_results_store:
+		results_store = ResultsStore(results_store_path)
 
-	## create instance of ConfigCreator in order to reate all necessary configs
-	generator = ConfigCreator(base_dir=base_dir,options_file=options_file)
-	generator.generate_and_write_one_for_each_option()
-	generator.generate_set_randomly(int(num_random))
+	## compile failures and the option conflicts learned from them
+	constraints = ConstraintStore(base_dir)
 
+	manifest = CampaignManifest(base_dir)
+
+	## everything that decides how configs are measured is kept with the
+	## campaign, a resumed campaign is measured the same way
+	campaign_options = {"cycles": num_cycles, "workloads": workloads, "storage": storage_options,
+		"in_process": in_process, "snapshot": snapshot, "parallel_runs": parallel_runs, "pipeline": pipeline,
+		"adaptive": adaptive, "warmup": warmup, "min_cycles": min_cycles, "max_cycles": max_cycles,
+		"target_ci": target_ci, "confidence": confidence, "race": race, "drop_fraction": drop_fraction,
+		"budget": budget_hours, "ab": ab, "ab_order": ab_order, "seed": seed, "sampling": sampling,
+		"strength": strength, "random": num_random, "precheck": precheck, "minimize": minimize}
+	if resume and manifest.exists():
+		campaign_options.update(manifest.get_options())
+		num_cycles = campaign_options["cycles"]
+		workloads = campaign_options["workloads"]
+		storage_options = campaign_options["storage"] or {}
+		in_process = campaign_options["in_process"]
+		snapshot = campaign_options["snapshot"]
+		parallel_runs = campaign_options["parallel_runs"]
+		pipeline = campaign_options["pipeline"]
+		adaptive = campaign_options["adaptive"]
+		warmup = campaign_options["warmup"]
+		min_cycles = campaign_options["min_cycles"]
+		max_cycles = campaign_options["max_cycles"]
+		target_ci = campaign_options["target_ci"]
+		confidence = campaign_options["confidence"]
+		race = campaign_options["race"]
+		drop_fraction = campaign_options["drop_fraction"]
+		budget_hours = campaign_options["budget"]
+		ab = campaign_options["ab"]
+		ab_order = campaign_options["ab_order"]
+		seed = campaign_options["seed"]
+		sampling = campaign_options["sampling"]
+		strength = campaign_options["strength"]
+		num_random = campaign_options["random"]
+		precheck = campaign_options["precheck"]
+		minimize = campaign_options["minimize"]
+
+	## where the database lives and how it is used is declared per campaign
+	storage = None
+	if storage_options:
+		try:
+			storage = StoragePolicy(**storage_options)
+		except ValueError as err:
+			print(str(err))
+			sys.exit(2)
+		storage.print_warnings()
+		## only the benchmark processes get the sync counter through their environment
+		sync_counter = install_hooks(base_dir)
+		if in_process or [name for name in workloads if name != TPCC]:
+			hint = get_preload_hint(sync_counter)
+			if hint is not None:
+				print(hint)
+
+	if resume:
+		## pick up the campaign where it stopped, with the settings it was started with
+		if not manifest.exists():
+			print("there is no campaign to resume in " + base_dir)
+			sys.exit(2)
+		campaign = manifest.get_campaign()
+		file_list = [f for f in manifest.get_unfinished() if os.path.isfile(os.path.join(config_folder, f))]
+		manifest.print_summary()
+		print("resuming campaign \"" + campaign + "\" with " + str(len(file_list)) + " unfinished configs")
+	else:
+		## create instance of ConfigCreator in order to reate all necessary configs
+		## configs that have been generated or measured before are not generated again
+		generator = ConfigCreator(base_dir=base_dir,options_file=options_file,seed=seed,
+			results_store=results_store,constraints=constraints)
+		## the optimizer proposes its configs one at a time while it runs
+		if not optimize:
+			generator.generate(sampling, int(num_random), strength)
+		if not os.path.exists(config_folder):
+			os.mkdir(config_folder)
+
+		## plan the campaign, so that it can be resumed if it gets interrupted
+		file_list = []
+		if not optimize:
+			file_list = ConfigCreator.get_unmeasured_config_files(base_dir, results_store)
+			num_measured = len(os.listdir(config_folder)) - len(file_list)
+			if num_measured > 0:
+				print("skipping " + str(num_measured) + " configs that have been measured before")
+		cycles_planned = num_cycles
+		if race:
+			cycles_planned = None
+		elif adaptive:
+			cycles_planned = max_cycles
+		manifest.create(campaign, file_list, cycles_planned, campaign_options)
+
+	if results_store is not None:
+		print("campaign \"" + campaign + "\", results go to " + results_store_path)
+
+
+	## the sources of every sqlite version of the campaign are verified and
+	## extracted once, workers of a distributed campaign prepare their own
+	if serve_address is None:
+		sqlite_versions = SQLiteBenchmarker.get_sqlite_versions(
+			[os.path.join(config_folder, filename) for filename in file_list])
+		if optimize:
+			sqlite_versions += get_option_values(generator.options, BUILD_SQLITE_VERSION)
+		if ab or optimize or not sqlite_versions:
+			sqlite_versions.append(DEFAULT_SQLITE_VERSION)
+		try:
+			SQLiteBenchmarker.prepare_sources(base_dir, sorted(set(sqlite_versions)),
+				ArtifactStore(artifacts_dir, offline=offline, allow_unverified=allow_unverified))
+		except ArtifactError as err:
+			print(str(err))
+			sys.exit(2)
+
+	## compiled binaries are shared between campaigns through the cache
+	cache = None
+	if use_cache:
+		cache = BinaryCache(cache_dir, max_size_mb=cache_size_mb)
+
+	## options every SQLiteBenchmarker of this campaign is created with
+	bmk_options = {}
+	bmk_options["results_store"] = results_store
+	bmk_options["campaign"] = campaign
+	bmk_options["manifest"] = manifest
+	bmk_options["constraints"] = constraints
+	bmk_options["precheck"] = precheck
+	bmk_options["minimize"] = minimize
+	bmk_options["cache"] = cache
+	bmk_options["in_process"] = in_process
+	bmk_options["snapshot"] = snapshot
+	bmk_options["workloads"] = workloads
+	bmk_options["storage"] = storage
+	bmk_options["repetition"] = None
+	if adaptive:
+		bmk_options["repetition"] = RepetitionPolicy(warmup=warmup, min_cycles=min_cycles,
+			max_cycles=max_cycles, target=target_ci, confidence=confidence)
 
 	## iterate over all configs and run benchmark
-	file_list = os.listdir(config_folder)
+	if optimize:
+		optimizer = SequentialOptimizer(base_dir, generator, num_cycles, budget_hours * 3600, bmk_options=bmk_options)
+		optimizer.run()
+	elif serve_address is not None:
+		run_coordinator(base_dir, config_folder, file_list, num_cycles, serve_address, lease_seconds, token, bmk_options)
+	elif ab:
+		run_ab(base_dir, config_folder, file_list, num_cycles, jobs, ab_order, seed, bmk_options)
+	elif race:
+		run_race(base_dir, config_folder, file_list, jobs, budget_hours, drop_fraction, bmk_options)
+	elif pipeline:
+		abs_files = [os.path.join(config_folder, filename) for filename in file_list]
+		scheduler = PipelineScheduler(base_dir, abs_files, num_cycles, jobs=jobs, queue_depth=queue_depth,
+			bmk_options=bmk_options)
+		scheduler.run()
+	elif parallel_runs > 1:
+		run_concurrent(base_dir, config_folder, file_list, num_cycles, jobs, parallel_runs, bmk_options)
+	elif jobs > 1:
+		run_parallel_compile(base_dir, config_folder, file_list, num_cycles, jobs, bmk_options)
+	else:
+		run_sequential(base_dir, config_folder, file_list, num_cycles, bmk_options)
+
+	if cache is not None:
+		cache.print_stats()
+
+	# write legacy configuration and results
+	ConfigCreator.write_all_in_one_config_file(base_dir)
+	SQLiteBenchmarker.write_all_in_one_result_file(base_dir, results_store, campaign)
+
+	if tracing:
+		events = read_events(os.path.join(base_dir, Tracer.NAME_TRACE_FOLDER))
+		trace_file = os.path.join(base_dir, Tracer.NAME_TRACE_FILE)
+		write_chrome_trace(trace_file, events)
+		print("trace of the campaign written to " + trace_file + ", open it in chrome://tracing or Perfetto")
+		print_summary(events)
+
+
+def run_sequential(base_dir, config_folder, file_list, num_cycles, bmk_options=None):
+	""" compiles and benchmarks one config after another """
+	if bmk_options is None:
+		bmk_options = {}
 	# count starting from one
 	i = 1
 	file_num = len(file_list)
@@ -69,7 +430,7 @@ def main(argv):
 		abs_file = os.path.join(config_folder, filename)
 		print("\n\n__ Starting new benchmark " + str(i) + "/" + str(file_num) + " (" + str(round(100*i/file_num)) + "%) __")
 		print("config file \"" + filename + "\"")
-		bmk = SQLiteBenchmarker(base_dir=base_dir, config_file=abs_file, num_cycles = num_cycles)
+		bmk = SQLiteBenchmarker(base_dir=base_dir, config_file=abs_file, num_cycles = num_cycles, **bmk_options)
 		c_result = bmk.compile()
 		i += 1
 		if c_result == SQLiteBenchmarker.EXIT_SUCCESS:
@@ -77,17 +438,170 @@ def main(argv):
 		else:
 			continue
 
-	# write legacy configuration and results
-	ConfigCreator.write_all_in_one_config_file(base_dir)
-	SQLiteBenchmarker.write_all_in_one_result_file(base_dir)
 
+def run_parallel_compile(base_dir, config_folder, file_list, num_cycles, jobs, bmk_options=None):
+	""" compiles all configs in a pool of jobs processes first and
+	benchmarks the finished binaries afterwards """
+	if bmk_options is None:
+		bmk_options = {}
+	abs_files = [os.path.join(config_folder, filename) for filename in file_list]
+	print("\n\n__ Compiling " + str(len(abs_files)) + " configs with " + str(jobs) + " jobs __")
+	compile_results = SQLiteBenchmarker.compile_all(base_dir, abs_files, jobs, bmk_options)
+
+	compiled = [f for f in abs_files if compile_results[f] == SQLiteBenchmarker.EXIT_SUCCESS]
+	print(str(len(compiled)) + "/" + str(len(abs_files)) + " configs compiled successfully")
+
+	# count starting from one
+	i = 1
+	file_num = len(compiled)
+	for abs_file in compiled:
+		print("\n\n__ Starting new benchmark " + str(i) + "/" + str(file_num) + " (" + str(round(100*i/file_num)) + "%) __")
+		print("config file \"" + os.path.basename(abs_file) + "\"")
+		bmk = SQLiteBenchmarker(base_dir=base_dir, config_file=abs_file, num_cycles = num_cycles, **bmk_options)
+		bmk.run_benchmark()
+		i += 1
+
+
+def run_concurrent(base_dir, config_folder, file_list, num_cycles, jobs, parallel_runs, bmk_options=None):
+	""" compiles all configs in a pool of jobs processes and benchmarks
+	parallel_runs of them at the same time on disjoint sets of cpus """
+	if bmk_options is None:
+		bmk_options = {}
+	abs_files = [os.path.join(config_folder, filename) for filename in file_list]
+	print("\n\n__ Compiling " + str(len(abs_files)) + " configs with " + str(jobs) + " jobs __")
+	compile_results = SQLiteBenchmarker.compile_all(base_dir, abs_files, jobs, bmk_options)
+
+	compiled = [f for f in abs_files if compile_results[f] == SQLiteBenchmarker.EXIT_SUCCESS]
+	print(str(len(compiled)) + "/" + str(len(abs_files)) + " configs compiled successfully")
+	runner = ConcurrentBenchmarkRunner(base_dir, compiled, num_cycles, parallel_runs, bmk_options)
+	runner.run()
+
+
+def run_race(base_dir, config_folder, file_list, jobs, budget_hours, drop_fraction, bmk_options=None):
+	""" compiles all configs and races them against each other, giving
+	more cycles only to the configs that survive a round """
+	if bmk_options is None:
+		bmk_options = {}
+	abs_files = [os.path.join(config_folder, filename) for filename in file_list]
+	print("\n\n__ Compiling " + str(len(abs_files)) + " configs with " + str(jobs) + " jobs __")
+	compile_results = SQLiteBenchmarker.compile_all(base_dir, abs_files, jobs, bmk_options)
+
+	compiled = [f for f in abs_files if compile_results[f] == SQLiteBenchmarker.EXIT_SUCCESS]
+	print(str(len(compiled)) + "/" + str(len(abs_files)) + " configs compiled successfully")
+	budget_seconds = None
+	if budget_hours is not None:
+		budget_seconds = budget_hours * 3600
+	racer = RacingScheduler(base_dir, compiled, budget_seconds=budget_seconds, drop_fraction=drop_fraction,
+		bmk_options=bmk_options)
+	racer.run()
+
+
+def run_coordinator(base_dir, config_folder, file_list, num_cycles, address, lease_seconds, token, bmk_options=None):
+	""" hands the configs out to workers on other nodes (see distributed.py)
+	and collects their results, instead of benchmarking them here """
+	if bmk_options is None:
+		bmk_options = {}
+	abs_files = [os.path.join(config_folder, filename) for filename in file_list]
+	## the workers are set up like a local SQLiteBenchmarker would be
+	worker_options = {}
+	for key in ["in_process", "snapshot", "workloads", "precheck", "minimize"]:
+		worker_options[key] = bmk_options[key]
+	worker_options["repetition"] = None
+	if bmk_options["repetition"] is not None:
+		worker_options["repetition"] = vars(bmk_options["repetition"])
+	worker_options["storage"] = None
+	if bmk_options["storage"] is not None:
+		worker_options["storage"] = vars(bmk_options["storage"])
+	coordinator = Coordinator(base_dir, abs_files, num_cycles, bmk_options["results_store"], bmk_options["campaign"],
+		manifest=bmk_options["manifest"], address=address, lease_seconds=lease_seconds, worker_options=worker_options,
+		token=token)
+	coordinator.run()
+
+
+def run_ab(base_dir, config_folder, file_list, num_pairs, jobs, order, seed, bmk_options=None):
+	""" compiles all configs and runs each of them interleaved with the
+	default config, num_pairs pairs per config """
+	if bmk_options is None:
+		bmk_options = {}
+	abs_files = [os.path.join(config_folder, filename) for filename in file_list]
+	print("\n\n__ Compiling " + str(len(abs_files)) + " configs with " + str(jobs) + " jobs __")
+	compile_results = SQLiteBenchmarker.compile_all(base_dir, abs_files, jobs, bmk_options)
+
+	compiled = [f for f in abs_files if compile_results[f] == SQLiteBenchmarker.EXIT_SUCCESS]
+	print(str(len(compiled)) + "/" + str(len(abs_files)) + " configs compiled successfully")
+	scheduler = ABScheduler(base_dir, compiled, num_pairs, order=order, seed=seed, bmk_options=bmk_options)
+	scheduler.run()
+
+
+def get_option_values(options, option):
+	""" returns the values an option of the compile options can take """
+	if option not in options:
+		return []
+	return [str(value) for value in options[option]["values"]]
 
 def help_str():
-	return "USAGE: config-creator.py -o compile-options.json"
+	return ("USAGE: main.py -o compile-options.json [options] | main.py --resume [options] | main.py --clean all\n"
+		"generating configs:\n"
+		"\t-o, --optionsfile file  the compile options to generate configs from, compile-options.json builds\n"
+		"\t                        with gcc on any host, compile-options-host.json adds clang, -march, LTO and PGO\n"
+		"\t-r, --random num        number of configs to generate (100)\n"
+		"\t-f, --fresh-start       delete configs, builds and results of earlier campaigns first\n"
+		"\t--clean all             delete them and exit\n"
+		"\t--seed num              seed of the generator and of random A/B orders\n"
+		"\t--sampling name         random or one of " + ", ".join(SAMPLERS) + " (random)\n"
+		"\t--strength t            strength of the covering array (" + str(CoveringArraySampler.DEFAULT_STRENGTH) + ")\n"
+		"\t--optimize              propose configs one after another from the results, needs --budget\n"
+		"\t--budget hours          time budget of --optimize and --race\n"
+		"measuring:\n"
+		"\t-c, --cycles num        benchmark cycles per config (3), pairs per config with --ab\n"
+		"\t--adaptive              repeat cycles until the confidence interval is narrow enough\n"
+		"\t--warmup num            discarded cycles of --adaptive (" + str(RepetitionPolicy.DEFAULT_WARMUP) + ")\n"
+		"\t--min-cycles num        least cycles of --adaptive (" + str(RepetitionPolicy.DEFAULT_MIN_CYCLES) + ")\n"
+		"\t--max-cycles num        most cycles of --adaptive (" + str(RepetitionPolicy.DEFAULT_MAX_CYCLES) + ")\n"
+		"\t--target-ci fraction    relative half width to reach (" + str(RepetitionPolicy.DEFAULT_TARGET) + ")\n"
+		"\t--confidence level      confidence of the interval (" + str(RepetitionPolicy.DEFAULT_CONFIDENCE) + ")\n"
+		"\t--race                  successive halving, drop the slowest configs every round\n"
+		"\t--drop-fraction frac    share of configs dropped per round (" + str(RacingScheduler.DEFAULT_DROP_FRACTION) + ")\n"
+		"\t--ab                    run every config in pairs with the default config\n"
+		"\t--ab-order order        " + " or ".join(ABScheduler.ORDERS) + " (" + ABScheduler.ORDER_ALTERNATE + ")\n"
+		"\t--workloads names       tpcc, micro or a comma separated list of workloads (tpcc)\n"
+		"\t--in-process            run tpcc through libsqlite3.so inside this process\n"
+		"\t--snapshot              load the database once and start every cycle from a copy\n"
+		"building and scheduling:\n"
+		"\t-j, --jobs num          parallel compile jobs (1)\n"
+		"\t--pipeline              benchmark configs while the next ones compile\n"
+		"\t--queue-depth num       compiled configs waiting for --pipeline (jobs + 1)\n"
+		"\t--parallel-runs num     benchmark configs side by side on disjoint cpus (1)\n"
+		"\t--precheck              reject broken configs with a syntax only compile first\n"
+		"\t--no-minimize           do not look for the options that break a failed compile\n"
+		"\t--cache-dir dir         binary cache (./" + BinaryCache.NAME_DEFAULT_FOLDER + ")\n"
+		"\t--cache-size mb         size limit of the binary cache (" + str(BinaryCache.DEFAULT_MAX_SIZE_MB) + ")\n"
+		"\t--no-cache              compile every config\n"
+		"\t--artifacts-dir dir     verified source archives (./" + ArtifactStore.NAME_DEFAULT_FOLDER + ")\n"
+		"\t--offline               use only archives that are in the artifact store\n"
+		"\t--allow-unverified      download archives without a known checksum and pin their first download\n"
+		"database:\n"
+		"\t--db-location where     run, tmpfs or a folder of the benchmark database (run)\n"
+		"\t--journal-mode mode     one of " + ", ".join(StoragePolicy.JOURNAL_MODES) + "\n"
+		"\t--synchronous mode      one of " + ", ".join(StoragePolicy.SYNCHRONOUS_MODES) + "\n"
+		"\t--page-cache state      " + " or ".join(StoragePolicy.CACHE_POLICIES) + " page cache at the start of a cycle\n"
+		"results and campaigns:\n"
+		"\t--results-store file    sqlite file the measurements go to (./" + ResultsStore.NAME_DEFAULT_FILE + ")\n"
+		"\t--no-results-store      write the measurements into the config files\n"
+		"\t--campaign name         name of the campaign (date and time)\n"
+		"\t--resume                continue the campaign in this folder with its settings\n"
+		"\t--serve [host:]port     hand the configs to distributed.py workers, on localhost for a bare port\n"
+		"\t--lease seconds         lease of a worker on a config (" + str(Coordinator.DEFAULT_LEASE_SECONDS) + ")\n"
+		"\t--token-file file       token the workers have to send, needed to serve beyond localhost\n"
+		"\t--trace                 record how long each phase takes\n"
+		"\t-h, --help              print this help")
 
 def clean_all(base_dir):
 	ConfigCreator.clean(base_dir)
 	SQLiteBenchmarker.clean(base_dir)
+	CampaignManifest.clean(base_dir)
+	ABScheduler.clean(base_dir)
+	Tracer.clean(base_dir)
 
 if __name__ == "__main__":
 	main(sys.argv[1:])
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import os
+import re
+import math
+import resource
+import shutil
+import subprocess
+
+
+class LatencyRecorder:
+	""" Collects the latency of every transaction, per transaction type, in
+	nanoseconds as measured with time.perf_counter_ns """
+	PERCENTILES = [50, 95, 99]
+
+	def __init__(self):
+		self.latencies = {}
+
+
+	def record(self, txn, latency_ns):
+		""" adds one executed transaction of type txn """
+		if txn not in self.latencies:
+			self.latencies[txn] = []
+		self.latencies[txn].append(latency_ns)
+
+	def get_transactions(self, duration_ns):
+		""" returns per transaction type the count, the rate in txn/s and the
+		latency summary, for a run that took duration_ns """
+		transactions = {}
+		for txn, latencies in self.latencies.items():
+			txn_info = {}
+			txn_info["count"] = len(latencies)
+			txn_info["rate"] = len(latencies) / (duration_ns / 1e9) if duration_ns > 0 else 0.0
+			txn_info["latency_ns"] = summarize_latencies(latencies)
+			transactions[txn] = txn_info
+		return transactions
+
+
+def summarize_latencies(latencies):
+	""" returns mean, min, max, p50/p95/p99 and a log2 histogram of a list
+	of latencies in nanoseconds """
+	summary = {}
+	if not latencies:
+		return summary
+	ordered = sorted(latencies)
+	summary["mean"] = sum(ordered) / len(ordered)
+	summary["min"] = ordered[0]
+	summary["max"] = ordered[-1]
+	for percentile in LatencyRecorder.PERCENTILES:
+		summary["p" + str(percentile)] = get_percentile(ordered, percentile)
+	summary["histogram"] = get_histogram(ordered)
+	return summary
+
+
+def get_percentile(ordered, percentile):
+	""" returns the nearest-rank percentile of an already sorted list """
+	rank = math.ceil(percentile / 100.0 * len(ordered)) - 1
+	return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+def get_histogram(latencies):
+	""" counts latencies into buckets whose upper bounds are powers of two
+	nanoseconds. Returns a dict from upper bound (as string) to count """
+	histogram = {}
+	for latency in latencies:
+		upper = 1 << max(0, int(latency) - 1).bit_length()
+		histogram[str(upper)] = histogram.get(str(upper), 0) + 1
+	return histogram
+
+
+def get_tpmc(transactions, duration_ns):
+	""" returns the number of NEW_ORDER transactions per minute """
+	if duration_ns <= 0 or "NEW_ORDER" not in transactions:
+		return 0.0
+	return transactions["NEW_ORDER"]["count"] / (duration_ns / 60e9)
+
+
+## header of the result table of py-tpcc, e.g. "Execution Results after 60 seconds"
+TPCC_RESULT_HEADER = re.compile(r"Execution Results after ([0-9.]+) seconds")
+
+## a row of the result table of py-tpcc, e.g.
+##   NEW_ORDER            4521                 53211875.4           84.96 txn/s
+TPCC_RESULT_ROW = re.compile(r"^\s*([A-Z_]+)\s+(\d+)\s+([0-9.eE+-]+)\s+([0-9.]+)\s*txn/s\s*$")
+
+
+def parse_tpcc_output(out):
+	""" parses the result table that py-tpcc prints at the end of a run and
+	returns per transaction type the count, the rate in txn/s and the mean
+	latency in nanoseconds. py-tpcc only reports the time summed up per
+	type, so no percentiles are available for its transactions """
+	if isinstance(out, bytes):
+		out = out.decode('utf-8', 'replace')
+	transactions = {}
+	for line in out.splitlines():
+		match = TPCC_RESULT_ROW.match(line)
+		if match is None:
+			continue
+		txn, count, time_us, rate = match.groups()
+		if txn == "TOTAL":
+			continue
+		count = int(count)
+		txn_info = {}
+		txn_info["count"] = count
+		txn_info["rate"] = float(rate)
+		txn_info["latency_ns"] = {}
+		if count > 0:
+			txn_info["latency_ns"]["mean"] = float(time_us) * 1000 / count
+		transactions[txn] = txn_info
+	return transactions
+
+
+def parse_tpcc_duration_ns(out):
+	""" returns the length of the execute phase that py-tpcc reports in
+	nanoseconds, or None if the output has no result table """
+	if isinstance(out, bytes):
+		out = out.decode('utf-8', 'replace')
+	match = TPCC_RESULT_HEADER.search(out)
+	if match is None:
+		return None
+	return int(float(match.group(1)) * 1e9)
+
+
+## hardware counters collected with 'perf stat' when it is usable
+PERF_EVENTS = ["instructions", "cycles", "cache-misses", "branch-misses"]
+_perf_usable = None
+
+
+def get_rusage_dict(ru):
+	""" turns a resource.struct_rusage into a dict of the fields we store """
+	usage = {}
+	usage["user_time"] = ru.ru_utime
+	usage["system_time"] = ru.ru_stime
+	usage["max_rss_kb"] = ru.ru_maxrss
+	usage["block_input"] = ru.ru_inblock
+	usage["block_output"] = ru.ru_oublock
+	usage["voluntary_context_switches"] = ru.ru_nvcsw
+	usage["involuntary_context_switches"] = ru.ru_nivcsw
+	return usage
+
+
+def get_thread_rusage():
+	""" returns the resources used by the calling thread. Benchmarks that
+	run side by side in threads of one process would otherwise count each
+	other's work. Falls back to the whole process where threads are not
+	accounted on their own """
+	return resource.getrusage(getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF))
+
+
+def get_rusage_delta(before, after):
+	""" returns the resources used between two getrusage calls. max_rss_kb
+	is a high water mark and is taken from after """
+	usage = get_rusage_dict(after)
+	previous = get_rusage_dict(before)
+	for key in usage:
+		if key != "max_rss_kb":
+			usage[key] -= previous[key]
+	return usage
+
+
+def perf_usable():
+	""" checks once whether 'perf stat' exists and is allowed to count """
+	global _perf_usable
+	if _perf_usable is None:
+		_perf_usable = False
+		if shutil.which("perf") is not None:
+			try:
+				result = subprocess.run(["perf", "stat", "-x,", "-e", PERF_EVENTS[0], "--", "true"],
+					stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+				_perf_usable = result.returncode == 0
+			except OSError:
+				_perf_usable = False
+	return _perf_usable
+
+
+def get_perf_command(command, output_file):
+	""" wraps command into 'perf stat', which writes the counters to output_file """
+	return ["perf", "stat", "-x,", "-e", ",".join(PERF_EVENTS), "-o", output_file, "--"] + command
+
+
+def parse_perf_output(output_file):
+	""" reads the csv written by 'perf stat -x,' and returns a dict from
+	event (with '_' instead of '-') to count. Uncounted events are left out """
+	counters = {}
+	if not os.path.isfile(output_file):
+		return counters
+	with open(output_file) as f:
+		for line in f:
+			fields = line.strip().split(",")
+			if len(fields) < 3 or line.startswith("#"):
+				continue
+			event = fields[2].split(":")[0]
+			if event not in PERF_EVENTS:
+				continue
+			try:
+				counters[event.replace("-", "_")] = int(float(fields[0]))
+			except ValueError:
+				continue
+	return counters
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import os
+import json
+import math
+import time
+from sqlite_bmk import SQLiteBenchmarker
+from config_creator import ConfigCreator
+from influence_model import FeatureEncoder, InfluenceModel, get_groups
+from samplers import get_levels
+
+
+class SequentialOptimizer:
+	""" Searches for the fastest config within a time budget. After a few
+	random configs, every step fits a performance-influence model of the log
+	cost to everything measured so far and proposes the unmeasured config
+	with the lowest confidence bound, prediction minus exploration times its
+	standard deviation. Candidates are random configs and the neighbours of
+	the incumbent, the fastest config so far, which differ from it in one
+	option. The incumbent and the history are written to disk after every
+	step, and no new config is started once the budget is used up """
+	NAME_PROGRESS_FILE = 'optimize-progress.json'
+	SUFFIX_CONFIG = "opt"
+
+	DEFAULT_INITIAL_CONFIGS = 8
+	DEFAULT_CANDIDATES = 200
+	DEFAULT_EXPLORATION = 1.0
+	DEFAULT_RIDGE = 0.1
+
+	## number of values of a range option a neighbour can move to, besides the adjacent ones
+	RANGE_LEVELS = 5
+
+	def __init__(self, base_dir, generator, num_cycles, budget_seconds, initial_configs=DEFAULT_INITIAL_CONFIGS,
+			candidates=DEFAULT_CANDIDATES, exploration=DEFAULT_EXPLORATION, bmk_options=None):
+		self.base_dir = base_dir
+		self.generator = generator
+		self.num_cycles = num_cycles
+		self.budget_seconds = budget_seconds
+		self.initial_configs = initial_configs
+		self.candidates = candidates
+		self.exploration = exploration
+		self.bmk_options = bmk_options if bmk_options is not None else {}
+		self.progress_path = os.path.join(self.base_dir, SequentialOptimizer.NAME_PROGRESS_FILE)
+
+		## measured configs by config id: features and the costs of all cycles
+		self.measured = {}
+		self.history = []
+		self.best = None
+
+
+	def run(self):
+		""" proposes, compiles and benchmarks configs until the budget is
+		used up and returns the best config found """
+		start = time.perf_counter()
+		self.load_results_store()
+		step = 1
+		while time.perf_counter() - start < self.budget_seconds:
+			features, predicted = self.propose()
+			if features is None:
+				print("no unmeasured configs left to propose")
+				break
+			config_file = self.generator.write_config(features, suffix=SequentialOptimizer.SUFFIX_CONFIG)
+			print("\n\n__ Optimizing step " + str(step) + ", " + str(round(time.perf_counter() - start)) + "/" +
+				str(round(self.budget_seconds)) + " s of budget used __")
+			print("config file \"" + os.path.basename(config_file) + "\"")
+			costs = self.evaluate(config_file)
+			self.record(config_file, features, costs, predicted, time.perf_counter() - start)
+			step += 1
+
+		if self.best is not None:
+			print("__ optimizing finished, best config \"" + self.best["config_file"] + "\" with " +
+				str(round(self.best["mean_cost"], 4)) + " s __")
+		return self.best
+
+	def load_results_store(self):
+		""" starts from the configs measured by earlier campaigns """
+		results_store = self.bmk_options.get("results_store")
+		if results_store is None:
+			return
+		for config in results_store.iter_configs():
+			costs = [SQLiteBenchmarker.get_cost(m) for m in results_store.iter_measurements(config["config_id"])]
+			if costs:
+				self.measured[ConfigCreator.get_config_id(config["features"])] = (config["features"], costs)
+		if self.measured:
+			print("starting from " + str(len(self.measured)) + " configs measured before")
+
+	def propose(self):
+		""" returns the next config to measure and its predicted cost, which
+		is None as long as configs are picked at random """
+		if len(self.measured) < self.initial_configs:
+			candidates = self.get_random_candidates(self.candidates)
+			if not candidates:
+				return (None, None)
+			return (candidates[0], None)
+
+		model = self.fit_model()
+		incumbent = min(self.measured.values(), key=lambda measured: mean(measured[1]))[0]
+		candidates = self.get_neighbours(incumbent) + self.get_random_candidates(self.candidates)
+		best_features = None
+		best_score = None
+		for features in candidates:
+			## the model is fitted to the log cost, so the bound is taken there
+			score = math.log(model.predict(features)) - self.exploration * model.get_prediction_std(features)
+			if best_score is None or score < best_score:
+				best_features = features
+				best_score = score
+		if best_features is None:
+			return (None, None)
+		return (best_features, model.predict(best_features))
+
+	def fit_model(self):
+		""" fits the influence model of the log cost to all measured configs """
+		features_list = [features for features, costs in self.measured.values()]
+		encoder = FeatureEncoder(self.generator.options, features_list)
+		pairs = [(config_id, cost) for config_id, (features, costs) in self.measured.items() for cost in costs]
+		features_by_id = {config_id: features for config_id, (features, costs) in self.measured.items()}
+		groups = get_groups(features_by_id, pairs, log_cost=True)
+		model = InfluenceModel(encoder, ridge=SequentialOptimizer.DEFAULT_RIDGE, log_cost=True)
+		return model.fit(groups, num_interaction_options=0)
+
+	def get_random_candidates(self, num):
+		""" returns up to num random configs that have not been measured,
+		starting with the default config """
+		candidates = []
+		seen = set(self.generator.known_ids)
+		for features in [{}] + [self.generator.generate_randomly() for i in range(num)]:
+			config_id = ConfigCreator.get_config_id(features)
+			if config_id not in seen and self.generator.is_allowed(features):
+				seen.add(config_id)
+				candidates.append(features)
+		return candidates
+
+	def get_neighbours(self, features):
+		""" returns the unmeasured configs that differ from features in one
+		option: a unary option toggled, another value of a list option or a
+		nearby or distant value of a range option """
+		neighbours = []
+		for option, desc in self.generator.options.items():
+			values = []
+			if desc is None:
+				values = [False] if option in features else [None]
+			elif desc.get("type") == "range":
+				current = features.get(option, desc["default"])
+				all_values = desc["values"]
+				if current in all_values:
+					i = all_values.index(current)
+					values = [all_values[j] for j in (i - 1, i + 1) if 0 <= j < len(all_values)]
+				values += get_levels(desc, SequentialOptimizer.RANGE_LEVELS)
+			else:
+				values = list(desc["values"])
+			for value in values:
+				neighbour = dict(features)
+				if value is False:
+					del neighbour[option]
+				else:
+					neighbour[option] = value
+				if (neighbour != features and ConfigCreator.get_config_id(neighbour) not in self.generator.known_ids
+						and self.generator.is_allowed(neighbour)):
+					neighbours.append(neighbour)
+		return neighbours
+
+	def evaluate(self, config_file):
+		""" compiles and benchmarks a config and returns the costs of its
+		cycles, or an empty list if it does not compile """
+		bmk = SQLiteBenchmarker(base_dir=self.base_dir, config_file=config_file, num_cycles=self.num_cycles,
+			**self.bmk_options)
+		c_result = bmk.compile()
+		if c_result != SQLiteBenchmarker.EXIT_SUCCESS:
+			print("compiling failed with exit code " + str(c_result))
+			return []
+		bmk.run_benchmark()
+		return [SQLiteBenchmarker.get_cost(m) for m in bmk.measurements]
+
+	def record(self, config_file, features, costs, predicted, elapsed):
+		""" adds a measured config to the model data and streams the
+		progress to disk """
+		step = {}
+		step["config_file"] = os.path.basename(config_file)
+		step["elapsed_seconds"] = elapsed
+		step["predicted_cost"] = predicted
+		step["mean_cost"] = mean(costs) if costs else None
+		step["cycles"] = len(costs)
+		if costs:
+			self.measured[ConfigCreator.get_config_id(features)] = (features, costs)
+			if self.best is None or step["mean_cost"] < self.best["mean_cost"]:
+				self.best = dict(step)
+				self.best["features"] = features
+				print("new best config with " + str(round(step["mean_cost"], 4)) + " s")
+		step["best_cost"] = self.best["mean_cost"] if self.best is not None else None
+		self.history.append(step)
+		self.write_progress(elapsed)
+
+	def write_progress(self, elapsed):
+		""" atomically rewrites the progress file with the best config so far """
+		progress = {}
+		progress["campaign"] = self.bmk_options.get("campaign")
+		progress["budget_seconds"] = self.budget_seconds
+		progress["elapsed_seconds"] = elapsed
+		progress["best"] = self.best
+		progress["history"] = self.history
+		tmp_path = self.progress_path + ".tmp"
+		with open(tmp_path, 'w') as f:
+			f.write(json.dumps(progress, indent=4, sort_keys=True))
+		os.replace(tmp_path, self.progress_path)
+
+
+def mean(values):
+	return sum(values) / len(values)
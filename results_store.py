@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import json
+import time
+import sqlite3
+import threading
+
+
+def main(argv):
+	## default values
+	store_path = os.path.join(os.path.abspath(os.getcwd()), ResultsStore.NAME_DEFAULT_FILE)
+	campaign = None
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"s:h",["store=","campaign=","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(ResultsStore.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-s", "--store"):
+			store_path = os.path.abspath(arg)
+		elif opt == "--campaign":
+			campaign = arg
+		else:
+			print (help_str())
+			sys.exit(ResultsStore.EXIT_ERROR)
+
+	if not os.path.isfile(store_path):
+		print("no results store at " + store_path)
+		sys.exit(ResultsStore.EXIT_ERROR)
+
+	store = ResultsStore(store_path)
+	print("campaigns: " + ", ".join(store.get_campaigns()))
+	for row in store.aggregate(campaign):
+		print(row["config_name"] + ": " + str(row["count"]) + " measurements, mean " +
+			str(round(row["mean"], 3)) + " s (min " + str(round(row["min"], 3)) + ", max " +
+			str(round(row["max"], 3)) + ")")
+
+
+class ResultsStore:
+	""" Append-only store of benchmark results in a local SQLite database.
+	Every cycle adds one row to the measurements table, which is indexed by
+	config id, campaign and time; nothing already written is rewritten.
+	Config level information (statistics, racing outcome) is kept as one
+	JSON value per config, campaign and key """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	NAME_DEFAULT_FILE = 'results.db'
+
+	## rows that are read at a time while iterating over a query
+	SIZE_FETCH_BATCH = 1000
+
+	SCHEMA = """
+		CREATE TABLE IF NOT EXISTS configs (
+			config_id TEXT PRIMARY KEY,
+			config_name TEXT,
+			features TEXT,
+			command TEXT
+		);
+		CREATE TABLE IF NOT EXISTS config_info (
+			config_id TEXT,
+			campaign TEXT NOT NULL DEFAULT '',
+			key TEXT,
+			value TEXT,
+			PRIMARY KEY (config_id, campaign, key)
+		);
+		CREATE TABLE IF NOT EXISTS measurements (
+			measurement_id INTEGER PRIMARY KEY,
+			config_id TEXT NOT NULL,
+			campaign TEXT,
+			timestamp REAL,
+			cost REAL,
+			data TEXT
+		);
+		CREATE INDEX IF NOT EXISTS idx_measurements_config ON measurements (config_id, measurement_id);
+		CREATE INDEX IF NOT EXISTS idx_measurements_campaign ON measurements (campaign, config_id);
+		CREATE INDEX IF NOT EXISTS idx_measurements_timestamp ON measurements (timestamp);
+	"""
+
+
+	def __init__(self, path):
+		self.path = path
+		self.conn = None
+		self.lock = threading.Lock()
+
+
+	def __getstate__(self):
+		## connections and locks cannot be sent to worker processes
+		return {"path": self.path}
+
+	def __setstate__(self, state):
+		self.__init__(state["path"])
+
+	def get_connection(self):
+		""" opens the store on first use """
+		if self.conn is None:
+			self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+			self.conn.row_factory = sqlite3.Row
+			self.conn.execute("PRAGMA journal_mode=WAL")
+			self.conn.execute("PRAGMA synchronous=NORMAL")
+			self.conn.executescript(ResultsStore.SCHEMA)
+			self.migrate()
+		return self.conn
+
+	def migrate(self):
+		""" moves the config level values of stores that kept them per config
+		only into the campaign '' """
+		columns = [row["name"] for row in self.conn.execute("PRAGMA table_info(config_info)")]
+		if "campaign" in columns:
+			return
+		with self.conn:
+			self.conn.execute("ALTER TABLE config_info RENAME TO config_info_old")
+			self.conn.executescript(ResultsStore.SCHEMA)
+			self.conn.execute("INSERT INTO config_info SELECT config_id, '', key, value FROM config_info_old")
+			self.conn.execute("DROP TABLE config_info_old")
+
+	def add_config(self, config_id, config_name, features, command):
+		""" registers a config, if it is not known yet """
+		with self.lock:
+			conn = self.get_connection()
+			with conn:
+				conn.execute("INSERT OR IGNORE INTO configs VALUES (?, ?, ?, ?)",
+					(config_id, config_name, json.dumps(features, sort_keys=True), command))
+
+	def append_measurement(self, config_id, campaign, measurement, cost):
+		""" appends one measurement of config_id and commits it right away """
+		timestamp = measurement.get("start", time.time() * 1000) / 1000
+		with self.lock:
+			conn = self.get_connection()
+			with conn:
+				conn.execute("INSERT INTO measurements (config_id, campaign, timestamp, cost, data) "
+					"VALUES (?, ?, ?, ?, ?)",
+					(config_id, campaign, timestamp, cost, json.dumps(measurement, sort_keys=True)))
+
+	def set_config_info(self, config_id, campaign, key, value):
+		""" stores a config level value of a campaign, e.g. its statistics,
+		under key """
+		with self.lock:
+			conn = self.get_connection()
+			with conn:
+				conn.execute("INSERT OR REPLACE INTO config_info VALUES (?, ?, ?, ?)",
+					(config_id, campaign or '', key, json.dumps(value, sort_keys=True)))
+
+	def get_config_info(self, config_id, campaign=None):
+		""" returns the config level values of config_id in campaign as a
+		dict. Without a campaign, the last value stored under each key in
+		any campaign is returned """
+		sql = "SELECT key, value FROM config_info WHERE config_id = ?"
+		params = [config_id]
+		if campaign is not None:
+			sql += " AND campaign = ?"
+			params.append(campaign)
+		with self.lock:
+			rows = self.get_connection().execute(sql + " ORDER BY rowid", params).fetchall()
+		return {row["key"]: json.loads(row["value"]) for row in rows}
+
+	def count_measurements(self, config_id, campaign=None):
+		""" returns how many measurements config_id has (in campaign) """
+		sql = "SELECT COUNT(*) FROM measurements WHERE config_id = ?"
+		params = [config_id]
+		if campaign is not None:
+			sql += " AND campaign = ?"
+			params.append(campaign)
+		with self.lock:
+			return self.get_connection().execute(sql, params).fetchone()[0]
+
+	def get_campaigns(self):
+		""" returns the names of all campaigns in the store """
+		with self.lock:
+			rows = self.get_connection().execute(
+				"SELECT DISTINCT campaign FROM measurements WHERE campaign IS NOT NULL ORDER BY campaign").fetchall()
+		return [row[0] for row in rows]
+
+	def iter_configs(self):
+		""" yields config_id, config_name, features and command of every config """
+		for row in self.iter_rows("SELECT * FROM configs ORDER BY config_id"):
+			config = dict(row)
+			config["features"] = json.loads(config["features"])
+			yield config
+
+	def iter_measurements(self, config_id, campaign=None):
+		""" yields the measurements of config_id in the order they were taken """
+		sql = "SELECT data FROM measurements WHERE config_id = ?"
+		params = [config_id]
+		if campaign is not None:
+			sql += " AND campaign = ?"
+			params.append(campaign)
+		for row in self.iter_rows(sql + " ORDER BY measurement_id", params):
+			yield json.loads(row["data"])
+
+	def iter_costs(self, campaign=None):
+		""" yields (config_id, cost) of all measurements, grouped by config,
+		without decoding the measurements themselves """
+		sql = "SELECT config_id, cost FROM measurements"
+		params = []
+		if campaign is not None:
+			sql += " WHERE campaign = ?"
+			params.append(campaign)
+		for row in self.iter_rows(sql + " ORDER BY config_id", params):
+			yield (row[0], row[1])
+
+	def iter_results(self, campaign=None):
+		""" yields one result per config that has measurements, in the format
+		of the all-in-one result file. The measurements of a result are an
+		iterator over the database, so nothing is held in memory """
+		for config in self.iter_configs():
+			if self.count_measurements(config["config_id"], campaign) == 0:
+				continue
+			result = {}
+			result["id"] = config["config_id"]
+			result["command"] = config["command"]
+			result["measurements"] = self.iter_measurements(config["config_id"], campaign)
+			result.update(self.get_config_info(config["config_id"], campaign))
+			yield result
+
+	def aggregate(self, campaign=None):
+		""" yields count, mean, min and max cost per config, computed by the
+		database without loading the measurements """
+		sql = ("SELECT m.config_id, c.config_name, COUNT(*) AS count, AVG(m.cost) AS mean, "
+			"MIN(m.cost) AS min, MAX(m.cost) AS max FROM measurements m "
+			"LEFT JOIN configs c ON c.config_id = m.config_id")
+		params = []
+		if campaign is not None:
+			sql += " WHERE m.campaign = ?"
+			params.append(campaign)
+		for row in self.iter_rows(sql + " GROUP BY m.config_id ORDER BY mean", params):
+			result = dict(row)
+			if result["config_name"] is None:
+				result["config_name"] = result["config_id"]
+			yield result
+
+	def iter_rows(self, sql, params=()):
+		""" yields the rows of a query. They are fetched in batches under the
+		lock, which is not held between batches, so the consumer may use the
+		store while it iterates """
+		with self.lock:
+			cursor = self.get_connection().execute(sql, params)
+		while True:
+			with self.lock:
+				rows = cursor.fetchmany(ResultsStore.SIZE_FETCH_BATCH)
+			if not rows:
+				return
+			for row in rows:
+				yield row
+
+	def close(self):
+		if self.conn is not None:
+			self.conn.close()
+			self.conn = None
+
+
+def help_str():
+	return "USAGE: results_store.py [-s results.db] [--campaign name]"
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+import math
+import itertools
+
+
+## a unary option is one factor whose levels are "not set" and "set"
+UNARY_LEVELS = [False, True]
+
+
+def get_levels(option_desc, range_levels=None):
+	""" returns the levels of an option as parsed by ConfigCreator. Unary
+	options have the two levels of UNARY_LEVELS. Range options are reduced
+	to range_levels values spread evenly over the range (always including
+	min, max and the default) unless range_levels is None """
+	if option_desc is None:
+		return list(UNARY_LEVELS)
+	values = option_desc["values"]
+	if range_levels is None or len(values) <= range_levels or option_desc.get("type") != "range":
+		return list(values)
+	levels = []
+	for i in range(range_levels):
+		value = values[round(i * (len(values) - 1) / (range_levels - 1))]
+		if value not in levels:
+			levels.append(value)
+	if option_desc["default"] in values and option_desc["default"] not in levels:
+		levels.append(option_desc["default"])
+	return sorted(levels)
+
+
+def to_features(names, row):
+	""" turns one row of levels, one per option name, into a features dict """
+	features = {}
+	for name, level in zip(names, row):
+		if level is False:
+			continue
+		features[name] = None if level is True else level
+	return features
+
+
+class CoveringArraySampler:
+	""" Generates a t-wise covering array: a set of configs in which every
+	combination of values of every strength options appears at least once.
+	Rows are built greedily (AETG): each row starts from an uncovered
+	combination and gets the value per option that covers most of the
+	uncovered combinations; the best of candidates rows is kept """
+	NAME = "twise"
+
+	DEFAULT_STRENGTH = 2
+	DEFAULT_RANGE_LEVELS = 3
+	DEFAULT_CANDIDATES = 10
+
+	def __init__(self, strength=DEFAULT_STRENGTH, range_levels=DEFAULT_RANGE_LEVELS, candidates=DEFAULT_CANDIDATES):
+		self.strength = strength
+		self.range_levels = range_levels
+		self.candidates = candidates
+
+
+	def generate(self, options, rng):
+		""" returns the configs of the covering array as features dicts """
+		names = sorted(options)
+		levels = [get_levels(options[name], self.range_levels) for name in names]
+		strength = min(self.strength, len(names))
+		if strength == 0:
+			return []
+
+		## every combination of strength options and values, as ((option, level index), ...)
+		uncovered = set()
+		for factors in itertools.combinations(range(len(names)), strength):
+			for values in itertools.product(*[range(len(levels[f])) for f in factors]):
+				uncovered.add(tuple(zip(factors, values)))
+
+		rows = []
+		while uncovered:
+			best_row = None
+			best_covered = set()
+			for c in range(self.candidates):
+				row = self.build_row(levels, uncovered, strength, rng)
+				covered = set(t for t in self.get_tuples(row, strength) if t in uncovered)
+				if len(covered) > len(best_covered):
+					best_row = row
+					best_covered = covered
+			uncovered -= best_covered
+			rows.append(best_row)
+		return [to_features(names, [levels[f][i] for f, i in enumerate(row)]) for row in rows]
+
+	def build_row(self, levels, uncovered, strength, rng):
+		""" builds one candidate row of level indices """
+		row = [None] * len(levels)
+		## start with a combination that still has to be covered
+		for f, i in rng.choice(sorted(uncovered)):
+			row[f] = i
+		assigned = [f for f in range(len(levels)) if row[f] is not None]
+		free = [f for f in range(len(levels)) if row[f] is None]
+		rng.shuffle(free)
+		for f in free:
+			best_levels = []
+			best_count = -1
+			for i in range(len(levels[f])):
+				count = 0
+				for others in itertools.combinations(assigned, strength - 1):
+					key = tuple(sorted([(f, i)] + [(o, row[o]) for o in others]))
+					if key in uncovered:
+						count += 1
+				if count > best_count:
+					best_levels = [i]
+					best_count = count
+				elif count == best_count:
+					best_levels.append(i)
+			row[f] = rng.choice(best_levels)
+			assigned.append(f)
+		return row
+
+	@staticmethod
+	def get_tuples(row, strength):
+		""" yields all combinations of strength (option, level index) pairs of a row """
+		for factors in itertools.combinations(range(len(row)), strength):
+			yield tuple((f, row[f]) for f in factors)
+
+
+class PairwiseSampler(CoveringArraySampler):
+	""" A covering array of strength two """
+	NAME = "pairwise"
+
+	def __init__(self, range_levels=CoveringArraySampler.DEFAULT_RANGE_LEVELS,
+			candidates=CoveringArraySampler.DEFAULT_CANDIDATES):
+		super().__init__(strength=2, range_levels=range_levels, candidates=candidates)
+
+
+class PlackettBurmanSampler:
+	""" A two level screening design for the main effects of all options.
+	Every option gets a low and a high level (not set/set, first/last value,
+	min/max). The design has the fewest runs, a multiple of four, that
+	either a cyclic Paley construction or a Sylvester Hadamard matrix
+	provides for the number of options """
+	NAME = "plackett-burman"
+
+	def generate(self, options, rng):
+		""" returns the runs of the design as features dicts """
+		names = sorted(options)
+		levels = []
+		for name in names:
+			option_levels = get_levels(options[name])
+			levels.append([option_levels[0], option_levels[-1]])
+		design = PlackettBurmanSampler.get_design(len(names))
+		configs = []
+		for run in design:
+			configs.append(to_features(names, [levels[f][1 if sign > 0 else 0] for f, sign in enumerate(run)]))
+		return configs
+
+	@staticmethod
+	def get_design(num_factors):
+		""" returns a list of runs, each a list of +1/-1 for num_factors factors """
+		if num_factors == 0:
+			return []
+		## smallest q = 3 mod 4 prime with q >= num_factors gives q + 1 runs
+		q = num_factors
+		while not (q % 4 == 3 and is_prime(q)):
+			q += 1
+		sylvester = 2 ** math.ceil(math.log2(num_factors + 1))
+		if sylvester < q + 1:
+			hadamard = [[1]]
+			while len(hadamard) < sylvester:
+				hadamard = [row + row for row in hadamard] + [row + [-x for x in row] for row in hadamard]
+			return [row[1:num_factors + 1] for row in hadamard]
+
+		residues = set((i * i) % q for i in range(1, q))
+		generator = [1 if i == 0 or i in residues else -1 for i in range(q)]
+		design = [generator[-shift:] + generator[:-shift] for shift in range(q)]
+		design.append([-1] * q)
+		return [run[:num_factors] for run in design]
+
+
+class LatinHypercubeSampler:
+	""" Latin hypercube sampling. Every range option is cut into num_samples
+	strata of equal width and every stratum is used by exactly one sample;
+	list and unary options get their values in equal shares. The strata
+	are assigned to the samples in a random order per option """
+	NAME = "latin-hypercube"
+
+	def __init__(self, num_samples):
+		self.num_samples = num_samples
+
+
+	def generate(self, options, rng):
+		""" returns num_samples configs as features dicts """
+		names = sorted(options)
+		columns = []
+		for name in names:
+			values = get_levels(options[name])
+			column = []
+			if options[name] is not None and options[name].get("type") == "range":
+				for j in range(self.num_samples):
+					low = j * len(values) // self.num_samples
+					high = max(low, (j + 1) * len(values) // self.num_samples - 1)
+					column.append(values[rng.randint(low, high)])
+			else:
+				column = [values[j % len(values)] for j in range(self.num_samples)]
+			rng.shuffle(column)
+			columns.append(column)
+		return [to_features(names, [column[j] for column in columns]) for j in range(self.num_samples)]
+
+
+def is_prime(n):
+	if n < 2:
+		return False
+	for i in range(2, int(math.isqrt(n)) + 1):
+		if n % i == 0:
+			return False
+	return True
+
+
+## strategies that can be selected with --sampling, besides the default
+## one config per option plus uniform random configs ("random")
+SAMPLING_RANDOM = "random"
+SAMPLERS = [PairwiseSampler.NAME, CoveringArraySampler.NAME, PlackettBurmanSampler.NAME, LatinHypercubeSampler.NAME]
+
+
+def get_sampler(name, num_samples=None, strength=CoveringArraySampler.DEFAULT_STRENGTH):
+	""" returns the sampler called name, see SAMPLERS """
+	if name == PairwiseSampler.NAME:
+		return PairwiseSampler()
+	if name == CoveringArraySampler.NAME:
+		return CoveringArraySampler(strength=strength)
+	if name == PlackettBurmanSampler.NAME:
+		return PlackettBurmanSampler()
+	if name == LatinHypercubeSampler.NAME:
+		return LatinHypercubeSampler(num_samples)
+	raise ValueError("unknown sampling strategy " + name + ", use one of " +
+		", ".join([SAMPLING_RANDOM] + SAMPLERS))
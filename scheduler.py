@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+import os
+import json
+import time
+import random
+import queue
+import threading
+import multiprocessing
+from sqlite_bmk import SQLiteBenchmarker, BenchmarkError, compile_worker, split_cpus
+from bmk_statistics import speedup_statistics
+
+
+class PipelineScheduler:
+	""" Overlaps compiling and benchmarking. A pool of compile workers
+	stays at most queue_depth configs ahead of a single benchmark consumer,
+	which runs every binary as soon as it is ready. Compile workers and
+	benchmark run on disjoint cpus if there is more than one """
+
+	def __init__(self, base_dir, config_files, num_cycles, jobs=1, queue_depth=None, bmk_options=None):
+		self.base_dir = base_dir
+		self.config_files = list(config_files)
+		self.num_cycles = num_cycles
+		self.jobs = max(1, jobs)
+		## keep every compile worker busy unless told otherwise
+		if queue_depth is None:
+			queue_depth = self.jobs + 1
+		self.queue_depth = max(1, queue_depth)
+		self.bmk_options = bmk_options if bmk_options is not None else {}
+		## compiles must not take cpu time from the benchmark they overlap with, so the
+		## benchmark gets the share of one compile job and the compile workers the rest
+		self.benchmark_cpus = None
+		self.compile_cpus = None
+		cpu_sets = split_cpus(self.jobs + 1)
+		if len(cpu_sets) > 1:
+			self.benchmark_cpus = cpu_sets[0]
+			self.compile_cpus = set().union(*cpu_sets[1:])
+
+		self.compile_busy = 0.0
+		self.benchmark_busy = 0.0
+		self.benchmark_idle = 0.0
+		self.wall_time = 0.0
+		self.failed = []
+		self.benchmarked = []
+
+
+	def run(self):
+		""" compiles and benchmarks all configs and returns a dict with the
+		busy and idle time of both stages """
+		start = time.perf_counter()
+		ready = queue.Queue()
+		pending = list(self.config_files)
+		in_flight = 0
+		file_num = len(pending)
+
+		own_cpus = os.sched_getaffinity(0)
+		try:
+			with multiprocessing.Pool(self.jobs, initializer=pin_process, initargs=(self.compile_cpus,)) as pool:
+				## the consumer also runs in-process benchmarks itself
+				pin_process(self.benchmark_cpus)
+				def submit():
+					config_file = pending.pop(0)
+					pool.apply_async(timed_compile_worker, ((self.base_dir, config_file, self.bmk_options),),
+						callback=ready.put,
+						error_callback=lambda err, f=config_file: ready.put((f, SQLiteBenchmarker.EXIT_ERROR, 0.0)))
+
+				## fill the pipeline
+				while pending and in_flight < self.queue_depth:
+					submit()
+					in_flight += 1
+
+				i = 1
+				while in_flight > 0:
+					wait_start = time.perf_counter()
+					config_file, c_result, compile_time = ready.get()
+					self.benchmark_idle += time.perf_counter() - wait_start
+					self.compile_busy += compile_time
+					in_flight -= 1
+
+					## the consumer took one config off the queue, so compile the next one
+					if pending:
+						submit()
+						in_flight += 1
+
+					print("\n\n__ Pipeline " + str(i) + "/" + str(file_num) + " (" + str(round(100*i/file_num)) + "%) __")
+					print("config file \"" + os.path.basename(config_file) + "\"")
+					i += 1
+					if c_result != SQLiteBenchmarker.EXIT_SUCCESS:
+						print("compiling failed with exit code " + str(c_result))
+						self.failed.append(config_file)
+						continue
+
+					bmk_start = time.perf_counter()
+					bmk = SQLiteBenchmarker(base_dir=self.base_dir, config_file=config_file, num_cycles=self.num_cycles,
+						cpus=self.benchmark_cpus, **self.bmk_options)
+					b_result = bmk.run_benchmark()
+					self.benchmark_busy += time.perf_counter() - bmk_start
+					if b_result == SQLiteBenchmarker.EXIT_SUCCESS:
+						self.benchmarked.append(config_file)
+					else:
+						self.failed.append(config_file)
+		finally:
+			pin_process(own_cpus)
+
+		self.wall_time = time.perf_counter() - start
+		report = self.get_report()
+		self.print_report(report)
+		return report
+
+	def get_report(self):
+		""" returns the busy and idle time of both stages in seconds """
+		report = {}
+		report["wall_time"] = self.wall_time
+		report["compile_busy"] = self.compile_busy
+		# compile slots are idle whenever the queue is full or drained
+		report["compile_idle"] = max(0.0, self.jobs * self.wall_time - self.compile_busy)
+		report["benchmark_busy"] = self.benchmark_busy
+		report["benchmark_idle"] = self.benchmark_idle
+		report["benchmarked"] = len(self.benchmarked)
+		report["failed"] = len(self.failed)
+		return report
+
+	def print_report(self, report):
+		""" prints how long each stage has been busy and idle """
+		print("__ pipeline finished after " + str(round(report["wall_time"], 1)) + " s __")
+		if self.benchmark_cpus:
+			print("benchmark on cpus " + ",".join(str(cpu) for cpu in sorted(self.benchmark_cpus)) +
+				", compiles on cpus " + ",".join(str(cpu) for cpu in sorted(self.compile_cpus)))
+		print("compile stage (" + str(self.jobs) + " jobs): busy " + str(round(report["compile_busy"], 1)) +
+			" s, idle " + str(round(report["compile_idle"], 1)) + " s")
+		print("benchmark stage: busy " + str(round(report["benchmark_busy"], 1)) +
+			" s, idle " + str(round(report["benchmark_idle"], 1)) + " s")
+		print(str(report["benchmarked"]) + " configs benchmarked, " + str(report["failed"]) + " failed")
+
+
+class ConcurrentBenchmarkRunner:
+	""" Benchmarks several compiled configs at the same time. Every slot
+	owns a disjoint set of cpus and runs one config after another inside
+	that config's own sandbox """
+
+	def __init__(self, base_dir, config_files, num_cycles, parallel_runs, bmk_options=None):
+		self.base_dir = base_dir
+		self.config_files = list(config_files)
+		self.num_cycles = num_cycles
+		self.cpu_sets = split_cpus(parallel_runs)
+		self.bmk_options = bmk_options if bmk_options is not None else {}
+		self.print_lock = threading.Lock()
+
+
+	def run(self):
+		""" benchmarks all configs, using one thread per cpu set. The work
+		itself happens in the pinned benchmark processes """
+		todo = queue.Queue()
+		for config_file in self.config_files:
+			todo.put(config_file)
+
+		print("\n\n__ Benchmarking " + str(len(self.config_files)) + " configs in " +
+			str(len(self.cpu_sets)) + " concurrent slots __")
+		threads = []
+		for cpus in self.cpu_sets:
+			thread = threading.Thread(target=self.run_slot, args=(todo, cpus))
+			thread.start()
+			threads.append(thread)
+		for thread in threads:
+			thread.join()
+
+	def run_slot(self, todo, cpus):
+		""" takes configs from the queue until it is empty """
+		while True:
+			try:
+				config_file = todo.get_nowait()
+			except queue.Empty:
+				return
+			with self.print_lock:
+				print("config file \"" + os.path.basename(config_file) + "\" on cpus " +
+					",".join(str(cpu) for cpu in sorted(cpus)))
+			bmk = SQLiteBenchmarker(base_dir=self.base_dir, config_file=config_file,
+				num_cycles=self.num_cycles, cpus=cpus, **self.bmk_options)
+			bmk.run_benchmark()
+
+
+class RacingScheduler:
+	""" Successive halving over compiled configs. Every round benchmarks
+	the surviving configs and drops the slowest drop_fraction of them; the
+	survivors get growth times more cycles in the next round. Racing stops
+	when one config is left or the time budget is used up. The round in
+	which a config has been eliminated is stored in its config file """
+
+	DEFAULT_DROP_FRACTION = 0.5
+	DEFAULT_GROWTH = 2
+
+	def __init__(self, base_dir, config_files, budget_seconds=None, drop_fraction=DEFAULT_DROP_FRACTION,
+			growth=DEFAULT_GROWTH, bmk_options=None):
+		self.base_dir = base_dir
+		self.config_files = list(config_files)
+		self.budget_seconds = budget_seconds
+		self.drop_fraction = drop_fraction
+		self.growth = growth
+		self.bmk_options = bmk_options if bmk_options is not None else {}
+		self.rounds = []
+
+
+	def run(self):
+		""" races all configs and returns the list of rounds, each with the
+		number of configs that took part and the ones eliminated in it """
+		start = time.perf_counter()
+		benchmarkers = {}
+		first_measurement = {}
+		failed = []
+		for config_file in self.config_files:
+			benchmarkers[config_file] = SQLiteBenchmarker(base_dir=self.base_dir, config_file=config_file,
+				num_cycles=0, **self.bmk_options)
+
+		try:
+			survivors = list(self.config_files)
+			round_num = 1
+			cycles = 1
+			out_of_budget = False
+			while survivors and not out_of_budget:
+				print("\n\n__ Racing round " + str(round_num) + ": " + str(len(survivors)) + " configs, " +
+					str(cycles) + " cycles each __")
+				raced = []
+				for config_file in survivors:
+					bmk = benchmarkers[config_file]
+					try:
+						if config_file not in first_measurement:
+							bmk.start_benchmark()
+							first_measurement[config_file] = len(bmk.measurements)
+						for n in range(cycles):
+							if self.over_budget(start):
+								out_of_budget = True
+								break
+							bmk.run_cycle()
+							bmk.record_measurement(n)
+					except BenchmarkError as err:
+						print("config \"" + os.path.basename(config_file) + "\" failed: " + str(err))
+						if bmk.manifest is not None:
+							bmk.manifest.set_failed(bmk.config_name, SQLiteBenchmarker.EXIT_ERROR)
+						failed.append(config_file)
+						continue
+					if out_of_budget:
+						break
+					raced.append(config_file)
+
+				## rank the configs that completed the round by their mean cost
+				means = {}
+				for config_file in raced:
+					means[config_file] = self.get_mean_cost(benchmarkers[config_file], first_measurement[config_file])
+				ranked = sorted(raced, key=lambda f: means[f])
+				eliminated = []
+				if not out_of_budget and len(ranked) > 1:
+					num_dropped = min(len(ranked) - 1, max(1, int(len(ranked) * self.drop_fraction)))
+					eliminated = ranked[len(ranked) - num_dropped:]
+
+				for config_file in eliminated:
+					self.write_racing_info(benchmarkers[config_file], round_num, means[config_file], True)
+					benchmarkers[config_file].remove_storage()
+				## configs that could not finish the round stay in the race, those that cannot run leave it
+				survivors = [f for f in survivors if f not in eliminated and f not in failed]
+				self.rounds.append({"round": round_num, "cycles": cycles, "raced": len(raced),
+					"eliminated": [os.path.basename(f) for f in eliminated]})
+				print("eliminated " + str(len(eliminated)) + " configs, " + str(len(survivors)) + " left")
+
+				if len(survivors) <= 1:
+					break
+				round_num += 1
+				cycles *= self.growth
+
+			for config_file in survivors:
+				mean = None
+				if config_file in first_measurement:
+					mean = self.get_mean_cost(benchmarkers[config_file], first_measurement[config_file])
+				self.write_racing_info(benchmarkers[config_file], round_num, mean, False)
+		finally:
+			## the databases of configs that are out of the race or done with it
+			for bmk in benchmarkers.values():
+				bmk.remove_storage()
+
+		print("__ racing finished after " + str(round(time.perf_counter() - start, 1)) + " s, " +
+			str(len(survivors)) + " configs survived __")
+		return self.rounds
+
+	def over_budget(self, start):
+		return self.budget_seconds is not None and time.perf_counter() - start >= self.budget_seconds
+
+	def get_mean_cost(self, bmk, first):
+		""" returns the mean cost of the measurements taken during the race """
+		costs = [SQLiteBenchmarker.get_cost(m) for m in bmk.measurements[first:]]
+		if not costs:
+			return None
+		return sum(costs) / len(costs)
+
+	def write_racing_info(self, bmk, round_num, mean, eliminated):
+		""" stores the outcome of the race in the config file of bmk """
+		racing = {}
+		racing["eliminated"] = eliminated
+		racing["round"] = round_num
+		if mean is not None:
+			racing["mean"] = mean
+		bmk.config["racing"] = racing
+		bmk.write_result()
+		if bmk.manifest is not None:
+			bmk.manifest.set_benchmarked(bmk.config_name)
+
+
+class ABScheduler:
+	""" Interleaved A/B runs of compiled configs against a baseline, the
+	default config, which is compiled once. Every candidate runs in pairs
+	with the baseline, one cycle of each back to back, either alternating
+	which one goes first (AB BA AB ...) or in random order. Drift of the
+	machine over time hits both sides of a pair, so the per pair speedup
+	ratios can show effects of a few percent. Their geometric mean and its
+	bootstrap confidence interval are stored with the candidate """
+	ORDER_ALTERNATE = "alternate"
+	ORDER_RANDOM = "random"
+	ORDERS = [ORDER_ALTERNATE, ORDER_RANDOM]
+
+	NAME_BASELINE_FILE = 'ab-baseline.cfg'
+
+	DEFAULT_WARMUP_PAIRS = 1
+	DEFAULT_CONFIDENCE = 0.95
+
+	def __init__(self, base_dir, config_files, num_pairs, order=ORDER_ALTERNATE, warmup_pairs=DEFAULT_WARMUP_PAIRS,
+			confidence=DEFAULT_CONFIDENCE, seed=None, bmk_options=None):
+		if order not in ABScheduler.ORDERS:
+			raise ValueError("unknown A/B order " + order + ", use one of " + ", ".join(ABScheduler.ORDERS))
+		self.base_dir = base_dir
+		self.config_files = list(config_files)
+		self.num_pairs = num_pairs
+		self.order = order
+		self.warmup_pairs = warmup_pairs
+		self.confidence = confidence
+		self.seed = seed
+		self.random = random.Random(seed)
+		self.bmk_options = bmk_options if bmk_options is not None else {}
+
+
+	def run(self):
+		""" compares every candidate with the baseline and returns the
+		speedup statistics by config file """
+		baseline = self.get_baseline()
+		if baseline is None:
+			print("the baseline does not compile, no A/B runs")
+			return {}
+		results = {}
+		try:
+			try:
+				baseline.start_benchmark()
+			except BenchmarkError as err:
+				print("the baseline cannot be benchmarked, no A/B runs: " + str(err))
+				return {}
+			file_num = len(self.config_files)
+			for i, config_file in enumerate(self.config_files, 1):
+				print("\n\n__ A/B run " + str(i) + "/" + str(file_num) + " (" + str(round(100*i/file_num)) + "%) __")
+				print("config file \"" + os.path.basename(config_file) + "\"")
+				candidate = SQLiteBenchmarker(base_dir=self.base_dir, config_file=config_file,
+					num_cycles=self.num_pairs, **self.bmk_options)
+				if candidate.config["features"] == baseline.config["features"]:
+					print("skipping, the config is the baseline")
+					continue
+				try:
+					candidate.start_benchmark()
+					results[config_file] = self.run_pairs(baseline, candidate)
+				except BenchmarkError as err:
+					print("skipping, the config cannot be benchmarked: " + str(err))
+					if candidate.manifest is not None:
+						candidate.manifest.set_failed(candidate.config_name, SQLiteBenchmarker.EXIT_ERROR)
+				finally:
+					candidate.remove_storage()
+		finally:
+			baseline.remove_storage()
+		self.print_report(results)
+		return results
+
+	def get_baseline(self):
+		""" compiles the default config as baseline, or returns None if it
+		does not compile. It is not part of the campaign manifest and its
+		measurements are not recorded with it, since it is run along with
+		every candidate """
+		baseline_file = os.path.join(self.base_dir, ABScheduler.NAME_BASELINE_FILE)
+		if not os.path.isfile(baseline_file):
+			with open(baseline_file, 'w') as f:
+				f.write(json.dumps({"features": {}}, indent=4, sort_keys=True))
+		options = dict(self.bmk_options)
+		options["manifest"] = None
+		baseline = SQLiteBenchmarker(base_dir=self.base_dir, config_file=baseline_file, num_cycles=0, **options)
+		if baseline.compile() != SQLiteBenchmarker.EXIT_SUCCESS:
+			return None
+		return baseline
+
+	def get_order(self, n):
+		""" returns "AB" if the baseline runs first in pair n, else "BA" """
+		if self.order == ABScheduler.ORDER_RANDOM:
+			return self.random.choice(["AB", "BA"])
+		return "AB" if n % 2 == 0 else "BA"
+
+	def run_pairs(self, baseline, candidate):
+		""" runs the warm-up pairs and num_pairs measured pairs of baseline
+		and candidate and stores the speedup with the candidate """
+		baseline_costs = []
+		candidate_costs = []
+		for n in range(-self.warmup_pairs, self.num_pairs):
+			order = self.get_order(n)
+			pair = [baseline, candidate] if order == "AB" else [candidate, baseline]
+			for bmk in pair:
+				bmk.run_cycle()
+			if n < 0:
+				print("\f discarded warm-up pair")
+				continue
+
+			baseline_cost = SQLiteBenchmarker.get_cost(baseline.current_measurement)
+			candidate_cost = SQLiteBenchmarker.get_cost(candidate.current_measurement)
+			baseline_costs.append(baseline_cost)
+			candidate_costs.append(candidate_cost)
+			## the baseline runs with every candidate, so its side of a pair is kept with the candidate
+			candidate.current_measurement["ab"] = {"pair": n, "order": order, "baseline_cost": baseline_cost,
+				"speedup": baseline_cost / candidate_cost, "baseline": baseline.current_measurement}
+			candidate.record_measurement(n)
+
+		stats = speedup_statistics(baseline_costs, candidate_costs, self.confidence, seed=self.seed)
+		stats["baseline"] = baseline.config_name
+		stats["order"] = self.order
+		stats["warmup_pairs"] = self.warmup_pairs
+		candidate.config["ab"] = stats
+		candidate.write_result()
+		if candidate.manifest is not None:
+			candidate.manifest.set_benchmarked(candidate.config_name)
+		print("speedup " + get_speedup_string(stats))
+		return stats
+
+	@staticmethod
+	def clean(base_dir):
+		""" deletes the baseline config and its measurements """
+		baseline_file = os.path.join(base_dir, ABScheduler.NAME_BASELINE_FILE)
+		if os.path.exists(baseline_file):
+			os.remove(baseline_file)
+
+	def print_report(self, results):
+		""" prints the candidates from the fastest to the slowest """
+		print("__ A/B runs finished, speedup over the baseline __")
+		for config_file, stats in sorted(results.items(), key=lambda item: -item[1]["speedup"]):
+			print("  " + os.path.basename(config_file) + ": " + get_speedup_string(stats))
+
+
+def get_speedup_string(stats):
+	""" e.g. 1.0213 [1.0105, 1.0322] """
+	return (str(round(stats["speedup"], 4)) + " [" + str(round(stats["ci_low"], 4)) + ", " +
+		str(round(stats["ci_high"], 4)) + "]" + (" significant" if stats["significant"] else ""))
+
+
+def pin_process(cpus):
+	""" restricts this process to cpus, unless cpus is None """
+	if cpus:
+		os.sched_setaffinity(0, cpus)
+
+
+def timed_compile_worker(work):
+	""" compiles a single config inside a worker process and returns the
+	compile result together with the time spent compiling """
+	start = time.perf_counter()
+	config_file, c_result = compile_worker(work)
+	return (config_file, c_result, time.perf_counter() - start)
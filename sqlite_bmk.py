@@ -1,16 +1,26 @@
 #!/usr/bin/env python3
 import sys
 import os
-import zipfile
-import urllib.request as request
 import time
 import getopt
 import json
 import datetime
 import shutil
 import subprocess
-import xml.etree.cElementTree as ET
-import xml.dom.minidom as minidom
+import multiprocessing
+import fcntl
+import hashlib
+from exporters import write_json_results, write_xml_results
+from sqlite_lib import InProcessDriver
+from workloads import WorkloadSuite, TPCC
+from build_modes import split_features, get_build_flags, get_build_mode, run_training, get_merge_command
+from build_modes import PGO_GENERATE, PGO_USE, BUILD_SQLITE_VERSION, DEFAULT_SQLITE_VERSION, get_sqlite_versions
+from artifacts import ArtifactStore, TPCC_ARTIFACT, get_sqlite_artifact_name
+from tracing import trace, traced
+from storage import IOCounter, sum_io
+from constraints import minimize_failure
+from metrics import parse_tpcc_output, parse_tpcc_duration_ns, get_tpmc
+from metrics import get_rusage_dict, perf_usable, get_perf_command, parse_perf_output
 
 
 def main(argv):
@@ -24,7 +34,7 @@ def main(argv):
 	## first read terminal arguments
 	try:
 		opts, args = getopt.getopt(argv,"wc:h",["workingdir","configfile=","help", "clean=", "cycles="])
-	except (getopt.GetoptError, err):
+	except getopt.GetoptError as err:
 		print(str(err))
 		print(help_str())
 		sys.exit(SQLiteBenchmarker.EXIT_ERROR)
@@ -54,14 +64,20 @@ def main(argv):
 
 	## start single run of benchmark for standalone execution
 	print("\n__ Starting new benchmark __")
+	SQLiteBenchmarker.prepare_sources(base_dir, SQLiteBenchmarker.get_sqlite_versions([config_file]))
 	bmk = SQLiteBenchmarker(base_dir=base_dir, config_file=config_file, num_cycles = num_cycles)
 	c_result = bmk.compile()
 	if c_result == SQLiteBenchmarker.EXIT_SUCCESS:
-		bmk.run_benchmark()
-	else:
+		c_result = bmk.run_benchmark()
+	if c_result != SQLiteBenchmarker.EXIT_SUCCESS:
 		sys.exit(SQLiteBenchmarker.EXIT_ERROR)
 
 
+class BenchmarkError(Exception):
+	""" the benchmark of a config cannot run, e.g. because loading its
+	database failed or one of its workloads did not run """
+
+
 class SQLiteBenchmarker:
 	## exit flags
 	EXIT_SUCCESS = 0
@@ -69,140 +85,711 @@ class SQLiteBenchmarker:
 	EXIT_ERROR = 2
 
 
-	GCC_COMPILE_COMMAND = "gcc -o sqlite3 shell.c sqlite3.c -lpthread -ldl"
+	## compiler and flags come from the build options of a config, see build_modes
+	GCC_COMPILE_COMMAND = "{compiler} {flags} -o {output} shell.c sqlite3.c -lpthread -ldl"
+	GCC_SHARED_LIBRARY_COMMAND = "{compiler} {flags} -shared -fPIC -o {output} sqlite3.c -lpthread -ldl"
+	## cheap checks that reject broken configs before the real build
+	GCC_PRECHECK_COMMAND = "{compiler} {flags} -fsyntax-only shell.c sqlite3.c"
+	GCC_PRECHECK_LIBRARY_COMMAND = "{compiler} {flags} -fsyntax-only sqlite3.c"
 
-	URL_SQLITE_SOURCE = "https://sqlite.org/2017/sqlite-amalgamation-3160200.zip"
-	NAME_LOCAL_ZIP = "sqlite-amalgamation-3160200.zip"
-	NAME_EXPECTED_FOLDER_IN_ZIP = 'sqlite-amalgamation-3160200'
+	## at most this many compiles are spent on minimizing a failed config
+	MAX_MINIMIZE_COMPILES = 32
+
+	## the sources of every sqlite version go into a folder of their own in here
 	NAME_DESIRED_FOLDER_SOURCE = 'sqlite-source'
 	NAME_EXPECTED_SOURCE_FILE = 'sqlite3.c'
-	NAME_LOCAL_ZIP_BENCHMARKING_TOOL = "py-tpcc-master.zip"
 	NAME_DESIRED_FOLDER_BENCHMARK = "benchmark"
 	NAME_EXPECTED_SUB_FOLDER_INSIDE_BENCHMARK = "pytpcc"
 	NAME_EXPECTED_BENCHMARK_FILE = "tpcc.py"
 	NAME_EXPECTED_BENCHMARK_INTERNAL_CONFIG_FILE = "sqlite.config"
 	NAME_LOCAL_BMK_DB = 'sqlite_benchmark.db'
+	NAME_DESIRED_FOLDER_BUILDS = 'builds'
+	NAME_DESIRED_FOLDER_RUNS = 'runs'
+	NAME_BINARY = 'sqlite3'
+	NAME_SHARED_LIBRARY = 'libsqlite3.so'
+	SUFFIX_SNAPSHOT = '.snapshot'
+	## the sync counts of the benchmark processes of a cycle
+	NAME_SYNC_FILE = 'syncs.txt'
+
+	## config level information that is kept next to the measurements
+	CONFIG_INFO_KEYS = ["statistics", "racing", "ab"]
 
 
-	def __init__(self, base_dir, config_file, num_cycles):
+	@traced("init")
+	def __init__(self, base_dir, config_file, num_cycles, cache=None, cpus=None, in_process=False, snapshot=False,
+			repetition=None, results_store=None, campaign=None, manifest=None, constraints=None, precheck=False,
+			minimize=True, workloads=None, node=None, storage=None):
 		self.base_dir = base_dir
 		self.config_file = config_file
 		self.num_cycles = num_cycles
+		self.cache = cache
+		self.cpus = cpus
+		self.in_process = in_process
+		self.snapshot = snapshot
+		self.repetition = repetition
+		self.results_store = results_store
+		self.campaign = campaign
+		self.manifest = manifest
+		self.constraints = constraints
+		self.precheck = precheck
+		self.minimize = minimize
+		## TPC-C and/or micro-workloads, by name
+		self.workloads = workloads if workloads else [TPCC]
+		self.micro_workloads = [name for name in self.workloads if name != TPCC]
+		## the benchmark node, when configs are spread over several hosts
+		self.node = node
+		## placement, pragmas and page cache state of the database, see storage
+		self.storage = storage
 
 		## load configuration for compilation from file
 		with open(self.config_file) as json_data:
 			self.config = json.load(json_data)
 			print("config:" + str(self.config))
 
-		## get source for sqlite
-		source_exists = os.path.isfile(os.path.join(self.base_dir, SQLiteBenchmarker.NAME_DESIRED_FOLDER_SOURCE, SQLiteBenchmarker.NAME_EXPECTED_SOURCE_FILE))
-		zip_sqlite_exists = os.path.isfile(SQLiteBenchmarker.NAME_LOCAL_ZIP)
-
-		if not source_exists:
-			print('Getting sqlite source')
-			if not zip_sqlite_exists:
-				request.urlretrieve (SQLiteBenchmarker.URL_SQLITE_SOURCE, SQLiteBenchmarker.NAME_LOCAL_ZIP)
-			zip_ref = zipfile.ZipFile(SQLiteBenchmarker.NAME_LOCAL_ZIP, 'r')
-			zip_ref.extractall('./')
-			zip_ref.close()
-			os.remove(SQLiteBenchmarker.NAME_LOCAL_ZIP)
-			os.rename(SQLiteBenchmarker.NAME_EXPECTED_FOLDER_IN_ZIP, SQLiteBenchmarker.NAME_DESIRED_FOLDER_SOURCE)
-
-		## downloading and configuring benchmark TPC-C
-		os.chdir(self.base_dir)
-		path_to_bm_zip = os.path.join(self.base_dir, SQLiteBenchmarker.NAME_LOCAL_ZIP_BENCHMARKING_TOOL)
-		bm_exists = os.path.exists(os.path.join(
-			self.base_dir, SQLiteBenchmarker.NAME_DESIRED_FOLDER_BENCHMARK,
-			SQLiteBenchmarker.NAME_EXPECTED_SUB_FOLDER_INSIDE_BENCHMARK,
-			SQLiteBenchmarker.NAME_EXPECTED_BENCHMARK_FILE))
-		zip_bm_exists = os.path.exists(path_to_bm_zip)
 		self.bm_path = os.path.join(self.base_dir, SQLiteBenchmarker.NAME_DESIRED_FOLDER_BENCHMARK)
 		self.bm_exec_path = os.path.join(self.bm_path, SQLiteBenchmarker.NAME_EXPECTED_SUB_FOLDER_INSIDE_BENCHMARK)
-		self.bm_config_path = os.path.join(self.bm_exec_path, SQLiteBenchmarker.NAME_EXPECTED_BENCHMARK_INTERNAL_CONFIG_FILE)
-		self.db_path = os.path.join(self.base_dir, SQLiteBenchmarker.NAME_LOCAL_BMK_DB)
-
-		if not bm_exists:
-			print('Getting benchmark')
-			if not zip_bm_exists:
-				request.urlretrieve ("https://github.com/apavlo/py-tpcc/archive/master.zip", path_to_bm_zip)
-			bm_tmp_path = os.path.join(self.base_dir, 'benchmark-tmp')
-			zip_ref = zipfile.ZipFile(path_to_bm_zip, 'r')
-			zip_ref.extractall(bm_tmp_path)
-			zip_ref.close()
-			os.remove(path_to_bm_zip)
-			print(os.path.join(self.base_dir, 'benchmark-tmp', 'py-tpcc-master'))
-			os.rename(os.path.join(self.base_dir, 'benchmark-tmp', 'py-tpcc-master'), self.bm_path)
-			os.rmdir(bm_tmp_path)
+
+		## every config gets its own build folder and run sandbox, named after the config file
+		self.config_name = SQLiteBenchmarker.get_config_name(self.config_file)
+		self.config_id = SQLiteBenchmarker.get_id_from_config(self.config["features"])
+		self.build_mode = get_build_mode(self.config["features"])
+		## the sources are prepared once per campaign, see prepare_sources
+		self.sqlite_version = self.build_mode["sqlite_version"]
+		self.source_path = SQLiteBenchmarker.get_source_path(self.base_dir, self.sqlite_version)
+		self.build_dir = os.path.join(self.base_dir, SQLiteBenchmarker.NAME_DESIRED_FOLDER_BUILDS, self.config_name)
+		self.binary_path = os.path.join(self.build_dir, SQLiteBenchmarker.NAME_BINARY)
+		self.library_path = os.path.join(self.build_dir, SQLiteBenchmarker.NAME_SHARED_LIBRARY)
+		self.run_dir = os.path.join(self.base_dir, SQLiteBenchmarker.NAME_DESIRED_FOLDER_RUNS, self.config_name)
+		self.bm_config_path = os.path.join(self.run_dir, SQLiteBenchmarker.NAME_EXPECTED_BENCHMARK_INTERNAL_CONFIG_FILE)
+		self.db_dir = self.run_dir
+		if self.storage is not None:
+			self.db_dir = self.storage.get_db_dir(self.run_dir, self.config_name)
+		self.db_path = os.path.join(self.db_dir, SQLiteBenchmarker.NAME_LOCAL_BMK_DB)
+		self.sync_file = os.path.join(self.run_dir, SQLiteBenchmarker.NAME_SYNC_FILE)
+		self.snapshot_path = self.db_path + SQLiteBenchmarker.SUFFIX_SNAPSHOT
 
 		print('Finished initialising.')
 
 
+	@staticmethod
+	def prepare_sources(base_dir, sqlite_versions=None, store=None):
+		""" extracts the sources of the given sqlite versions and of the TPC-C
+		benchmark from the artifact store, which downloads what it does not
+		have yet. Sources that have been extracted from the same archive
+		before are kept. Call this once per campaign, before compiling
+		configs in parallel, so the workers do not race on the sources """
+		if sqlite_versions is None:
+			sqlite_versions = [DEFAULT_SQLITE_VERSION]
+		if store is None:
+			store = ArtifactStore(os.path.join(base_dir, ArtifactStore.NAME_DEFAULT_FOLDER))
+
+		## get sources for sqlite
+		for version in sqlite_versions:
+			with trace("prepare-source", version=version):
+				store.extract(get_sqlite_artifact_name(version), SQLiteBenchmarker.get_source_path(base_dir, version),
+					SQLiteBenchmarker.NAME_EXPECTED_SOURCE_FILE)
+
+		## get benchmark TPC-C
+		with trace("prepare-source", version=TPCC_ARTIFACT):
+			store.extract(TPCC_ARTIFACT, os.path.join(base_dir, SQLiteBenchmarker.NAME_DESIRED_FOLDER_BENCHMARK),
+				os.path.join(SQLiteBenchmarker.NAME_EXPECTED_SUB_FOLDER_INSIDE_BENCHMARK,
+					SQLiteBenchmarker.NAME_EXPECTED_BENCHMARK_FILE))
+
+	@staticmethod
+	def get_source_path(base_dir, sqlite_version):
+		return os.path.join(base_dir, SQLiteBenchmarker.NAME_DESIRED_FOLDER_SOURCE, sqlite_version)
+
+	@staticmethod
+	def get_sqlite_versions(config_files):
+		""" returns the sqlite versions the given config files are built with """
+		features_list = []
+		for config_file in config_files:
+			with open(config_file) as json_data:
+				features_list.append(json.load(json_data)["features"])
+		return get_sqlite_versions(features_list)
+
+
+	@traced("compile")
 	def compile(self):
-		""" Compiles the sqlite source according to the compile configuration """
+		""" Compiles the sqlite source according to the compile configuration
+		into the build folder of this config. The shell is built for TPC-C
+		through py-tpcc, a libsqlite3.so for the in-process driver and the
+		micro-workloads """
 		## compile source
 		print('Compiling source')
-		os.chdir(os.path.join(self.base_dir, 'sqlite-source'))
-		compile_command = SQLiteBenchmarker.get_compile_string(self.config["features"])
-		print("compiling: " + compile_command)
-		c_result = os.system(compile_command)
+		if not os.path.exists(self.build_dir):
+			os.makedirs(self.build_dir)
+
+		## the campaign has to prepare the sources of all its sqlite versions
+		if not os.path.isfile(os.path.join(self.source_path, SQLiteBenchmarker.NAME_EXPECTED_SOURCE_FILE)):
+			print("the sources of sqlite " + self.sqlite_version + " have not been prepared in " + self.source_path)
+			return SQLiteBenchmarker.EXIT_ERROR
+
+		## configs that contain options known not to build together are skipped
+		if self.constraints is not None:
+			constraint = self.constraints.violates(self.config["features"])
+			if constraint is not None:
+				print("skipping, the options " + str(constraint) + " are known not to compile together")
+				self.record_compile_result(SQLiteBenchmarker.EXIT_ERROR)
+				return SQLiteBenchmarker.EXIT_ERROR
+
+		## a resumed campaign does not build a config it has built before
+		targets = self.get_build_targets()
+		if (self.manifest is not None and self.manifest.is_compiled(self.config_name) and
+				all(os.path.isfile(output) for (command_template, precheck_template, output) in targets)):
+			print('Already compiled in this campaign')
+			return SQLiteBenchmarker.EXIT_SUCCESS
+
+		for (command_template, precheck_template, output) in targets:
+			c_result = self.compile_target(command_template, precheck_template, output)
+			if c_result != SQLiteBenchmarker.EXIT_SUCCESS:
+				return c_result
+		self.record_compile_result(SQLiteBenchmarker.EXIT_SUCCESS)
 		print('Finished compiling')
+		return SQLiteBenchmarker.EXIT_SUCCESS
+
+	def get_build_targets(self):
+		""" returns the compile command, pre-check command and output of
+		everything the selected workloads need """
+		targets = []
+		if TPCC in self.workloads and not self.in_process:
+			targets.append((SQLiteBenchmarker.GCC_COMPILE_COMMAND, SQLiteBenchmarker.GCC_PRECHECK_COMMAND,
+				self.binary_path))
+		if self.in_process or self.micro_workloads:
+			targets.append((SQLiteBenchmarker.GCC_SHARED_LIBRARY_COMMAND,
+				SQLiteBenchmarker.GCC_PRECHECK_LIBRARY_COMMAND, self.library_path))
+		return targets
+
+	def compile_target(self, command_template, precheck_template, output):
+		""" builds a single output of this config, from the cache if possible """
+		source_path = self.source_path
+		compile_command = SQLiteBenchmarker.get_compile_string(self.config["features"], output=output,
+			command=command_template)
+
+		## reuse a binary that has been built with the same features before
+		if self.cache is not None:
+			cache_key = self.cache.get_key(self.config["features"],
+				get_sqlite_artifact_name(self.sqlite_version),
+				SQLiteBenchmarker.get_compile_string({}, command=command_template))
+			with trace("cache-fetch", config=self.config_name):
+				found = self.cache.fetch(cache_key, output)
+			if found:
+				print('Found compiled binary in cache')
+				return SQLiteBenchmarker.EXIT_SUCCESS
+
+		if self.precheck:
+			precheck_command = SQLiteBenchmarker.get_compile_string(self.config["features"], command=precheck_template)
+			print("checking: " + precheck_command)
+			with trace("precheck", config=self.config_name):
+				(c_result, stderr) = run_compiler(precheck_command, source_path)
+			if c_result != SQLiteBenchmarker.EXIT_SUCCESS:
+				print('Pre-check failed')
+				self.record_compile_failure(c_result, stderr, command_template, precheck_template)
+				return c_result
+
+		if self.build_mode["pgo"]:
+			(c_result, stderr) = self.compile_with_profile(command_template, output)
+		else:
+			print("compiling: " + compile_command)
+			with trace("build", config=self.config_name, output=os.path.basename(output)):
+				(c_result, stderr) = run_compiler(compile_command, source_path)
+		if self.cache is not None and c_result == SQLiteBenchmarker.EXIT_SUCCESS:
+			self.cache.store(cache_key, output)
+		if c_result != SQLiteBenchmarker.EXIT_SUCCESS:
+			self.record_compile_failure(c_result, stderr, command_template, precheck_template)
 		return c_result
 
-	def run_benchmark(self):
-		""" Runs benchmark a given number of times on previousely compiled sqlite """
+	@traced("pgo-build")
+	def compile_with_profile(self, command_template, output):
+		""" profile guided build: builds output instrumented, trains it and
+		builds it again with the recorded profile. Returns the exit code and
+		stderr of the first step that failed or of the final build """
+		source_path = self.source_path
+		profile_dir = os.path.join(self.build_dir, SQLiteBenchmarker.get_profile_folder(output))
+		if os.path.exists(profile_dir):
+			shutil.rmtree(profile_dir)
+		os.makedirs(profile_dir)
+		features = self.config["features"]
 
-		## check if config dict has a field measurements
-		if not hasattr(self.config, "measurements" ):
-			self.config["measurements"] = []
+		instrumented_command = SQLiteBenchmarker.get_compile_string(features, output=output,
+			command=command_template, pgo_phase=PGO_GENERATE, profile_dir=profile_dir)
+		print("compiling instrumented: " + instrumented_command)
+		(c_result, stderr) = run_compiler(instrumented_command, source_path)
+		if c_result != SQLiteBenchmarker.EXIT_SUCCESS:
+			return (c_result, stderr)
 
-		self.measurements = self.config["measurements"]
+		print('training the instrumented build')
+		with trace("pgo-training", config=self.config_name):
+			t_result = run_training(output, profile_dir, library=(output == self.library_path))
+		if t_result != SQLiteBenchmarker.EXIT_SUCCESS:
+			return (t_result, "training run failed with exit code " + str(t_result))
+		merge_command = get_merge_command(self.build_mode, profile_dir)
+		if merge_command is not None:
+			(c_result, stderr) = run_compiler(merge_command, profile_dir)
+			if c_result != SQLiteBenchmarker.EXIT_SUCCESS:
+				return (c_result, stderr)
+
+		optimized_command = SQLiteBenchmarker.get_compile_string(features, output=output,
+			command=command_template, pgo_phase=PGO_USE, profile_dir=profile_dir)
+		print("compiling with profile: " + optimized_command)
+		return run_compiler(optimized_command, source_path)
+
+	def record_compile_failure(self, c_result, stderr, command_template, precheck_template):
+		""" stores a failed compile with its compiler output and, if asked
+		to, the smallest set of its options that still fails """
+		if self.constraints is None:
+			self.record_compile_result(c_result)
+			return
+		constraint = None
+		if self.minimize:
+			print('Minimizing the failing options')
+			constraint = self.minimize_failure(command_template, precheck_template)
+			## the options have been minimized with the sources of this version only
+			if constraint is not None:
+				constraint[BUILD_SQLITE_VERSION] = self.sqlite_version
+				print("options " + str(constraint) + " do not compile together")
+		self.constraints.add_failure(self.config_name, self.config["features"], c_result, stderr, constraint)
+		self.record_compile_result(c_result)
 
-		## need to change dir to benchmark root for correct execution
-		os.chdir(os.path.join(self.bm_path, 'pytpcc'))
-		os.system('python tpcc.py --print-config sqlite > ' + self.bm_config_path)
+	@traced("minimize")
+	def minimize_failure(self, command_template, precheck_template):
+		""" returns the minimal failing subset of the options of this config,
+		or None if even the default config fails. The cheap pre-check is used
+		for the search whenever it reproduces the failure """
+		source_path = self.source_path
+		output = os.path.join(self.build_dir, 'minimize')
+
+		def fails(features, template):
+			command = SQLiteBenchmarker.get_compile_string(features, output=output, command=template)
+			return subprocess.call(command, shell=True, cwd=source_path, stdout=subprocess.DEVNULL,
+				stderr=subprocess.DEVNULL) != SQLiteBenchmarker.EXIT_SUCCESS
+
+		features = self.config["features"]
+		template = precheck_template
+		if not fails(features, template):
+			template = command_template
+		if fails({}, template):
+			return None
+		constraint = minimize_failure(features, lambda subset: fails(subset, template),
+			SQLiteBenchmarker.MAX_MINIMIZE_COMPILES)
+		if os.path.exists(output):
+			os.remove(output)
+		return constraint
+
+	def record_compile_result(self, c_result):
+		""" notes in the campaign manifest whether the config compiled """
+		if self.manifest is None:
+			return
+		if c_result == SQLiteBenchmarker.EXIT_SUCCESS:
+			self.manifest.set_compiled(self.config_name)
+		else:
+			self.manifest.set_failed(self.config_name, c_result)
+
+	@staticmethod
+	def compile_all(base_dir, config_files, jobs, bmk_options=None):
+		""" Compiles all given configs in a pool of jobs processes. Each config
+		is built into its own build folder, so the builds do not overwrite each
+		other. The sources have to be prepared. Returns a dict mapping each
+		config file to its compile result """
+		if bmk_options is None:
+			bmk_options = {}
+		compile_results = {}
+		work = [(base_dir, config_file, bmk_options) for config_file in config_files]
+		with multiprocessing.Pool(jobs) as pool:
+			for config_file, c_result in pool.imap_unordered(compile_worker, work):
+				compile_results[config_file] = c_result
+				print("compiled " + str(len(compile_results)) + "/" + str(len(work)) +
+					" \"" + os.path.basename(config_file) + "\" (exit code " + str(c_result) + ")")
+		return compile_results
+
+	@traced("tpcc-config")
+	def prepare_run(self):
+		""" sets up the sandbox of this config: its own working folder with
+		a private benchmark database and tpcc config. Nothing outside the
+		sandbox is changed, so several configs can be benchmarked at once """
+		if not os.path.exists(self.run_dir):
+			os.makedirs(self.run_dir)
+
+		## let the benchmark print its default config for sqlite
+		default_config = subprocess.check_output(
+			["python", SQLiteBenchmarker.NAME_EXPECTED_BENCHMARK_FILE, "--print-config", "sqlite"],
+			cwd=self.bm_exec_path).decode('utf-8')
 
-		#adjust config
-		filedata = None
-		#read internal benchmarking config for sqlite
-		with open(self.bm_config_path, 'r') as file :
-			filedata = file.read()
 		# Replace the target string for benchmark database
-		filedata = filedata.replace('/tmp/tpcc.db', self.db_path)
-		# Write the file out again
+		filedata = default_config.replace('/tmp/tpcc.db', self.db_path)
 		with open(self.bm_config_path, 'w') as file:
 			file.write(filedata)
-		# let 'sqlite3' point to newly compiled file
-		print('Adding folder of newly compiled binary to PATH')
-		os.environ["PATH"] = os.path.join(os.path.abspath(self.base_dir), 'sqlite-source') \
-								+ os.pathsep + os.environ["PATH"]
+
+	def get_run_env(self):
+		""" returns the environment for the benchmark process, in which
+		'sqlite3' points to the newly compiled binary """
+		env = os.environ.copy()
+		env["PATH"] = self.build_dir + os.pathsep + env.get("PATH", "")
+		if self.storage is not None:
+			env = self.storage.get_env(env, self.base_dir, self.sync_file)
+		return env
+
+	def get_benchmark_command(self, phase=None):
+		""" returns the command that runs one cycle of the benchmark. With
+		phase "load" only the database is loaded, with phase "execute" only
+		the transactions run on an already loaded database """
+		command = ["python", SQLiteBenchmarker.NAME_EXPECTED_BENCHMARK_FILE]
+		if phase == "load":
+			command += ["--reset", "--no-execute"]
+		elif phase == "execute":
+			command += ["--no-load"]
+		else:
+			command += ["--reset"]
+		return command + ["--config=" + self.bm_config_path, "sqlite", "--debug"]
+
+	def run_process(self, command, env):
+		""" runs command inside the sandbox and returns its output, its
+		resource usage, the time it took in nanoseconds and its exit code """
+		start_ns = time.perf_counter_ns()
+		proc = subprocess.Popen(command, stdout=subprocess.PIPE, cwd=self.bm_exec_path, env=env)
+		self.pin_to_cpus(proc.pid)
+		out = proc.stdout.read()
+		proc.stdout.close()
+		# reap the child ourselves to get the resources it has used
+		(pid, status, ru) = os.wait4(proc.pid, 0)
+		proc.returncode = os.waitstatus_to_exitcode(status)
+		return (out, ru, time.perf_counter_ns() - start_ns, proc.returncode)
+
+	@traced("load")
+	def create_snapshot(self, env):
+		""" loads the benchmark database once and keeps a pristine copy of
+		it. Returns the time the load took in seconds. Raises BenchmarkError
+		if the load fails, since every cycle would start from a broken copy """
+		print('loading benchmark database for snapshot')
+		remove_database_files(self.db_path)
+		(out, ru, load_ns, returncode) = self.run_process(self.get_benchmark_command(phase="load"), env)
+		if returncode != 0:
+			raise BenchmarkError("loading the benchmark database failed with exit code " + str(returncode))
+		clone_file(self.db_path, self.snapshot_path)
+		return load_ns / 1e9
+
+	@traced("restore-snapshot")
+	def restore_snapshot(self):
+		""" replaces the benchmark database with the pristine snapshot """
+		remove_database_files(self.db_path)
+		clone_file(self.snapshot_path, self.db_path)
+
+	def pin_to_cpus(self, pid):
+		""" restricts the process pid to the cpus of this run. The child is
+		pinned from the parent after it has been spawned, since a preexec_fn
+		is not safe while the concurrent runner has several threads. Threads
+		and processes it starts later inherit the affinity """
+		if not self.cpus:
+			return
+		try:
+			os.sched_setaffinity(pid, self.cpus)
+		except ProcessLookupError:
+			## it is done already
+			pass
+
+	def run_benchmark(self):
+		""" Runs benchmark a given number of times on previousely compiled sqlite.
+		With a repetition policy the number of cycles is chosen adaptively.
+		Cycles that a resumed campaign has already done are not repeated.
+		Returns EXIT_ERROR if the benchmark of the config cannot run """
+
+		try:
+			self.start_benchmark()
+			if self.repetition is None:
+				## statistics of an earlier adaptive run do not cover the new cycles
+				self.config.pop("statistics", None)
+				first_cycle = 0
+				if self.manifest is not None:
+					first_cycle = min(self.num_cycles, self.get_cycles_recorded())
+					if first_cycle > 0:
+						print('resuming at cycle ' + str(first_cycle) + '/' + str(self.num_cycles))
+				## run benchmark self.num_cycles times
+				for n in range(first_cycle, self.num_cycles):
+					self.run_cycle()
+					self.record_measurement(n)
+			else:
+				self.run_adaptive()
+
+			if self.manifest is not None:
+				self.manifest.set_benchmarked(self.config_name)
+		except BenchmarkError as err:
+			print("benchmark of \"" + self.config_name + "\" failed: " + str(err))
+			if self.manifest is not None:
+				self.manifest.set_failed(self.config_name, SQLiteBenchmarker.EXIT_ERROR)
+			return SQLiteBenchmarker.EXIT_ERROR
+		finally:
+			self.remove_storage()
+		print('__ benchmark finished __\n\n')
+		return SQLiteBenchmarker.EXIT_SUCCESS
+
+	def start_benchmark(self):
+		""" prepares the measurements of the config and the benchmark, so
+		that cycles can be run with run_cycle and record_measurement """
+		## check if config dict has a field measurements
+		if "measurements" not in self.config:
+			self.config["measurements"] = []
+
+		## with a results store, the measurements of the config are those of this campaign in the store
+		if self.results_store is not None:
+			features = self.config["features"]
+			self.results_store.add_config(self.config_id, self.config_name, features,
+				SQLiteBenchmarker.get_export_string(features))
+			self.config["measurements"] = list(self.results_store.iter_measurements(self.config_id, self.campaign))
+
+		self.measurements = self.config["measurements"]
+		self.setup_benchmark()
+
 		## start benchmark
 		print('starting benchmark')
-		benchmark_command = "python tpcc.py --reset --config=sqlite.config sqlite --debug"
-
-		## run benchmark self.num_cycles times
-		for n in range(self.num_cycles):
-			self.current_measurement = {}
-			self.current_measurement["start_human_readable"] = datetime.datetime.now().isoformat()
-			self.current_measurement["start"] = cur_milli()
-			print('##>>' + milli_str(self.current_measurement["start"]) + '>>') # print time in milliseconds
-
-			# comment in two below lines to run benchmark;
-			# comment them out and comment in sleep ommand to fake benchmarking
-			proc = subprocess.Popen([benchmark_command], stdout=subprocess.PIPE, shell=True)
-			(out, err) = proc.communicate()
-			#time.sleep(0.1)
-
-			self.current_measurement["finish"] = cur_milli()
-			print('##<<' + milli_str(self.current_measurement["finish"]) + '<<') # print time in milliseconds
-			self.current_measurement["cost_in_seconds"] = round((self.current_measurement["finish"] - self.current_measurement["start"])/100)/10
-			self.config["measurements"].append(self.current_measurement)
+		if self.cpus:
+			print('pinned to cpus ' + ",".join(str(cpu) for cpu in sorted(self.cpus)))
+
+	def setup_benchmark(self):
+		""" prepares everything that is shared by the cycles of a run: the
+		sandbox, the benchmark command or in-process driver, the snapshot
+		and the micro-workloads """
+		self.load_in_seconds = None
+		for folder in (self.run_dir, self.db_dir):
+			if not os.path.exists(folder):
+				os.makedirs(folder)
+		if self.storage is not None:
+			print('database in ' + self.db_dir + ', ' + str(self.storage.get_info(self.db_dir)))
+		if self.micro_workloads:
+			print('micro-workloads: ' + ", ".join(self.micro_workloads))
+			self.suite = WorkloadSuite(self.library_path, self.db_dir, self.micro_workloads, storage=self.storage)
+		if TPCC not in self.workloads:
+			return
+		if self.in_process:
+			self.driver = InProcessDriver(self.library_path, self.db_path, storage=self.storage)
+			if self.snapshot:
+				print('loading benchmark database for snapshot')
+				with trace("load", config=self.config_name):
+					self.load_in_seconds = self.driver.load_database()
+				clone_file(self.db_path, self.snapshot_path)
+			return
+
+		self.prepare_run()
+		if self.storage is not None and self.storage.cache is not None and not self.snapshot:
+			print('py-tpcc loads the database in every cycle, use --snapshot to start cycles with a ' +
+				self.storage.cache + ' cache')
+		self.env = self.get_run_env()
+		self.benchmark_command = self.get_benchmark_command()
+		if self.snapshot:
+			self.load_in_seconds = self.create_snapshot(self.env)
+			self.benchmark_command = self.get_benchmark_command(phase="execute")
+		self.perf_file = os.path.join(self.run_dir, 'perf-stat.csv')
+		if perf_usable():
+			print('counting hardware events with perf')
+			self.benchmark_command = get_perf_command(self.benchmark_command, self.perf_file)
+
+	@traced("execute")
+	def run_cycle(self):
+		""" runs a single cycle of the benchmark, after setup_benchmark, and
+		returns its measurement (also kept as self.current_measurement) """
+		io = None
+		if TPCC not in self.workloads:
+			self.run_workload_cycle()
+		else:
+			if self.snapshot:
+				self.restore_snapshot()
+				if self.storage is not None:
+					self.storage.set_cache_state(self.db_path)
+			io_counter = IOCounter(self.sync_file)
+			io_counter.start()
+			if self.in_process:
+				self.run_in_process_cycle()
+			else:
+				self.run_process_cycle()
+			## the bytes of a benchmark process come from its own rusage, the
+			## harness and parallel runs write through other processes and threads
+			child_blocks = 0
+			if not self.in_process:
+				child_blocks = self.current_measurement["rusage"]["block_output"]
+			io = io_counter.stop(child_blocks)
+			if self.micro_workloads:
+				self.add_workload_metrics()
+		## syncs and bytes written tell disk noise apart from the effect of a config
+		if self.storage is not None:
+			workloads = self.current_measurement.get("workloads", {})
+			self.current_measurement["io"] = sum_io([io] + [metrics.get("io") for metrics in workloads.values()])
+			self.current_measurement["storage"] = self.storage.get_info(self.db_dir)
+		## every measurement tells how its binary was built
+		self.current_measurement["build"] = dict(self.build_mode)
+		if self.node is not None:
+			self.current_measurement["node"] = self.node
+		return self.current_measurement
+
+	def run_process_cycle(self):
+		""" runs a single cycle of py-tpcc on the previousely compiled shell """
+		self.current_measurement = {}
+		self.current_measurement["start_human_readable"] = datetime.datetime.now().isoformat()
+		self.current_measurement["start"] = cur_milli()
+		print('##>>' + milli_str(self.current_measurement["start"]) + '>>') # print time in milliseconds
+
+		# comment in below line to run benchmark;
+		# comment it out and comment in sleep ommand to fake benchmarking
+		(out, ru, duration_ns, returncode) = self.run_process(self.benchmark_command, self.env)
+		#time.sleep(0.1)
+
+		self.current_measurement["finish"] = cur_milli()
+		print('##<<' + milli_str(self.current_measurement["finish"]) + '<<') # print time in milliseconds
+		self.current_measurement["cost_in_seconds"] = round((self.current_measurement["finish"] - self.current_measurement["start"])/100)/10
+		## a cycle on the snapshot costs only its execute phase, not the start of the interpreter
+		execute_ns = parse_tpcc_duration_ns(out) if self.snapshot else None
+		if execute_ns is not None:
+			self.current_measurement["process_ns"] = duration_ns
+			duration_ns = execute_ns
+			self.current_measurement["cost_in_seconds"] = round(duration_ns / 1e8) / 10
+		self.current_measurement["duration_ns"] = duration_ns
+		self.add_transaction_metrics(out, duration_ns)
+		self.current_measurement["rusage"] = get_rusage_dict(ru)
+		if perf_usable():
+			self.current_measurement["perf_counters"] = parse_perf_output(self.perf_file)
+		if self.cpus:
+			self.current_measurement["cpus"] = sorted(self.cpus)
+		if self.load_in_seconds is not None:
+			self.current_measurement["load_in_seconds"] = self.load_in_seconds
+		return self.current_measurement
+
+	def run_in_process_cycle(self):
+		""" runs a single cycle with the in-process driver on the previousely
+		compiled libsqlite3.so, timing only the SQL work """
+		start_human_readable = datetime.datetime.now().isoformat()
+		start = cur_milli()
+		print('##>>' + milli_str(start) + '>>') # print time in milliseconds
+		if self.snapshot:
+			self.current_measurement = self.driver.execute()
+			self.current_measurement["load_in_seconds"] = self.load_in_seconds
+		else:
+			self.current_measurement = self.driver.run()
+		self.current_measurement["start_human_readable"] = start_human_readable
+		self.current_measurement["start"] = start
+		self.current_measurement["finish"] = cur_milli()
+		print('##<<' + milli_str(self.current_measurement["finish"]) + '<<') # print time in milliseconds
+		return self.current_measurement
+
+	def run_workload_cycle(self):
+		""" runs a single cycle of only the micro-workloads """
+		self.current_measurement = {}
+		self.current_measurement["start_human_readable"] = datetime.datetime.now().isoformat()
+		self.current_measurement["start"] = cur_milli()
+		print('##>>' + milli_str(self.current_measurement["start"]) + '>>') # print time in milliseconds
+		self.add_workload_metrics()
+		print('##<<' + milli_str(self.current_measurement["finish"]) + '<<') # print time in milliseconds
+		self.current_measurement["cost_in_seconds"] = round(self.current_measurement["duration_ns"] / 1e8) / 10
+		if self.cpus:
+			self.current_measurement["cpus"] = sorted(self.cpus)
+		return self.current_measurement
+
+	def add_workload_metrics(self):
+		""" runs the micro-workloads and adds their metrics to the current
+		measurement. Their time is added to the duration of the cycle, so
+		that it is part of the cost. Raises BenchmarkError if a workload has
+		been skipped or failed, since the cycle would look cheaper than the
+		cycles of configs that ran it """
+		workloads = self.suite.run()
+		for name in sorted(workloads):
+			for outcome in ("skipped", "failed"):
+				if outcome in workloads[name]:
+					raise BenchmarkError("workload " + name + " " + outcome + " in \"" + self.config_name + "\": " +
+						workloads[name][outcome])
+		self.current_measurement["workloads"] = workloads
+		duration_ns = sum(metrics.get("duration_ns", 0) for metrics in workloads.values())
+		self.current_measurement["duration_ns"] = self.current_measurement.get("duration_ns", 0) + duration_ns
+		self.current_measurement["finish"] = cur_milli()
+
+	def remove_storage(self):
+		""" removes the database of a config that lives outside its run
+		folder, e.g. in tmpfs, where it would take up memory """
+		if self.db_dir == self.run_dir or not os.path.exists(self.db_dir):
+			return
+		shutil.rmtree(self.db_dir)
+
+	def get_cycles_recorded(self):
+		""" returns the number of cycles of this campaign whose measurements
+		have been written. A resumed campaign counts them rather than the
+		cycles in the manifest, which misses a cycle that was written just
+		before the campaign was interrupted """
+		return len(self.get_campaign_measurements())
+
+	def get_campaign_measurements(self):
+		""" returns the measurements of this config taken in this campaign,
+		without those an earlier campaign left in the config file """
+		return [measurement for measurement in self.measurements if measurement.get("campaign") == self.campaign]
+
+	@traced("record-measurement")
+	def record_measurement(self, n):
+		""" appends the last measurement to the config and writes it out """
+		if self.campaign is not None:
+			self.current_measurement["campaign"] = self.campaign
+		self.config["measurements"].append(self.current_measurement)
+		if self.results_store is not None:
+			print('Appending result to results store.')
+			self.results_store.append_measurement(self.config_id, self.campaign, self.current_measurement,
+				SQLiteBenchmarker.get_cost(self.current_measurement))
+		else:
 			self.write_result()
-			print("\f finished benchmark run #" + str(n))
+		## count the cycle only once its measurement is safe
+		if self.manifest is not None:
+			self.manifest.add_cycle(self.config_name)
+		print("\f finished benchmark run #" + str(n))
 
-		print('__ benchmark finished __\n\n')
+	def run_adaptive(self):
+		""" discards the warm-up cycles and then repeats cycles until the
+		repetition policy is satisfied. The stopping reason, the confidence
+		interval and flagged outliers are stored with the measurements """
+		policy = self.repetition
+		for n in range(policy.warmup):
+			self.run_cycle()
+			print("\f discarded warm-up run #" + str(n))
 
+		n = 0
+		stop_reason = None
+		while stop_reason is None:
+			costs = [SQLiteBenchmarker.get_cost(m) for m in self.get_campaign_measurements()]
+			stop_reason = policy.get_stop_reason(costs)
+			if stop_reason is None:
+				self.run_cycle()
+				self.record_measurement(n)
+				n += 1
+
+		## keep the statistics next to the measurements they describe
+		measurements = self.get_campaign_measurements()
+		costs = [SQLiteBenchmarker.get_cost(m) for m in measurements]
+		stats = policy.evaluate(costs)
+		for i, measurement in enumerate(measurements):
+			measurement["outlier"] = i in stats["outliers"]
+		stats["outliers"] = len(stats["outliers"])
+		stats["stop_reason"] = stop_reason
+		stats["warmup_cycles"] = policy.warmup
+		self.config["statistics"] = stats
+		self.write_result()
+		print("stopped after " + str(stats["cycles"]) + " cycles (" + stop_reason + "), mean " +
+			str(round(stats["mean"], 3)) + " s +/- " + str(round(100 * stats["relative_ci"], 2)) + "%")
+
+	def add_transaction_metrics(self, out, duration_ns):
+		""" adds the per transaction type counts, rates and latencies that
+		py-tpcc printed, together with the tpmC, to the current measurement """
+		transactions = parse_tpcc_output(out)
+		if not transactions:
+			return
+		## py-tpcc reports how long its execute phase took, the rest is loading
+		execute_ns = parse_tpcc_duration_ns(out)
+		if execute_ns is None:
+			execute_ns = duration_ns
+		self.current_measurement["transactions"] = transactions
+		self.current_measurement["tpmC"] = get_tpmc(transactions, execute_ns)
+
+	@traced("write-result")
 	def write_result(self):
-		""" writes result of last benchmark run to its corresponding config file """
+		""" writes result of last benchmark run to its corresponding config
+		file. With a results store only the config level information, like
+		statistics, is written, since measurements are appended as they come """
+		if self.results_store is not None:
+			for key in SQLiteBenchmarker.CONFIG_INFO_KEYS:
+				if key in self.config:
+					self.results_store.set_config_info(self.config_id, self.campaign, key, self.config[key])
+			return
 		print('Appending result to original config file.')
 		with open(self.config_file, 'w') as f:
 			f.seek(0)
@@ -212,12 +799,27 @@ class SQLiteBenchmarker:
 
 
 	@staticmethod
-	def write_all_in_one_result_file(base_dir):
+	@traced("write-all-in-one-results")
+	def write_all_in_one_result_file(base_dir, results_store=None, campaign=None):
 		""" Writes all results, that are integrated in their respective
-		config files, into one json file as well as a XML file for
-		legacy systems"""
-		file_content = {}
-		results = []
+		config files or the results store, into one json file as well as
+		a XML file for legacy systems. Both files are streamed, so only one
+		result is held in memory at a time """
+		if results_store is not None:
+			results = lambda: results_store.iter_results(campaign)
+		else:
+			results = lambda: SQLiteBenchmarker.iter_config_file_results(base_dir)
+
+		## write aggregated results object as json
+		write_json_results(os.path.join(base_dir, 'all-in-one-results.json'), results())
+
+		## write a beautiful XML file
+		write_xml_results(os.path.join(base_dir, 'all-in-one-results.xml'), results())
+
+	@staticmethod
+	def iter_config_file_results(base_dir):
+		""" yields the results that are integrated in the config files, one
+		config file at a time """
 		config_folder = os.path.join(base_dir, 'compile-configs')
 		file_list = os.listdir(config_folder)
 
@@ -227,86 +829,41 @@ class SQLiteBenchmarker:
 			with open(abs_file) as json_data:
 				config = json.load(json_data)
 
-				## check if benchmark has successfull been run and extract info
-				if "measurements" in config:
-					features = config["features"]
-					new_config = {}
-					config_id = SQLiteBenchmarker.get_id_from_config(features)
-					new_config["id"] = config_id
-					cmd = SQLiteBenchmarker.get_compile_string(features)
-					new_config["command"] = cmd
-					new_config["measurements"] = config["measurements"]
-					results.append(new_config)
-
-		## write aggregated results object as json
-		file_content["results"] = results
-		with open(os.path.join(base_dir, 'all-in-one-results.json'), 'w') as f:
-			f.seek(0)
-			f.write(json.dumps(file_content, indent=4, sort_keys=True))
-			f.close()
-
-		## write a beautiful XML file
-		root = ET.Element("results")
-
-		# append one node for each compile configuration
-		for n in range(len(results)):
-			result = results[n]
-			result_node = ET.SubElement(root, "result", id=result["id"])
-			result_id_node = ET.SubElement(result_node, "id")
-			result_id_node.text = result["id"]
-			result_cmd_node = ET.SubElement(result_node, "command")
-			result_cmd_node.text = result["command"]
-
-			result_measurements_node = ET.SubElement(result_node, "measurements")
-			measurements = result["measurements"]
-
-			# add one node for each benchmark run
-			for i in range(len(measurements)):
-				measurement = measurements[i]
-				measurement_node = ET.SubElement(result_measurements_node, "measurement", id=str(i))
-				cost_in_seconds_node = ET.SubElement(measurement_node, "cost-in-seconds")
-				cost_in_seconds_node.text = str(measurement["cost_in_seconds"])
-				finish_node = ET.SubElement(measurement_node, "finish")
-				finish_node.text = str(measurement["finish"])
-				start_node = ET.SubElement(measurement_node, "start")
-				start_node.text = str(measurement["start"])
-				start_human_readable_node = ET.SubElement(measurement_node, "start-human-readable")
-				start_human_readable_node.text = str(measurement["start_human_readable"])
-
-
-		# take tree and make a pretty string (improve readability)
-		xmlstr = minidom.parseString(ET.tostring(root)).toprettyxml(indent="   ")
-
-		# write result
-		with open(os.path.join(base_dir, 'all-in-one-results.xml'), 'w') as f:
-			f.seek(0)
-			f.write(xmlstr)
-			f.close()
+			## check if benchmark has successfull been run and extract info
+			if "measurements" in config:
+				features = config["features"]
+				new_config = {}
+				config_id = SQLiteBenchmarker.get_id_from_config(features)
+				new_config["id"] = config_id
+				cmd = SQLiteBenchmarker.get_export_string(features)
+				new_config["command"] = cmd
+				new_config["measurements"] = config["measurements"]
+				for key in SQLiteBenchmarker.CONFIG_INFO_KEYS:
+					if key in config:
+						new_config[key] = config[key]
+				yield new_config
 
 	@staticmethod
-	def get_id_from_config(config):
-		""" generates an identification string from a compile config """
-		seperation_str = "%;%"
-		value_seperator = ""
-
-		id = seperation_str
-		## iterate over all compile options and add something to the id string
-		for option, value in config.items():
-			if value is None:
-				add_string = option
-			else:
-				add_string = option + value_seperator +  str(value)
-
-			id += add_string + seperation_str
-		return id
+	def get_id_from_config(features):
+		""" returns the content address of a features dict: the sha256 of
+		its canonical json, which is the same in every run. It identifies a
+		config in the results store, the exports and the config file names """
+		canonical = json.dumps(features, sort_keys=True, separators=(",", ":"))
+		return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
 	@staticmethod
-	def get_compile_string(features):
+	def get_compile_string(features, output=NAME_BINARY, command=GCC_COMPILE_COMMAND, pgo_phase=None,
+			profile_dir=None):
 		""" takes a features dict and generates the command that will compile
-		sqlite with the features in the given dict """
-		compile_command = SQLiteBenchmarker.GCC_COMPILE_COMMAND
+		sqlite with the features in the given dict into the binary output.
+		The build options of features choose the compiler and its flags, the
+		others become macros. pgo_phase adds the flags of a step of a profile
+		guided build """
+		macros, build_mode = split_features(features)
+		compile_command = command.format(output=output, compiler=build_mode["compiler"],
+			flags=get_build_flags(build_mode, pgo_phase, profile_dir))
 
-		for option, value in features.items():
+		for option, value in macros.items():
 			add_string = " -D"
 			if value is None:
 				add_string += option
@@ -315,12 +872,39 @@ class SQLiteBenchmarker:
 			compile_command += add_string
 		return compile_command
 
+	@staticmethod
+	def get_export_string(features):
+		""" returns the compile command of features as it is exported with
+		the results. A profile guided build shows the flags of its final
+		build, so the build mode can be parsed back from the command """
+		return SQLiteBenchmarker.get_compile_string(features, pgo_phase=PGO_USE,
+			profile_dir=SQLiteBenchmarker.get_profile_folder(SQLiteBenchmarker.NAME_BINARY))
+
+	@staticmethod
+	def get_profile_folder(output):
+		""" returns the name of the folder with the profile of output """
+		return "profile-" + os.path.basename(output)
+
+	@staticmethod
+	def get_cost(measurement):
+		""" returns the cost of a measurement in seconds, as precise as
+		it has been recorded """
+		if "duration_ns" in measurement:
+			return measurement["duration_ns"] / 1e9
+		return measurement["cost_in_seconds"]
+
+	@staticmethod
+	def get_config_name(config_file):
+		""" returns the name of a config file without folder and extension """
+		return os.path.splitext(os.path.basename(config_file))[0]
+
 	@staticmethod
 	def get_param_string(features):
 		""" takes a features dict and generates a string that contains the respective parameters """
-		compile_command = ""
+		macros, build_mode = split_features(features)
+		compile_command = " " + get_build_flags(build_mode)
 
-		for option, value in features.items():
+		for option, value in macros.items():
 			add_string = " -D"
 			if value is None:
 				add_string += option
@@ -335,20 +919,31 @@ class SQLiteBenchmarker:
 		this class at some point """
 		bmk_path = os.path.join(base_dir, 'benchmark')
 		src_path = os.path.join(base_dir, 'sqlite-source')
+		builds_path = os.path.join(base_dir, 'builds')
+		runs_path = os.path.join(base_dir, 'runs')
 		db_path = os.path.join(base_dir, 'sqlite_benchmark.db')
+		results_store_path = os.path.join(base_dir, 'results.db')
 		all_in_one_results_xml_path = os.path.join(base_dir, 'all-in-one-results.xml')
 		all_in_one_results_json_path = os.path.join(base_dir, 'all-in-one-results.json')
 		all_in_one_results_json_path = os.path.join(base_dir, 'all-in-one-results.json')
 		zip_source = os.path.join(base_dir, 'sqlite-amalgamation-3160200.zip')
 		zip_bmk = os.path.join(base_dir, 'py-tpcc-master.zip')
+		hooks_path = os.path.join(base_dir, 'storage-hooks')
 
 		try:
 			if os.path.exists(bmk_path):
 				shutil.rmtree(bmk_path)
 			if os.path.exists(src_path):
 				shutil.rmtree(src_path)
+			if os.path.exists(builds_path):
+				shutil.rmtree(builds_path)
+			if os.path.exists(runs_path):
+				shutil.rmtree(runs_path)
 			if os.path.exists(db_path):
 				os.remove(db_path)
+			for path in (results_store_path, results_store_path + "-wal", results_store_path + "-shm"):
+				if os.path.exists(path):
+					os.remove(path)
 			if os.path.exists(all_in_one_results_xml_path):
 				os.remove(all_in_one_results_xml_path)
 			if os.path.exists(all_in_one_results_json_path):
@@ -357,10 +952,68 @@ class SQLiteBenchmarker:
 				os.remove(zip_source)
 			if os.path.exists(zip_bmk):
 				os.remove(zip_bmk)
-		except err:
+			if os.path.exists(hooks_path):
+				shutil.rmtree(hooks_path)
+		except OSError:
 			print("Could'nt delete files.")
 
 
+## ioctl request of Linux that clones a file (copy on write)
+FICLONE = 0x40049409
+
+
+def remove_database_files(db_path):
+	""" removes a database file together with its journal and wal file """
+	for path in (db_path, db_path + "-journal", db_path + "-wal", db_path + "-shm"):
+		if os.path.exists(path):
+			os.remove(path)
+
+
+def clone_file(source, destination):
+	""" copies source to destination. Uses a reflink (copy on write clone)
+	where the filesystem supports it and a plain copy otherwise """
+	with open(source, 'rb') as src, open(destination, 'wb') as dst:
+		try:
+			fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+			return
+		except OSError:
+			pass
+	shutil.copyfile(source, destination)
+
+
+def split_cpus(num_sets, cpus=None):
+	""" splits the cpus this process may run on into num_sets disjoint sets
+	of (nearly) equal size """
+	if cpus is None:
+		cpus = os.sched_getaffinity(0)
+	cpus = sorted(cpus)
+	num_sets = max(1, min(num_sets, len(cpus)))
+	sets = []
+	start = 0
+	for i in range(num_sets):
+		size = len(cpus) // num_sets + (1 if i < len(cpus) % num_sets else 0)
+		sets.append(set(cpus[start:start + size]))
+		start += size
+	return sets
+
+
+def run_compiler(command, cwd):
+	""" runs a compile command and returns its exit code and stderr, which
+	is passed on to our own stderr as well """
+	result = subprocess.run(command, shell=True, cwd=cwd, stderr=subprocess.PIPE)
+	stderr = result.stderr.decode('utf-8', 'replace')
+	sys.stderr.write(stderr)
+	return (result.returncode, stderr)
+
+
+def compile_worker(work):
+	""" compiles a single config inside a worker process of
+	SQLiteBenchmarker.compile_all """
+	base_dir, config_file, bmk_options = work
+	bmk = SQLiteBenchmarker(base_dir=base_dir, config_file=config_file, num_cycles=0, **bmk_options)
+	return (config_file, bmk.compile())
+
+
 def cur_milli():
 	""" returns current time in milliseconds from some zero point in time """
 	return time.time()*1000
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import json
+import time
+import random
+import ctypes
+from metrics import LatencyRecorder, get_tpmc, get_rusage_delta, get_thread_rusage
+
+
+def main(argv):
+	## default values
+	library_path = ''
+	db_path = os.path.join(os.path.abspath(os.getcwd()), 'sqlite_in_process.db')
+	transactions = InProcessDriver.DEFAULT_TRANSACTIONS
+	found_library = False
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"l:d:t:h",["library=","database=","transactions=","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(InProcessDriver.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-l", "--library"):
+			library_path = os.path.abspath(arg)
+			found_library = True
+		elif opt in ("-d", "--database"):
+			db_path = os.path.abspath(arg)
+		elif opt in ("-t", "--transactions"):
+			transactions = int(arg)
+		else:
+			print (help_str())
+			sys.exit(InProcessDriver.EXIT_ERROR)
+
+	if not found_library:
+		print (help_str())
+		sys.exit(InProcessDriver.EXIT_ERROR)
+
+	driver = InProcessDriver(library_path, db_path, transactions=transactions)
+	print(json.dumps(driver.run(), indent=4, sort_keys=True))
+
+
+class SQLiteError(Exception):
+	""" raised when the loaded sqlite library reports an error """
+	pass
+
+
+class SQLiteLibrary:
+	""" ctypes binding of the parts of the sqlite C API needed to drive a
+	workload through a compiled libsqlite3.so """
+	SQLITE_OK = 0
+	SQLITE_ROW = 100
+	SQLITE_DONE = 101
+
+	SQLITE_INTEGER = 1
+	SQLITE_FLOAT = 2
+	SQLITE_TEXT = 3
+	SQLITE_NULL = 5
+
+	SQLITE_OPEN_READWRITE = 0x02
+	SQLITE_OPEN_CREATE = 0x04
+
+	# tells sqlite to copy bound strings right away
+	SQLITE_TRANSIENT = ctypes.c_void_p(-1)
+
+
+	def __init__(self, library_path):
+		self.library_path = library_path
+		# RTLD_LOCAL keeps the symbols of several builds apart inside one process
+		self.lib = ctypes.CDLL(library_path, mode=os.RTLD_NOW | os.RTLD_LOCAL)
+		lib = self.lib
+		p = ctypes.c_void_p
+
+		lib.sqlite3_libversion.restype = ctypes.c_char_p
+		lib.sqlite3_libversion.argtypes = []
+		lib.sqlite3_open_v2.restype = ctypes.c_int
+		lib.sqlite3_open_v2.argtypes = [ctypes.c_char_p, ctypes.POINTER(p), ctypes.c_int, ctypes.c_char_p]
+		lib.sqlite3_close_v2.restype = ctypes.c_int
+		lib.sqlite3_close_v2.argtypes = [p]
+		lib.sqlite3_errmsg.restype = ctypes.c_char_p
+		lib.sqlite3_errmsg.argtypes = [p]
+		lib.sqlite3_exec.restype = ctypes.c_int
+		lib.sqlite3_exec.argtypes = [p, ctypes.c_char_p, p, p, p]
+		lib.sqlite3_prepare_v2.restype = ctypes.c_int
+		lib.sqlite3_prepare_v2.argtypes = [p, ctypes.c_char_p, ctypes.c_int, ctypes.POINTER(p), p]
+		lib.sqlite3_step.restype = ctypes.c_int
+		lib.sqlite3_step.argtypes = [p]
+		lib.sqlite3_reset.restype = ctypes.c_int
+		lib.sqlite3_reset.argtypes = [p]
+		lib.sqlite3_clear_bindings.restype = ctypes.c_int
+		lib.sqlite3_clear_bindings.argtypes = [p]
+		lib.sqlite3_finalize.restype = ctypes.c_int
+		lib.sqlite3_finalize.argtypes = [p]
+		lib.sqlite3_bind_int64.restype = ctypes.c_int
+		lib.sqlite3_bind_int64.argtypes = [p, ctypes.c_int, ctypes.c_int64]
+		lib.sqlite3_bind_double.restype = ctypes.c_int
+		lib.sqlite3_bind_double.argtypes = [p, ctypes.c_int, ctypes.c_double]
+		lib.sqlite3_bind_text.restype = ctypes.c_int
+		lib.sqlite3_bind_text.argtypes = [p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int, p]
+		lib.sqlite3_bind_null.restype = ctypes.c_int
+		lib.sqlite3_bind_null.argtypes = [p, ctypes.c_int]
+		lib.sqlite3_column_count.restype = ctypes.c_int
+		lib.sqlite3_column_count.argtypes = [p]
+		lib.sqlite3_column_type.restype = ctypes.c_int
+		lib.sqlite3_column_type.argtypes = [p, ctypes.c_int]
+		lib.sqlite3_column_int64.restype = ctypes.c_int64
+		lib.sqlite3_column_int64.argtypes = [p, ctypes.c_int]
+		lib.sqlite3_column_double.restype = ctypes.c_double
+		lib.sqlite3_column_double.argtypes = [p, ctypes.c_int]
+		lib.sqlite3_column_text.restype = ctypes.c_char_p
+		lib.sqlite3_column_text.argtypes = [p, ctypes.c_int]
+
+	def version(self):
+		""" returns the version string of the loaded library """
+		return self.lib.sqlite3_libversion().decode('utf-8')
+
+	def connect(self, db_path):
+		""" opens (and creates) the database db_path """
+		return Connection(self, db_path)
+
+
+class Connection:
+	""" A database connection of a SQLiteLibrary. Prepared statements are
+	cached per SQL string, so repeated queries only bind and step """
+
+	def __init__(self, library, db_path):
+		self.library = library
+		self.lib = library.lib
+		self.db = ctypes.c_void_p()
+		flags = SQLiteLibrary.SQLITE_OPEN_READWRITE | SQLiteLibrary.SQLITE_OPEN_CREATE
+		rc = self.lib.sqlite3_open_v2(db_path.encode('utf-8'), ctypes.byref(self.db), flags, None)
+		if rc != SQLiteLibrary.SQLITE_OK:
+			raise SQLiteError("could not open " + db_path + ": " + self.errmsg())
+		self.statements = {}
+
+
+	def errmsg(self):
+		return self.lib.sqlite3_errmsg(self.db).decode('utf-8', 'replace')
+
+	def executescript(self, sql):
+		""" runs one or more statements without parameters or results """
+		rc = self.lib.sqlite3_exec(self.db, sql.encode('utf-8'), None, None, None)
+		if rc != SQLiteLibrary.SQLITE_OK:
+			raise SQLiteError(self.errmsg())
+
+	def execute(self, sql, params=()):
+		""" runs a single statement and returns all result rows as tuples """
+		stmt = self.statements.get(sql)
+		if stmt is None:
+			stmt = ctypes.c_void_p()
+			rc = self.lib.sqlite3_prepare_v2(self.db, sql.encode('utf-8'), -1, ctypes.byref(stmt), None)
+			if rc != SQLiteLibrary.SQLITE_OK:
+				raise SQLiteError(self.errmsg() + " in: " + sql)
+			self.statements[sql] = stmt
+
+		lib = self.lib
+		for i, param in enumerate(params, 1):
+			if param is None:
+				lib.sqlite3_bind_null(stmt, i)
+			elif isinstance(param, int):
+				lib.sqlite3_bind_int64(stmt, i, param)
+			elif isinstance(param, float):
+				lib.sqlite3_bind_double(stmt, i, param)
+			else:
+				lib.sqlite3_bind_text(stmt, i, str(param).encode('utf-8'), -1, SQLiteLibrary.SQLITE_TRANSIENT)
+
+		rows = []
+		try:
+			while True:
+				rc = lib.sqlite3_step(stmt)
+				if rc == SQLiteLibrary.SQLITE_ROW:
+					rows.append(self._read_row(stmt))
+				elif rc == SQLiteLibrary.SQLITE_DONE:
+					break
+				else:
+					raise SQLiteError(self.errmsg() + " in: " + sql)
+		finally:
+			lib.sqlite3_reset(stmt)
+			lib.sqlite3_clear_bindings(stmt)
+		return rows
+
+	def _read_row(self, stmt):
+		lib = self.lib
+		row = []
+		for col in range(lib.sqlite3_column_count(stmt)):
+			col_type = lib.sqlite3_column_type(stmt, col)
+			if col_type == SQLiteLibrary.SQLITE_INTEGER:
+				row.append(lib.sqlite3_column_int64(stmt, col))
+			elif col_type == SQLiteLibrary.SQLITE_FLOAT:
+				row.append(lib.sqlite3_column_double(stmt, col))
+			elif col_type == SQLiteLibrary.SQLITE_NULL:
+				row.append(None)
+			else:
+				row.append(lib.sqlite3_column_text(stmt, col).decode('utf-8', 'replace'))
+		return tuple(row)
+
+	def close(self):
+		for stmt in self.statements.values():
+			self.lib.sqlite3_finalize(stmt)
+		self.statements = {}
+		self.lib.sqlite3_close_v2(self.db)
+
+
+class InProcessDriver:
+	""" Runs a small TPC-C like transaction mix directly against a compiled
+	libsqlite3.so. Only the SQL work is timed; interpreter startup, imports
+	and the shell do not end up in the measurement """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	DEFAULT_TRANSACTIONS = 2000
+	DEFAULT_SEED = 42
+
+	NUM_DISTRICTS = 10
+	NUM_CUSTOMERS_PER_DISTRICT = 300
+	NUM_ITEMS = 10000
+
+	## transaction mix of TPC-C (in percent)
+	TRANSACTION_MIX = [
+		("NEW_ORDER", 45),
+		("PAYMENT", 43),
+		("ORDER_STATUS", 4),
+		("DELIVERY", 4),
+		("STOCK_LEVEL", 4)
+	]
+
+	SCHEMA = """
+		CREATE TABLE district (d_id INTEGER PRIMARY KEY, d_ytd REAL, d_next_o_id INTEGER);
+		CREATE TABLE customer (c_d_id INTEGER, c_id INTEGER, c_balance REAL, c_payment_cnt INTEGER,
+			c_data TEXT, PRIMARY KEY (c_d_id, c_id));
+		CREATE TABLE item (i_id INTEGER PRIMARY KEY, i_price REAL, i_name TEXT);
+		CREATE TABLE stock (s_i_id INTEGER PRIMARY KEY, s_quantity INTEGER, s_order_cnt INTEGER);
+		CREATE TABLE orders (o_d_id INTEGER, o_id INTEGER, o_c_id INTEGER, o_carrier_id INTEGER,
+			o_ol_cnt INTEGER, PRIMARY KEY (o_d_id, o_id));
+		CREATE INDEX idx_orders_customer ON orders (o_d_id, o_c_id, o_id);
+		CREATE TABLE new_order (no_d_id INTEGER, no_o_id INTEGER, PRIMARY KEY (no_d_id, no_o_id));
+		CREATE TABLE order_line (ol_d_id INTEGER, ol_o_id INTEGER, ol_number INTEGER, ol_i_id INTEGER,
+			ol_quantity INTEGER, ol_amount REAL, PRIMARY KEY (ol_d_id, ol_o_id, ol_number));
+	"""
+
+
+	def __init__(self, library_path, db_path, transactions=DEFAULT_TRANSACTIONS, seed=DEFAULT_SEED, storage=None):
+		self.library_path = library_path
+		self.db_path = db_path
+		self.transactions = transactions
+		self.seed = seed
+		## pragmas and page cache state of the campaign, see storage.StoragePolicy
+		self.storage = storage
+
+
+	def run(self):
+		""" loads a fresh database, runs the transaction mix and returns a
+		measurement dict with the load and the execute time in seconds """
+		load_in_seconds = self.load_database()
+		if self.storage is not None:
+			self.storage.set_cache_state(self.db_path)
+		measurement = self.execute()
+		measurement["load_in_seconds"] = load_in_seconds
+		return measurement
+
+	def load_database(self):
+		""" creates a fresh database with the initial data and returns the
+		time the load took in seconds """
+		for path in (self.db_path, self.db_path + "-journal", self.db_path + "-wal"):
+			if os.path.exists(path):
+				os.remove(path)
+
+		library = SQLiteLibrary(self.library_path)
+		conn = library.connect(self.db_path)
+		try:
+			if self.storage is not None:
+				self.storage.apply_pragmas(conn)
+			load_start = time.perf_counter_ns()
+			self.load(conn, random.Random(self.seed))
+			return (time.perf_counter_ns() - load_start) / 1e9
+		finally:
+			conn.close()
+
+	def execute(self):
+		""" runs the transaction mix on the already loaded database and
+		returns a measurement dict with the execute time in seconds """
+		library = SQLiteLibrary(self.library_path)
+		conn = library.connect(self.db_path)
+		rnd = random.Random(self.seed + 1)
+		measurement = {}
+		measurement["driver"] = "in-process"
+		measurement["sqlite_version"] = library.version()
+		try:
+			if self.storage is not None:
+				self.storage.apply_pragmas(conn)
+			recorder = LatencyRecorder()
+			rusage_before = get_thread_rusage()
+			exec_start = time.perf_counter_ns()
+			for n in range(self.transactions):
+				txn = self.choose_transaction(rnd)
+				txn_start = time.perf_counter_ns()
+				conn.executescript("BEGIN")
+				getattr(self, "txn_" + txn.lower())(conn, rnd)
+				conn.executescript("COMMIT")
+				recorder.record(txn, time.perf_counter_ns() - txn_start)
+			duration_ns = time.perf_counter_ns() - exec_start
+			rusage_after = get_thread_rusage()
+		finally:
+			conn.close()
+
+		measurement["duration_ns"] = duration_ns
+		measurement["execute_in_seconds"] = duration_ns / 1e9
+		measurement["cost_in_seconds"] = measurement["execute_in_seconds"]
+		measurement["transactions"] = recorder.get_transactions(duration_ns)
+		measurement["tpmC"] = get_tpmc(measurement["transactions"], duration_ns)
+		measurement["rusage"] = get_rusage_delta(rusage_before, rusage_after)
+		return measurement
+
+	def choose_transaction(self, rnd):
+		pick = rnd.randint(1, 100)
+		for txn, share in InProcessDriver.TRANSACTION_MIX:
+			if pick <= share:
+				return txn
+			pick -= share
+		return InProcessDriver.TRANSACTION_MIX[-1][0]
+
+	def load(self, conn, rnd):
+		""" creates the schema and fills it with the initial data """
+		conn.executescript(InProcessDriver.SCHEMA)
+		conn.executescript("BEGIN")
+		for i_id in range(1, InProcessDriver.NUM_ITEMS + 1):
+			conn.execute("INSERT INTO item VALUES (?, ?, ?)", (i_id, rnd.uniform(1.0, 100.0), "item" + str(i_id)))
+			conn.execute("INSERT INTO stock VALUES (?, ?, 0)", (i_id, rnd.randint(10, 100)))
+		for d_id in range(1, InProcessDriver.NUM_DISTRICTS + 1):
+			conn.execute("INSERT INTO district VALUES (?, 0.0, 1)", (d_id,))
+			for c_id in range(1, InProcessDriver.NUM_CUSTOMERS_PER_DISTRICT + 1):
+				conn.execute("INSERT INTO customer VALUES (?, ?, -10.0, 1, ?)", (d_id, c_id, "x" * 200))
+		conn.executescript("COMMIT")
+
+	def txn_new_order(self, conn, rnd):
+		d_id = rnd.randint(1, InProcessDriver.NUM_DISTRICTS)
+		c_id = rnd.randint(1, InProcessDriver.NUM_CUSTOMERS_PER_DISTRICT)
+		o_id = conn.execute("SELECT d_next_o_id FROM district WHERE d_id = ?", (d_id,))[0][0]
+		conn.execute("UPDATE district SET d_next_o_id = d_next_o_id + 1 WHERE d_id = ?", (d_id,))
+		ol_cnt = rnd.randint(5, 15)
+		conn.execute("INSERT INTO orders VALUES (?, ?, ?, NULL, ?)", (d_id, o_id, c_id, ol_cnt))
+		conn.execute("INSERT INTO new_order VALUES (?, ?)", (d_id, o_id))
+		for ol_number in range(1, ol_cnt + 1):
+			i_id = rnd.randint(1, InProcessDriver.NUM_ITEMS)
+			quantity = rnd.randint(1, 10)
+			price = conn.execute("SELECT i_price FROM item WHERE i_id = ?", (i_id,))[0][0]
+			conn.execute("UPDATE stock SET s_quantity = CASE WHEN s_quantity > ? + 10 THEN s_quantity - ? "
+				"ELSE s_quantity - ? + 91 END, s_order_cnt = s_order_cnt + 1 WHERE s_i_id = ?",
+				(quantity, quantity, quantity, i_id))
+			conn.execute("INSERT INTO order_line VALUES (?, ?, ?, ?, ?, ?)",
+				(d_id, o_id, ol_number, i_id, quantity, quantity * price))
+
+	def txn_payment(self, conn, rnd):
+		d_id = rnd.randint(1, InProcessDriver.NUM_DISTRICTS)
+		c_id = rnd.randint(1, InProcessDriver.NUM_CUSTOMERS_PER_DISTRICT)
+		amount = rnd.uniform(1.0, 5000.0)
+		conn.execute("UPDATE district SET d_ytd = d_ytd + ? WHERE d_id = ?", (amount, d_id))
+		conn.execute("UPDATE customer SET c_balance = c_balance - ?, c_payment_cnt = c_payment_cnt + 1 "
+			"WHERE c_d_id = ? AND c_id = ?", (amount, d_id, c_id))
+
+	def txn_order_status(self, conn, rnd):
+		d_id = rnd.randint(1, InProcessDriver.NUM_DISTRICTS)
+		c_id = rnd.randint(1, InProcessDriver.NUM_CUSTOMERS_PER_DISTRICT)
+		conn.execute("SELECT c_balance FROM customer WHERE c_d_id = ? AND c_id = ?", (d_id, c_id))
+		last = conn.execute("SELECT MAX(o_id) FROM orders WHERE o_d_id = ? AND o_c_id = ?", (d_id, c_id))
+		if last and last[0][0] is not None:
+			conn.execute("SELECT ol_i_id, ol_quantity, ol_amount FROM order_line WHERE ol_d_id = ? AND ol_o_id = ?",
+				(d_id, last[0][0]))
+
+	def txn_delivery(self, conn, rnd):
+		carrier_id = rnd.randint(1, 10)
+		for d_id in range(1, InProcessDriver.NUM_DISTRICTS + 1):
+			oldest = conn.execute("SELECT MIN(no_o_id) FROM new_order WHERE no_d_id = ?", (d_id,))
+			if not oldest or oldest[0][0] is None:
+				continue
+			o_id = oldest[0][0]
+			conn.execute("DELETE FROM new_order WHERE no_d_id = ? AND no_o_id = ?", (d_id, o_id))
+			conn.execute("UPDATE orders SET o_carrier_id = ? WHERE o_d_id = ? AND o_id = ?", (carrier_id, d_id, o_id))
+			total = conn.execute("SELECT SUM(ol_amount) FROM order_line WHERE ol_d_id = ? AND ol_o_id = ?", (d_id, o_id))
+			c_id = conn.execute("SELECT o_c_id FROM orders WHERE o_d_id = ? AND o_id = ?", (d_id, o_id))[0][0]
+			conn.execute("UPDATE customer SET c_balance = c_balance + ? WHERE c_d_id = ? AND c_id = ?",
+				(total[0][0] or 0.0, d_id, c_id))
+
+	def txn_stock_level(self, conn, rnd):
+		d_id = rnd.randint(1, InProcessDriver.NUM_DISTRICTS)
+		threshold = rnd.randint(10, 20)
+		next_o_id = conn.execute("SELECT d_next_o_id FROM district WHERE d_id = ?", (d_id,))[0][0]
+		conn.execute("SELECT COUNT(DISTINCT s_i_id) FROM order_line, stock WHERE ol_d_id = ? AND ol_o_id >= ? "
+			"AND ol_o_id < ? AND s_i_id = ol_i_id AND s_quantity < ?", (d_id, next_o_id - 20, next_o_id, threshold))
+
+
+def help_str():
+	return "USAGE: sqlite_lib.py -l builds/<config>/libsqlite3.so [-t 2000]"
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+import os
+import ctypes
+import subprocess
+from metrics import get_thread_rusage
+
+
+## runs the pragmas of the campaign on every connection that py-tpcc opens
+## through the sqlite3 module of python, see StoragePolicy.get_env
+SITECUSTOMIZE = '''## written by storage.py, do not edit
+import os
+import sqlite3
+
+_pragmas = os.environ.get("SQLITE_BMK_PRAGMAS")
+if _pragmas:
+	_connect = sqlite3.connect
+
+	def connect(*args, **kwargs):
+		conn = _connect(*args, **kwargs)
+		conn.executescript(_pragmas)
+		return conn
+
+	sqlite3.connect = connect
+
+## this file shadows any other sitecustomize on the path, which is run as well
+import sys
+import importlib.machinery
+import importlib.util
+
+_hook_dir = os.path.dirname(os.path.abspath(__file__))
+for _path in sys.path:
+	if os.path.abspath(_path or os.curdir) == _hook_dir:
+		continue
+	_spec = importlib.machinery.PathFinder.find_spec("sitecustomize", [_path])
+	if _spec is not None:
+		_module = importlib.util.module_from_spec(_spec)
+		_spec.loader.exec_module(_module)
+		break
+'''
+
+## counts fsync and fdatasync calls of a process. It is preloaded, so that it
+## sees the calls of every libsqlite3 and sqlite3 module the process loads.
+## A process that has been started with it can read the counts of the calling
+## thread through sync_counter_get, every process appends its totals to
+## SQLITE_BMK_SYNC_FILE at exit
+SYNC_COUNTER_SOURCE = '''
+#define _GNU_SOURCE
+#include <dlfcn.h>
+#include <stdio.h>
+#include <stdlib.h>
+
+static long fsync_count = 0;
+static long fdatasync_count = 0;
+static __thread long thread_fsync_count = 0;
+static __thread long thread_fdatasync_count = 0;
+
+int fsync(int fd) {
+	static int (*real_fsync)(int) = NULL;
+	if (!real_fsync)
+		real_fsync = (int (*)(int)) dlsym(RTLD_NEXT, "fsync");
+	__atomic_add_fetch(&fsync_count, 1, __ATOMIC_RELAXED);
+	thread_fsync_count++;
+	return real_fsync(fd);
+}
+
+int fdatasync(int fd) {
+	static int (*real_fdatasync)(int) = NULL;
+	if (!real_fdatasync)
+		real_fdatasync = (int (*)(int)) dlsym(RTLD_NEXT, "fdatasync");
+	__atomic_add_fetch(&fdatasync_count, 1, __ATOMIC_RELAXED);
+	thread_fdatasync_count++;
+	return real_fdatasync(fd);
+}
+
+void sync_counter_get(long *counts) {
+	counts[0] = thread_fsync_count;
+	counts[1] = thread_fdatasync_count;
+}
+
+__attribute__((destructor)) static void sync_counter_report(void) {
+	const char *path = getenv("SQLITE_BMK_SYNC_FILE");
+	if (path && (fsync_count || fdatasync_count)) {
+		FILE *f = fopen(path, "a");
+		if (f) {
+			fprintf(f, "%ld %ld\\n", fsync_count, fdatasync_count);
+			fclose(f);
+		}
+	}
+}
+'''
+
+ENV_PRAGMAS = "SQLITE_BMK_PRAGMAS"
+ENV_SYNC_FILE = "SQLITE_BMK_SYNC_FILE"
+
+NAME_HOOK_FOLDER = 'storage-hooks'
+NAME_SYNC_COUNTER = 'sync-counter.so'
+COMPILE_SYNC_COUNTER = ["gcc", "-O2", "-shared", "-fPIC", "-o", "{output}", "{source}", "-ldl"]
+## LD_PRELOAD splits its list at these, a path that contains one cannot be preloaded
+SEPARATORS_LD_PRELOAD = ": \t"
+
+## rusage counts blocks of this size
+SIZE_RUSAGE_BLOCK = 512
+
+
+class StoragePolicy:
+	""" Where the benchmark database lives and how it is used, declared once
+	for a campaign: the folder of the database (the run folder of a config,
+	tmpfs or any given folder, e.g. on a disk mounted for benchmarking), the
+	journal_mode and synchronous pragmas, and the state of the page cache at
+	the start of a timed run. A cold run evicts the pages of the database
+	files, a warm run reads them in beforehand. Without a cache policy the
+	page cache is left as the previous cycle left it """
+	LOCATION_RUN = "run"
+	LOCATION_TMPFS = "tmpfs"
+	TMPFS_DIR = "/dev/shm"
+
+	CACHE_COLD = "cold"
+	CACHE_WARM = "warm"
+	CACHE_POLICIES = [CACHE_COLD, CACHE_WARM]
+
+	JOURNAL_MODES = ["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"]
+	SYNCHRONOUS_MODES = ["OFF", "NORMAL", "FULL", "EXTRA"]
+
+	## files a database consists of
+	DATABASE_SUFFIXES = ["", "-journal", "-wal"]
+
+	def __init__(self, location=LOCATION_RUN, journal_mode=None, synchronous=None, cache=None):
+		if journal_mode is not None and journal_mode.upper() not in StoragePolicy.JOURNAL_MODES:
+			raise ValueError("unknown journal mode " + journal_mode + ", use one of " +
+				", ".join(StoragePolicy.JOURNAL_MODES))
+		if synchronous is not None and synchronous.upper() not in StoragePolicy.SYNCHRONOUS_MODES:
+			raise ValueError("unknown synchronous mode " + synchronous + ", use one of " +
+				", ".join(StoragePolicy.SYNCHRONOUS_MODES))
+		if cache is not None and cache not in StoragePolicy.CACHE_POLICIES:
+			raise ValueError("unknown cache policy " + cache + ", use one of " + ", ".join(StoragePolicy.CACHE_POLICIES))
+		if location not in (StoragePolicy.LOCATION_RUN, StoragePolicy.LOCATION_TMPFS):
+			location = os.path.abspath(location)
+		self.location = location
+		self.journal_mode = journal_mode.upper() if journal_mode is not None else None
+		self.synchronous = synchronous.upper() if synchronous is not None else None
+		self.cache = cache
+
+
+	def get_db_dir(self, run_dir, config_name):
+		""" returns the folder the database of a config goes into """
+		if self.location == StoragePolicy.LOCATION_RUN:
+			return run_dir
+		if self.location == StoragePolicy.LOCATION_TMPFS:
+			return os.path.join(StoragePolicy.TMPFS_DIR, "sqlite-bmk-" + str(os.getuid()), config_name)
+		return os.path.join(self.location, config_name)
+
+	def get_pragmas(self):
+		""" returns the pragma statements of the policy as a script """
+		pragmas = ""
+		if self.journal_mode is not None:
+			pragmas += "PRAGMA journal_mode=" + self.journal_mode + ";"
+		if self.synchronous is not None:
+			pragmas += "PRAGMA synchronous=" + self.synchronous + ";"
+		return pragmas
+
+	def apply_pragmas(self, conn):
+		""" runs the pragmas on a fresh connection of sqlite_lib """
+		pragmas = self.get_pragmas()
+		if pragmas:
+			conn.executescript(pragmas)
+
+	def get_env(self, env, base_dir, sync_file):
+		""" adds what the policy needs to the environment of a benchmark
+		process: the pragmas and the hook that runs them on every sqlite3
+		connection of python, and the sync counter """
+		hook_dir = os.path.join(base_dir, NAME_HOOK_FOLDER)
+		env[ENV_PRAGMAS] = self.get_pragmas()
+		env[ENV_SYNC_FILE] = sync_file
+		if os.path.isfile(os.path.join(hook_dir, "sitecustomize.py")):
+			env["PYTHONPATH"] = hook_dir + os.pathsep + env.get("PYTHONPATH", "")
+		sync_counter = os.path.join(hook_dir, NAME_SYNC_COUNTER)
+		if (os.path.isfile(sync_counter) and can_preload(sync_counter) and
+				sync_counter not in env.get("LD_PRELOAD", "")):
+			env["LD_PRELOAD"] = (sync_counter + " " + env.get("LD_PRELOAD", "")).strip()
+		return env
+
+	def set_cache_state(self, db_path):
+		""" evicts the database files from the page cache or reads them in,
+		depending on the cache policy. Before evicting, all dirty pages are
+		written back, so that no write back of earlier work falls into the
+		timed run """
+		if self.cache == StoragePolicy.CACHE_COLD:
+			os.sync()
+		for suffix in StoragePolicy.DATABASE_SUFFIXES:
+			path = db_path + suffix
+			if not os.path.isfile(path):
+				continue
+			if self.cache == StoragePolicy.CACHE_COLD:
+				evict_file(path)
+			elif self.cache == StoragePolicy.CACHE_WARM:
+				warm_file(path)
+
+	def get_info(self, db_dir):
+		""" returns the storage information that is kept with a measurement """
+		info = {}
+		info["location"] = self.location
+		info["filesystem"] = get_filesystem(db_dir)
+		info["journal_mode"] = self.journal_mode or "default"
+		info["synchronous"] = self.synchronous or "default"
+		info["cache"] = self.cache or "uncontrolled"
+		return info
+
+	def print_warnings(self):
+		if self.location == StoragePolicy.LOCATION_TMPFS and self.cache == StoragePolicy.CACHE_COLD:
+			print("the pages of a database in tmpfs cannot be evicted, cold runs are warm runs there")
+
+
+class IOCounter:
+	""" Counts the syncs and the bytes written to storage between start and
+	stop by the calling thread, and the syncs of the benchmark processes
+	that report to sync_file. Other threads, e.g. the slots of parallel
+	runs, are left out; the bytes a benchmark process has written are
+	given to stop from its own rusage. The syncs of the calling thread are
+	only counted if this process has been started with the sync counter
+	preloaded, see get_preload_hint """
+
+	def __init__(self, sync_file=None):
+		self.sync_file = sync_file
+		self.own_counts = get_own_sync_counts()
+
+
+	def start(self):
+		if self.sync_file is not None and os.path.exists(self.sync_file):
+			os.remove(self.sync_file)
+		self.before = get_sync_counts_of(self.own_counts)
+		self.blocks_before = get_blocks_written()
+
+	def stop(self, child_blocks=0):
+		""" returns the counts since start, child_blocks are the blocks the
+		benchmark process has written according to its rusage """
+		after = get_sync_counts_of(self.own_counts)
+		io = {}
+		io["fsync"] = after[0] - self.before[0]
+		io["fdatasync"] = after[1] - self.before[1]
+		if self.sync_file is not None and os.path.exists(self.sync_file):
+			with open(self.sync_file) as f:
+				for line in f:
+					fsyncs, fdatasyncs = line.split()
+					io["fsync"] += int(fsyncs)
+					io["fdatasync"] += int(fdatasyncs)
+			os.remove(self.sync_file)
+		io["syncs"] = io["fsync"] + io["fdatasync"]
+		io["bytes_written"] = (get_blocks_written() - self.blocks_before + child_blocks) * SIZE_RUSAGE_BLOCK
+		io["in_process_syncs_counted"] = self.own_counts is not None
+		return io
+
+
+def sum_io(ios):
+	""" adds up the io counts of the parts of a cycle, leaving out None """
+	total = {"fsync": 0, "fdatasync": 0, "syncs": 0, "bytes_written": 0, "in_process_syncs_counted": True}
+	for io in ios:
+		if io is None:
+			continue
+		for key in ("fsync", "fdatasync", "syncs", "bytes_written"):
+			total[key] += io[key]
+		total["in_process_syncs_counted"] = total["in_process_syncs_counted"] and io["in_process_syncs_counted"]
+	return total
+
+
+def evict_file(path):
+	""" drops the clean pages of a file from the page cache """
+	fd = os.open(path, os.O_RDONLY)
+	try:
+		os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+	finally:
+		os.close(fd)
+
+
+def warm_file(path):
+	""" reads a whole file, so that it is in the page cache """
+	with open(path, 'rb', buffering=0) as f:
+		os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+		while f.read(1 << 20):
+			pass
+
+
+def get_filesystem(path):
+	""" returns the type of the filesystem path is on, e.g. tmpfs or ext4 """
+	path = os.path.realpath(path)
+	filesystem = "unknown"
+	longest = -1
+	try:
+		with open("/proc/mounts") as f:
+			for line in f:
+				fields = line.split()
+				mount_point = fields[1].replace("\\040", " ")
+				if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > longest:
+					filesystem = fields[2]
+					longest = len(mount_point)
+	except OSError:
+		pass
+	return filesystem
+
+
+def get_blocks_written():
+	""" returns the blocks the calling thread has written """
+	return get_thread_rusage().ru_oublock
+
+
+def get_own_sync_counts():
+	""" returns the function of the preloaded sync counter that reads the
+	counts of the calling thread, or None """
+	try:
+		return ctypes.CDLL(None).sync_counter_get
+	except AttributeError:
+		return None
+
+
+def get_sync_counts_of(sync_counter_get):
+	if sync_counter_get is None:
+		return (0, 0)
+	counts = (ctypes.c_long * 2)()
+	sync_counter_get(counts)
+	return (counts[0], counts[1])
+
+
+def can_preload(path):
+	return not any(separator in path for separator in SEPARATORS_LD_PRELOAD)
+
+
+def install_hooks(base_dir):
+	""" writes the pragma hook and builds the sync counter into the hook
+	folder. Returns the path of the sync counter, or None if it does not build """
+	hook_dir = os.path.join(base_dir, NAME_HOOK_FOLDER)
+	if not os.path.exists(hook_dir):
+		os.makedirs(hook_dir)
+	with open(os.path.join(hook_dir, "sitecustomize.py"), 'w') as f:
+		f.write(SITECUSTOMIZE)
+	sync_counter = os.path.join(hook_dir, NAME_SYNC_COUNTER)
+	source = os.path.join(hook_dir, "sync-counter.c")
+	## a counter built from an older source is built again
+	built_source = None
+	if os.path.isfile(sync_counter) and os.path.isfile(source):
+		with open(source) as f:
+			built_source = f.read()
+	if built_source != SYNC_COUNTER_SOURCE:
+		with open(source, 'w') as f:
+			f.write(SYNC_COUNTER_SOURCE)
+		command = [arg.format(output=sync_counter, source=source) for arg in COMPILE_SYNC_COUNTER]
+		try:
+			c_result = subprocess.call(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+		except OSError:
+			c_result = None
+		if c_result != 0:
+			print("could not build the sync counter, syncs are not counted")
+			return None
+	return sync_counter
+
+
+def get_preload_hint(sync_counter):
+	""" returns how to start the campaign so that the syncs of in-process
+	runs are counted, or None if they are counted already. The benchmark
+	processes get the sync counter through their environment, this process
+	is not restarted with it, since that would run it a second time """
+	if sync_counter is None or get_own_sync_counts() is not None:
+		return None
+	if not can_preload(sync_counter):
+		return "the sync counter " + sync_counter + " cannot be preloaded, syncs of in-process runs are not counted"
+	return "syncs of in-process runs are counted if the campaign is started with LD_PRELOAD=" + sync_counter
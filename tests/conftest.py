@@ -0,0 +1,45 @@
+import os
+import sys
+import json
+import pytest
+
+## the modules of the benchmark live in the top folder of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlite_bmk import SQLiteBenchmarker
+
+
+def fake_setup(self):
+	""" creates the sandbox and database folders without the benchmark """
+	for folder in (self.run_dir, self.db_dir):
+		os.makedirs(folder, exist_ok=True)
+
+
+def fake_cycle(self):
+	""" creates the database like a cycle would and costs one second more
+	than the number in the config name, the baseline costs one second """
+	open(self.db_path, 'w').close()
+	number = self.config_name.split("_")[-1]
+	self.current_measurement = {"cost_in_seconds": 1 + (int(number) if number.isdigit() else 0)}
+
+
+@pytest.fixture
+def fake_benchmark(monkeypatch):
+	""" replaces py-tpcc with fake_setup and fake_cycle, so that the
+	schedulers can be run without compiling sqlite """
+	monkeypatch.setattr(SQLiteBenchmarker, "setup_benchmark", fake_setup)
+	monkeypatch.setattr(SQLiteBenchmarker, "run_cycle", fake_cycle)
+
+
+@pytest.fixture
+def write_configs(tmp_path):
+	""" writes num config files with one option each, config_0.cfg ... """
+	def write(num, folder=tmp_path):
+		os.makedirs(str(folder), exist_ok=True)
+		config_files = []
+		for i in range(num):
+			config_file = os.path.join(str(folder), "config_" + str(i) + ".cfg")
+			with open(config_file, 'w') as f:
+				f.write(json.dumps({"features": {"SQLITE_OPTION_" + str(i): True}}))
+			config_files.append(config_file)
+		return config_files
+	return write
@@ -0,0 +1,80 @@
+import os
+import zipfile
+import pytest
+import artifacts
+from artifacts import ArtifactStore, ArtifactError, get_sha3_256, get_sqlite_artifact_name
+
+NAME = get_sqlite_artifact_name("3.45.3")
+
+
+@pytest.fixture
+def archive(tmp_path):
+	path = tmp_path / "sqlite-amalgamation.zip"
+	with zipfile.ZipFile(str(path), 'w') as zip_ref:
+		zip_ref.writestr("sqlite-amalgamation/sqlite3.c", "int main(void) { return 0; }\n")
+	return str(path)
+
+
+@pytest.fixture
+def downloads(monkeypatch, archive):
+	""" serves every url with the archive """
+	urls = []
+	def urlretrieve(url, path):
+		urls.append(url)
+		with open(archive, 'rb') as source, open(path, 'wb') as target:
+			target.write(source.read())
+	monkeypatch.setattr(artifacts.request, "urlretrieve", urlretrieve)
+	return urls
+
+
+def test_add_pins_the_checksum(tmp_path, archive):
+	store = ArtifactStore(str(tmp_path / "store"))
+	store.add(NAME, archive)
+	assert store.read_index()[NAME]["sha3_256"] == get_sha3_256(archive)
+	with open(archive, 'a') as f:
+		f.write("tampered")
+	with pytest.raises(ArtifactError):
+		store.add(NAME, archive)
+
+
+def test_download_without_known_sum_is_refused(tmp_path, downloads):
+	store = ArtifactStore(str(tmp_path / "store"))
+	with pytest.raises(ArtifactError, match="--allow-unverified"):
+		store.get(NAME)
+	assert downloads == []
+
+
+def test_unverified_download_is_pinned(tmp_path, archive, downloads):
+	store = ArtifactStore(str(tmp_path / "store"), allow_unverified=True)
+	path = store.get(artifacts.TPCC_ARTIFACT)
+	assert store.read_index()[artifacts.TPCC_ARTIFACT]["sha3_256"] == get_sha3_256(archive)
+	## once pinned, the archive is verified and not downloaded again
+	assert store.get(artifacts.TPCC_ARTIFACT) == path
+	assert downloads == [artifacts.URL_TPCC_ARCHIVE.format(commit=artifacts.TPCC_DEFAULT_COMMIT)]
+
+
+def test_fetch_with_url_and_sum(tmp_path, archive, downloads):
+	store = ArtifactStore(str(tmp_path / "store"))
+	url = artifacts.URL_TPCC_ARCHIVE.format(commit="0123abc")
+	with pytest.raises(ArtifactError):
+		store.fetch(artifacts.TPCC_ARTIFACT, url=url, sha3_256="f" * 64)
+	store.fetch(artifacts.TPCC_ARTIFACT, url=url, sha3_256=get_sha3_256(archive))
+	## later fetches are verified against the pinned sum
+	assert store.get(artifacts.TPCC_ARTIFACT) == os.path.join(store.store_dir, "py-tpcc.zip")
+	assert downloads == [url, url]
+
+
+def test_offline_store_does_not_download(tmp_path, downloads):
+	store = ArtifactStore(str(tmp_path / "store"), offline=True)
+	with pytest.raises(ArtifactError):
+		store.fetch(NAME, sha3_256="0" * 64)
+	assert downloads == []
+
+
+def test_extract_stamps_the_folder(tmp_path, archive):
+	store = ArtifactStore(str(tmp_path / "store"))
+	store.add(NAME, archive)
+	destination = str(tmp_path / "sqlite-source" / "3.45.3")
+	assert store.extract(NAME, destination, "sqlite3.c") == destination
+	assert os.path.isfile(os.path.join(destination, "sqlite3.c"))
+	assert artifacts.get_stamp(destination) == get_sha3_256(archive)
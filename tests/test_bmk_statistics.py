@@ -0,0 +1,26 @@
+import pytest
+from bmk_statistics import t_quantile, t_cdf, mean_confidence_interval
+
+
+## two sided 95% and 99% quantiles from the tables of Student's t distribution
+T_TABLE = [(0.975, 1, 12.706205), (0.975, 2, 4.302653), (0.975, 3, 3.182446), (0.975, 4, 2.776445),
+	(0.975, 5, 2.570582), (0.975, 10, 2.228139), (0.975, 30, 2.042272), (0.995, 3, 5.840909),
+	(0.995, 5, 4.032143), (0.95, 3, 2.353363), (0.9995, 3, 12.923979)]
+
+
+@pytest.mark.parametrize("p, df, expected", T_TABLE)
+def test_t_quantile_matches_the_table(p, df, expected):
+	assert t_quantile(p, df) == pytest.approx(expected, abs=1e-6)
+	assert t_quantile(1 - p, df) == pytest.approx(-expected, abs=1e-6)
+
+
+def test_t_cdf_inverts_t_quantile():
+	for df in (3, 7, 50):
+		assert t_cdf(t_quantile(0.9, df), df) == pytest.approx(0.9, abs=1e-12)
+	assert t_cdf(0.0, 4) == pytest.approx(0.5)
+
+
+def test_confidence_interval_of_few_cycles():
+	mean, low, high = mean_confidence_interval([1.0, 2.0, 3.0, 4.0])
+	assert mean == 2.5
+	assert high - mean == pytest.approx(3.182446 * 0.6454972, abs=1e-5)
@@ -0,0 +1,69 @@
+import os
+import json
+import sys
+import pytest
+import build_modes
+import binary_cache
+from build_modes import (parse_build_flags, get_build_mode, get_build_mode_name, BUILD_COMPILER, BUILD_OPT_LEVEL,
+	BUILD_MARCH, BUILD_LTO, BUILD_PGO, BUILD_SQLITE_VERSION)
+from sqlite_bmk import SQLiteBenchmarker
+from influence_model import load_groups_from_results_file, parse_compile_command
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("features", [
+	{},
+	{BUILD_OPT_LEVEL: "-O3", BUILD_LTO: None},
+	{BUILD_PGO: None},
+	{BUILD_COMPILER: "clang", BUILD_MARCH: "native", BUILD_PGO: None},
+], ids=["default", "lto", "pgo", "clang-pgo"])
+def test_build_options_survive_the_export(features):
+	assert parse_build_flags(SQLiteBenchmarker.get_export_string(features)) == features
+
+
+def test_pgo_is_not_mixed_up_with_its_plain_build(tmp_path):
+	plain = {"SQLITE_OMIT_JSON": None}
+	pgo = dict(plain, **{BUILD_PGO: None})
+	results = []
+	for features, cost in [(plain, 2.0), (pgo, 1.0)]:
+		build = get_build_mode(features)
+		results.append({"id": SQLiteBenchmarker.get_id_from_config(features),
+			"command": SQLiteBenchmarker.get_export_string(features),
+			"measurements": [{"cost_in_seconds": cost, "build": build}]})
+	results_file = tmp_path / "all-in-one-results.json"
+	results_file.write_text(json.dumps({"results": results}))
+	groups = load_groups_from_results_file(str(results_file))
+	assert sorted(group["features"] == pgo for group in groups) == [False, True]
+	assert [group["sum"] for group in groups if group["features"] == pgo] == [1.0]
+
+
+def test_macros_and_name_of_build_mode():
+	features = parse_compile_command(SQLiteBenchmarker.get_export_string({"SQLITE_MAX_WORKER_THREADS": 4}))
+	assert features == {"SQLITE_MAX_WORKER_THREADS": 4}
+	assert get_build_mode_name(get_build_mode({BUILD_SQLITE_VERSION: "3.45.3", BUILD_LTO: None})) == (
+		"gcc-O2-lto-sqlite-3.45.3")
+
+
+def test_training_runs_with_this_interpreter(tmp_path, monkeypatch):
+	calls = []
+	monkeypatch.setattr(build_modes.subprocess, "call", lambda command, **kwargs: calls.append(command) or 0)
+	assert build_modes.run_training("libsqlite3.so", str(tmp_path), library=True) == 0
+	assert calls[0][0] == sys.executable
+
+
+def test_default_options_build_on_any_host():
+	with open(os.path.join(ROOT, "compile-options.json")) as f:
+		build_options = json.load(f)["build-options"]
+	assert not set(build_options) & {BUILD_COMPILER, BUILD_MARCH, BUILD_LTO, BUILD_PGO}
+
+
+def test_native_binaries_are_keyed_by_host_cpu(tmp_path, monkeypatch):
+	cache = binary_cache.BinaryCache(str(tmp_path))
+	command = "gcc -O2 sqlite3.c"
+	for march, shared in [("x86-64", True), ("native", False)]:
+		features = {BUILD_MARCH: march}
+		monkeypatch.setattr(binary_cache, "get_host_cpu", lambda: {"model name": "one"})
+		key = cache.get_key(features, "3.45.3", command)
+		monkeypatch.setattr(binary_cache, "get_host_cpu", lambda: {"model name": "other"})
+		assert (cache.get_key(features, "3.45.3", command) == key) == shared
@@ -0,0 +1,79 @@
+import json
+import main
+from sqlite_bmk import SQLiteBenchmarker
+from campaign import CampaignManifest
+from results_store import ResultsStore
+from bmk_statistics import RepetitionPolicy
+
+
+def read_measurements(config_file):
+	with open(config_file) as json_data:
+		return json.load(json_data)["measurements"]
+
+
+def test_resume_counts_the_written_measurements(tmp_path, write_configs, fake_benchmark):
+	config_file = write_configs(1)[0]
+	manifest = CampaignManifest(str(tmp_path))
+	manifest.create("c1", [config_file], 3)
+	## the campaign stopped after writing the second measurement, before counting it
+	with open(config_file, 'w') as f:
+		f.write(json.dumps({"features": {"SQLITE_OPTION_0": True}, "measurements": [
+			{"cost_in_seconds": 1.0, "campaign": "older"},
+			{"cost_in_seconds": 1.0, "campaign": "c1"},
+			{"cost_in_seconds": 1.0, "campaign": "c1"}]}))
+	manifest.add_cycle("config_0")
+
+	bmk = SQLiteBenchmarker(base_dir=str(tmp_path), config_file=config_file, num_cycles=3, campaign="c1",
+		manifest=manifest)
+	bmk.run_benchmark()
+	assert [m["campaign"] for m in read_measurements(config_file)] == ["older", "c1", "c1", "c1"]
+	assert manifest.get_entry("config_0")["status"] == CampaignManifest.STATUS_BENCHMARKED
+
+
+def test_resume_counts_the_measurements_in_the_store(tmp_path, write_configs, fake_benchmark):
+	config_file = write_configs(1)[0]
+	manifest = CampaignManifest(str(tmp_path))
+	manifest.create("c1", [config_file], 3)
+	store = ResultsStore(str(tmp_path / "results.db"))
+	options = {"campaign": "c1", "manifest": manifest, "results_store": store}
+	bmk = SQLiteBenchmarker(base_dir=str(tmp_path), config_file=config_file, num_cycles=2, **options)
+	bmk.run_benchmark()
+
+	bmk = SQLiteBenchmarker(base_dir=str(tmp_path), config_file=config_file, num_cycles=3, **options)
+	bmk.run_benchmark()
+	assert len(list(store.iter_measurements(bmk.config_id, "c1"))) == 3
+
+
+def test_resume_restores_the_modes_of_the_campaign(tmp_path, monkeypatch, write_configs):
+	monkeypatch.chdir(tmp_path)
+	config_files = write_configs(2, tmp_path / "compile-configs")
+	options = {"cycles": 5, "workloads": ["point_select"], "in_process": True, "snapshot": True, "race": True,
+		"drop_fraction": 0.25, "budget": 2.0, "precheck": True, "minimize": False}
+	CampaignManifest(str(tmp_path)).create("c1", config_files, None, options)
+
+	calls = []
+	monkeypatch.setattr(SQLiteBenchmarker, "prepare_sources", lambda *args: None)
+	monkeypatch.setattr(main, "run_race", lambda *args: calls.append(args))
+	main.main(["--resume", "--no-cache", "--cycles", "1"])
+	(base_dir, config_folder, file_list, jobs, budget_hours, drop_fraction, bmk_options) = calls[0]
+	assert file_list == ["config_0.cfg", "config_1.cfg"]
+	assert (budget_hours, drop_fraction) == (2.0, 0.25)
+	assert bmk_options["campaign"] == "c1"
+	assert bmk_options["in_process"] and bmk_options["snapshot"] and bmk_options["precheck"]
+	assert not bmk_options["minimize"]
+	assert bmk_options["workloads"] == ["point_select"]
+
+
+def test_adaptive_run_leaves_out_earlier_campaigns(tmp_path, write_configs, fake_benchmark):
+	config_file = write_configs(1)[0]
+	with open(config_file, 'w') as f:
+		f.write(json.dumps({"features": {"SQLITE_OPTION_0": True},
+			"measurements": [{"cost_in_seconds": 1.0, "campaign": "older"} for i in range(5)]}))
+	bmk = SQLiteBenchmarker(base_dir=str(tmp_path), config_file=config_file, num_cycles=0, campaign="c1",
+		repetition=RepetitionPolicy(warmup=0, min_cycles=3, max_cycles=10))
+	bmk.run_benchmark()
+	measurements = read_measurements(config_file)
+	assert [m["campaign"] for m in measurements].count("c1") == 3
+	assert "outlier" not in measurements[0]
+	with open(config_file) as json_data:
+		assert json.load(json_data)["statistics"]["cycles"] == 3
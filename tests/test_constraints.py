@@ -0,0 +1,37 @@
+from constraints import ConstraintStore, is_subset, minimize_failure
+from build_modes import BUILD_SQLITE_VERSION, DEFAULT_SQLITE_VERSION
+
+
+def test_constraint_applies_to_its_sqlite_version_only():
+	constraint = {"SQLITE_OMIT_TRIGGER": None, BUILD_SQLITE_VERSION: DEFAULT_SQLITE_VERSION}
+	assert is_subset(constraint, {"SQLITE_OMIT_TRIGGER": None, "SQLITE_OMIT_JSON": None})
+	assert is_subset(constraint, {"SQLITE_OMIT_TRIGGER": None, BUILD_SQLITE_VERSION: DEFAULT_SQLITE_VERSION})
+	assert not is_subset(constraint, {"SQLITE_OMIT_TRIGGER": None, BUILD_SQLITE_VERSION: "3.45.3"})
+	newer = {"SQLITE_OMIT_TRIGGER": None, BUILD_SQLITE_VERSION: "3.45.3"}
+	assert not is_subset(newer, {"SQLITE_OMIT_TRIGGER": None})
+
+
+def test_store_keeps_the_smallest_constraints(tmp_path):
+	store = ConstraintStore(str(tmp_path))
+	wide = {"A": None, "B": 1, BUILD_SQLITE_VERSION: DEFAULT_SQLITE_VERSION}
+	narrow = {"A": None, BUILD_SQLITE_VERSION: DEFAULT_SQLITE_VERSION}
+	store.add_failure("config_1", dict(wide, C=None), 1, b"error: A and B", wide)
+	store.add_failure("config_2", dict(narrow, C=None), 1, "error: A", narrow)
+	store.add_failure("config_3", {"D": None}, 1, "error", {BUILD_SQLITE_VERSION: DEFAULT_SQLITE_VERSION})
+	data = ConstraintStore(str(tmp_path)).load()
+	assert len(data["failures"]) == 3
+	assert data["constraints"] == [narrow]
+	assert store.violates({"A": None, "E": None}) == narrow
+	assert store.violates({"A": None, BUILD_SQLITE_VERSION: "3.45.3"}) is None
+	store.clear()
+	assert ConstraintStore(str(tmp_path)).load() == {"failures": [], "constraints": []}
+
+
+def test_minimize_finds_the_failing_pair():
+	features = {option: None for option in "ABCDEFGH"}
+	compiles = []
+	def fails(subset):
+		compiles.append(subset)
+		return "C" in subset and "F" in subset
+	assert minimize_failure(features, fails, 100) == {"C": None, "F": None}
+	assert len(compiles) <= 100
@@ -0,0 +1,89 @@
+import threading
+import pytest
+import main
+from sqlite_bmk import SQLiteBenchmarker
+from results_store import ResultsStore
+from campaign import CampaignManifest
+from distributed import Coordinator, Worker, send_request
+
+
+class KilledWorker(Worker):
+	""" claims a config and dies before it sends a heartbeat or finishes """
+
+	def process(self, claim):
+		self.claimed = claim["config_name"]
+
+	def run(self):
+		reply = self.request({"op": "claim", "node": self.node})
+		self.process(reply)
+
+
+@pytest.fixture
+def fast_leases(monkeypatch, fake_benchmark):
+	monkeypatch.setattr(Coordinator, "REAP_SECONDS", 0.1)
+	monkeypatch.setattr(Coordinator, "LINGER_SECONDS", 0.5)
+	monkeypatch.setattr(Worker, "POLL_SECONDS", 0.1)
+	monkeypatch.setattr(Worker, "prepare_sources", lambda self, config_file: None)
+	monkeypatch.setattr(SQLiteBenchmarker, "compile", lambda self: SQLiteBenchmarker.EXIT_SUCCESS)
+
+
+def start_coordinator(coordinator):
+	outcome = {}
+	thread = threading.Thread(target=lambda: outcome.update(coordinator.run()))
+	thread.start()
+	assert coordinator.listening.wait(10)
+	return thread, outcome
+
+
+def test_config_of_a_killed_worker_is_queued_again(tmp_path, write_configs, fast_leases):
+	config_files = write_configs(3, tmp_path / "configs")
+	store = ResultsStore(str(tmp_path / "results.db"))
+	manifest = CampaignManifest(str(tmp_path))
+	manifest.create("c1", config_files, 2)
+	coordinator = Coordinator(str(tmp_path), config_files, 2, store, "c1", manifest=manifest,
+		address=("localhost", 0), lease_seconds=1.0, token="secret")
+	thread, outcome = start_coordinator(coordinator)
+
+	killed = KilledWorker(str(tmp_path / "killed"), coordinator.address, "killed", token="secret")
+	killed.run()
+	workers = [Worker(str(tmp_path / name), coordinator.address, name, token="secret") for name in ("w1", "w2")]
+	worker_threads = [threading.Thread(target=worker.run) for worker in workers]
+	for worker_thread in worker_threads:
+		worker_thread.start()
+	for worker_thread in worker_threads + [thread]:
+		worker_thread.join(60)
+
+	assert outcome == {Coordinator.STATUS_DONE: 3}
+	entry = coordinator.queue[killed.claimed]
+	assert entry["attempts"] == 2
+	assert entry["nodes"][0] == "killed"
+	assert entry["nodes"][1] in ("w1", "w2")
+	for config_file in config_files:
+		config_name = SQLiteBenchmarker.get_config_name(config_file)
+		assert manifest.get_entry(config_name)["status"] == CampaignManifest.STATUS_BENCHMARKED
+	config_ids = [config["config_id"] for config in store.iter_configs()]
+	assert sorted(len(list(store.iter_measurements(config_id, "c1"))) for config_id in config_ids) == [2, 2, 2]
+
+
+def test_requests_without_the_token_are_refused(tmp_path, write_configs, fast_leases):
+	config_files = write_configs(1, tmp_path / "configs")
+	coordinator = Coordinator(str(tmp_path), config_files, 1, ResultsStore(str(tmp_path / "results.db")), "c1",
+		address=("localhost", 0), token="secret")
+	thread, outcome = start_coordinator(coordinator)
+	try:
+		assert send_request(coordinator.address, {"op": "claim", "node": "intruder"}, 10) == {
+			"ok": False, "error": "wrong token"}
+		assert Worker(str(tmp_path / "w"), coordinator.address, "w", token="wrong").run() == 0
+		assert coordinator.queue["config_0"]["attempts"] == 0
+	finally:
+		Worker(str(tmp_path / "w"), coordinator.address, "w", token="secret").run()
+		thread.join(60)
+	assert outcome == {Coordinator.STATUS_DONE: 1}
+
+
+def test_serving_beyond_localhost_needs_a_token(tmp_path, monkeypatch, capsys):
+	monkeypatch.chdir(tmp_path)
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["-r", "2", "--serve", "0.0.0.0:7733"])
+	assert exit_info.value.code == 2
+	assert "--token-file" in capsys.readouterr().out
@@ -0,0 +1,36 @@
+import json
+import pytest
+from exporters import (write_json_results, write_json_results_in_memory, write_xml_results,
+	write_xml_results_in_memory, get_synthetic_results, get_synthetic_measurement)
+
+
+def get_odd_results():
+	""" results with quotes in id and command, empty latencies and a
+	config without measurements """
+	measurement = get_synthetic_measurement(0)
+	measurement["transactions"]["PAYMENT"]["latency_ns"] = {}
+	measurement["workloads"] = {"point_select": {"ops": 10, "latency_ns": {}, "rusage": {}}}
+	yield {"id": '%;%SQLITE_DEFAULT_FILE_FORMAT="4" & <x>%;%', "command": 'gcc -DNAME="a b" sqlite3.c',
+		"statistics": {"cycles": 1}, "measurements": iter([measurement])}
+	yield {"id": "%;%%;%", "command": "gcc sqlite3.c", "ab": {}, "measurements": iter([])}
+
+
+@pytest.mark.parametrize("get_results", [lambda: [], lambda: get_synthetic_results(3, 2), get_odd_results],
+	ids=["empty", "synthetic", "odd"])
+def test_streaming_xml_matches_in_memory(tmp_path, get_results):
+	streaming = tmp_path / "streaming.xml"
+	in_memory = tmp_path / "in-memory.xml"
+	write_xml_results(str(streaming), get_results())
+	write_xml_results_in_memory(str(in_memory), get_results())
+	assert streaming.read_bytes() == in_memory.read_bytes()
+
+
+@pytest.mark.parametrize("get_results", [lambda: [], lambda: get_synthetic_results(3, 2), get_odd_results],
+	ids=["empty", "synthetic", "odd"])
+def test_streaming_json_matches_in_memory(tmp_path, get_results):
+	streaming = tmp_path / "streaming.json"
+	in_memory = tmp_path / "in-memory.json"
+	write_json_results(str(streaming), get_results())
+	write_json_results_in_memory(str(in_memory), get_results())
+	assert streaming.read_bytes() == in_memory.read_bytes()
+	assert len(json.loads(streaming.read_text())["results"]) == len(list(get_results()))
@@ -0,0 +1,37 @@
+import json
+import multiprocessing
+import pytest
+from locked_json import LockedJsonFile
+
+
+def locked_counter(tmp_path):
+	return LockedJsonFile(str(tmp_path / "counter.json"), str(tmp_path / "counter.lock"), lambda: {"count": 0})
+
+
+def increment(tmp_path, times):
+	for i in range(times):
+		with locked_counter(tmp_path) as data:
+			data["count"] += 1
+
+
+def test_updates_of_several_processes_are_not_lost(tmp_path):
+	context = multiprocessing.get_context("fork")
+	workers = [context.Process(target=increment, args=(tmp_path, 50)) for i in range(4)]
+	for worker in workers:
+		worker.start()
+	for worker in workers:
+		worker.join()
+	assert json.loads((tmp_path / "counter.json").read_text()) == {"count": 200}
+
+
+def test_nothing_is_written_when_the_block_raises_or_only_reads(tmp_path):
+	increment(tmp_path, 1)
+	with pytest.raises(RuntimeError):
+		with locked_counter(tmp_path) as data:
+			data["count"] = 100
+			raise RuntimeError("half done")
+	with LockedJsonFile(str(tmp_path / "counter.json"), str(tmp_path / "counter.lock"), dict, write=False) as data:
+		data["count"] = 100
+	with locked_counter(tmp_path) as data:
+		assert data == {"count": 1}
+	assert not (tmp_path / "counter.json.tmp").exists()
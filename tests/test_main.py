@@ -0,0 +1,77 @@
+import re
+import inspect
+import pytest
+import main
+
+
+def test_in_process_runs_cannot_run_in_parallel(tmp_path, monkeypatch, capsys):
+	monkeypatch.chdir(tmp_path)
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["-r", "2", "--in-process", "--parallel-runs", "2"])
+	assert exit_info.value.code == 2
+	assert "--parallel-runs" in capsys.readouterr().out
+
+
+def test_unknown_workload_prints_usage(tmp_path, monkeypatch, capsys):
+	monkeypatch.chdir(tmp_path)
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["-r", "2", "--workloads", "tpcc,nosuchload"])
+	assert exit_info.value.code == 2
+	out = capsys.readouterr().out
+	assert "unknown workload nosuchload" in out
+	assert "USAGE" in out
+
+
+def test_unknown_ab_order_is_rejected(tmp_path, monkeypatch, capsys):
+	monkeypatch.chdir(tmp_path)
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["-r", "2", "--ab", "--ab-order", "sideways"])
+	assert exit_info.value.code == 2
+	assert "unknown A/B order sideways" in capsys.readouterr().out
+
+
+def test_help_documents_every_option(capsys):
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["--help"])
+	assert exit_info.value.code == 0
+	out = capsys.readouterr().out
+	source = inspect.getsource(main.main)
+	long_options = re.search(r"getopt\.getopt\(argv,\s*\"[^\"]*\",\s*\[([^\]]*)\]", source).group(1)
+	for option in re.findall(r"\"([a-z0-9-]+)=?\"", long_options):
+		assert "--" + option in out
+
+
+def test_unknown_option_prints_usage(tmp_path, monkeypatch, capsys):
+	monkeypatch.chdir(tmp_path)
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["--no-such-option"])
+	assert exit_info.value.code == 2
+	out = capsys.readouterr().out
+	assert "option --no-such-option not recognized" in out
+	assert out.splitlines()[1].startswith("USAGE: main.py")
+
+
+def test_without_options_prints_usage(tmp_path, monkeypatch, capsys):
+	monkeypatch.chdir(tmp_path)
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["--cycles", "2"])
+	assert exit_info.value.code == 2
+	assert capsys.readouterr().out.startswith("USAGE: main.py")
+
+
+@pytest.mark.parametrize("flags", [["--optimize", "--budget", "1", "--serve", "7733"], ["--ab", "--race"],
+	["--pipeline", "--parallel-runs", "2"]])
+def test_conflicting_modes_are_rejected(tmp_path, monkeypatch, capsys, flags):
+	monkeypatch.chdir(tmp_path)
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["-r", "2"] + flags)
+	assert exit_info.value.code == 2
+	assert "cannot be combined" in capsys.readouterr().out
+
+
+def test_micro_workloads_cannot_run_in_parallel(tmp_path, monkeypatch, capsys):
+	monkeypatch.chdir(tmp_path)
+	with pytest.raises(SystemExit) as exit_info:
+		main.main(["-r", "2", "--workloads", "tpcc,micro", "--parallel-runs", "2"])
+	assert exit_info.value.code == 2
+	assert "micro-workloads" in capsys.readouterr().out
@@ -0,0 +1,65 @@
+import resource
+import threading
+import pytest
+from metrics import summarize_latencies, get_percentile, get_histogram, parse_tpcc_output, parse_tpcc_duration_ns
+from metrics import get_rusage_delta, get_thread_rusage
+
+
+def test_nearest_rank_percentiles():
+	ordered = list(range(1, 101))
+	assert get_percentile(ordered, 50) == 50
+	assert get_percentile(ordered, 95) == 95
+	assert get_percentile(ordered, 99) == 99
+	assert get_percentile(ordered, 100) == 100
+	assert get_percentile([7], 50) == 7
+	## ranks of .5 are rounded up, not to the even neighbour
+	assert get_percentile([1, 2, 3, 4, 5], 50) == 3
+	assert get_percentile(list(range(1, 11)), 95) == 10
+
+
+def test_summary_of_latencies():
+	summary = summarize_latencies([300, 100, 200, 400])
+	assert summary["mean"] == 250
+	assert summary["min"] == 100
+	assert summary["max"] == 400
+	assert summary["p50"] == 200
+	assert summary["p95"] == 400
+	assert summary["p99"] == 400
+	assert summary["histogram"] == {"128": 1, "256": 1, "512": 2}
+	assert summarize_latencies([]) == {}
+
+
+def test_histogram_buckets_are_inclusive_powers_of_two():
+	assert get_histogram([0, 1, 2, 3, 4, 5, 1024, 1025]) == {"1": 2, "2": 1, "4": 2, "8": 1, "1024": 1, "2048": 1}
+	assert sum(get_histogram(range(1000)).values()) == 1000
+
+
+def test_tpcc_result_table():
+	out = (b"Execution Results after 60.5 seconds\n"
+		b"------------------------------------------------------------------\n"
+		b"                  Executed        Time (\xc2\xb5s)       Rate\n"
+		b"  DELIVERY        10              2000.0          0.17 txn/s\n"
+		b"  NEW_ORDER       0               0.0             0.0 txn/s\n"
+		b"  TOTAL           10              2000.0          0.17 txn/s\n")
+	transactions = parse_tpcc_output(out)
+	assert sorted(transactions) == ["DELIVERY", "NEW_ORDER"]
+	assert transactions["DELIVERY"]["count"] == 10
+	assert transactions["DELIVERY"]["latency_ns"]["mean"] == 200000.0
+	assert transactions["NEW_ORDER"]["latency_ns"] == {}
+	assert parse_tpcc_duration_ns(out) == 60500000000
+	assert parse_tpcc_duration_ns("no table") is None
+
+
+@pytest.mark.skipif(not hasattr(resource, "RUSAGE_THREAD"), reason="threads are not accounted on their own")
+def test_rusage_of_a_thread_leaves_out_other_threads():
+	busy_usage = {}
+	def busy():
+		start = get_thread_rusage()
+		sum(range(10000000))
+		busy_usage.update(get_rusage_delta(start, get_thread_rusage()))
+	before = get_thread_rusage()
+	thread = threading.Thread(target=busy)
+	thread.start()
+	thread.join()
+	own_usage = get_rusage_delta(before, get_thread_rusage())
+	assert own_usage["user_time"] < busy_usage["user_time"] / 2
@@ -0,0 +1,104 @@
+import json
+import sqlite3
+import threading
+from results_store import ResultsStore
+from sqlite_bmk import SQLiteBenchmarker
+
+
+def add_measurements(store, config_id, campaign, costs):
+	for cost in costs:
+		store.append_measurement(config_id, campaign, {"cost_in_seconds": cost, "campaign": campaign}, cost)
+
+
+def test_config_info_is_kept_per_campaign(tmp_path):
+	store = ResultsStore(str(tmp_path / "results.db"))
+	store.add_config("a", "config_a", {"X": None}, "gcc -DX")
+	add_measurements(store, "a", "c1", [1.0])
+	add_measurements(store, "a", "c2", [2.0])
+	store.set_config_info("a", "c1", "statistics", {"mean": 1.0})
+	store.set_config_info("a", "c2", "statistics", {"mean": 2.0})
+	store.set_config_info("a", "c2", "statistics", {"mean": 2.5})
+	assert store.get_config_info("a", "c1") == {"statistics": {"mean": 1.0}}
+	assert store.get_config_info("a", "c2") == {"statistics": {"mean": 2.5}}
+	assert store.get_config_info("a") == {"statistics": {"mean": 2.5}}
+	results = {result["id"]: result for result in store.iter_results("c1")}
+	assert results["a"]["statistics"] == {"mean": 1.0}
+	assert [m["cost_in_seconds"] for m in results["a"]["measurements"]] == [1.0]
+
+
+def test_config_info_of_older_stores_is_migrated(tmp_path):
+	path = str(tmp_path / "results.db")
+	conn = sqlite3.connect(path)
+	conn.execute("CREATE TABLE config_info (config_id TEXT, key TEXT, value TEXT, PRIMARY KEY (config_id, key))")
+	conn.execute("INSERT INTO config_info VALUES ('a', 'racing', '{\"round\": 2}')")
+	conn.commit()
+	conn.close()
+	store = ResultsStore(path)
+	assert store.get_config_info("a") == {"racing": {"round": 2}}
+	assert store.get_config_info("a", "") == {"racing": {"round": 2}}
+
+
+def test_store_can_be_used_while_iterating(tmp_path, monkeypatch):
+	monkeypatch.setattr(ResultsStore, "SIZE_FETCH_BATCH", 2)
+	store = ResultsStore(str(tmp_path / "results.db"))
+	add_measurements(store, "a", "c1", [1.0, 2.0, 3.0])
+	seen = []
+	for measurement in store.iter_measurements("a", "c1"):
+		seen.append(measurement["cost_in_seconds"])
+		store.count_measurements("a")
+	assert seen == [1.0, 2.0, 3.0]
+
+
+def test_threads_share_the_store(tmp_path):
+	store = ResultsStore(str(tmp_path / "results.db"))
+	errors = []
+	def write(config_id):
+		try:
+			add_measurements(store, config_id, "c1", [1.0] * 50)
+		except Exception as err:
+			errors.append(err)
+	def read():
+		try:
+			for i in range(20):
+				list(store.iter_costs("c1"))
+		except Exception as err:
+			errors.append(err)
+	threads = [threading.Thread(target=write, args=(name,)) for name in "abc"] + [threading.Thread(target=read)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert errors == []
+	assert sum(1 for cost in store.iter_costs("c1")) == 150
+
+
+def test_measurements_are_not_doubled_on_resume(tmp_path, write_configs):
+	config_file = write_configs(1)[0]
+	store = ResultsStore(str(tmp_path / "results.db"))
+	bmk = SQLiteBenchmarker(base_dir=str(tmp_path), config_file=config_file, num_cycles=1, results_store=store,
+		campaign="c1")
+	measurement = {"cost_in_seconds": 1.0, "campaign": "c1"}
+	with open(config_file, 'w') as f:
+		f.write(json.dumps({"features": bmk.config["features"], "measurements": [measurement]}))
+	store.append_measurement(bmk.config_id, "c1", measurement, 1.0)
+
+	bmk = SQLiteBenchmarker(base_dir=str(tmp_path), config_file=config_file, num_cycles=1, results_store=store,
+		campaign="c1")
+	bmk.setup_benchmark = lambda: None
+	bmk.start_benchmark()
+	assert bmk.measurements == [measurement]
+
+
+def test_configs_are_content_addressed_everywhere(tmp_path, write_configs, fake_benchmark):
+	from config_creator import ConfigCreator
+	config_files = write_configs(2, tmp_path / "compile-configs")
+	store = ResultsStore(str(tmp_path / "results.db"))
+	bmk = SQLiteBenchmarker(base_dir=str(tmp_path), config_file=config_files[0], num_cycles=1, results_store=store,
+		campaign="c1")
+	bmk.run_benchmark()
+	features = {"SQLITE_OPTION_0": True}
+	assert bmk.config_id == ConfigCreator.get_config_id(features) == SQLiteBenchmarker.get_id_from_config(
+		dict(reversed(list(features.items()))))
+	assert len(bmk.config_id) == 64
+	assert [result["id"] for result in store.iter_results("c1")] == [bmk.config_id]
+	assert ConfigCreator.get_unmeasured_config_files(str(tmp_path), store) == ["config_1.cfg"]
@@ -0,0 +1,85 @@
+import os
+import json
+import pytest
+from sqlite_bmk import SQLiteBenchmarker
+from scheduler import PipelineScheduler, RacingScheduler, ABScheduler
+from storage import StoragePolicy
+
+
+@pytest.fixture
+def external_storage(tmp_path, fake_benchmark):
+	return StoragePolicy(location=str(tmp_path / "mnt"))
+
+
+def test_run_benchmark_removes_storage_when_a_cycle_fails(tmp_path, monkeypatch, write_configs, external_storage):
+	run_cycle = SQLiteBenchmarker.run_cycle
+	def failing_cycle(self):
+		run_cycle(self)
+		raise RuntimeError("cycle failed")
+	monkeypatch.setattr(SQLiteBenchmarker, "run_cycle", failing_cycle)
+	config_file = write_configs(1)[0]
+	bmk = SQLiteBenchmarker(base_dir=str(tmp_path), config_file=config_file, num_cycles=2, storage=external_storage)
+	with pytest.raises(RuntimeError):
+		bmk.run_benchmark()
+	assert not os.path.exists(bmk.db_dir)
+
+
+def test_racing_removes_storage_of_all_configs(tmp_path, write_configs, external_storage):
+	config_files = write_configs(3)
+	scheduler = RacingScheduler(str(tmp_path), config_files, bmk_options={"storage": external_storage})
+	rounds = scheduler.run()
+	assert rounds[0]["eliminated"] == ["config_2.cfg"]
+	assert os.listdir(str(tmp_path / "mnt")) == []
+
+
+def test_ab_removes_storage_of_baseline_and_candidates(tmp_path, monkeypatch, write_configs, external_storage):
+	monkeypatch.setattr(SQLiteBenchmarker, "compile", lambda self: SQLiteBenchmarker.EXIT_SUCCESS)
+	config_files = write_configs(2)
+	scheduler = ABScheduler(str(tmp_path), config_files, num_pairs=2, seed=1,
+		bmk_options={"storage": external_storage})
+	results = scheduler.run()
+	assert sorted(results) == sorted(config_files)
+	assert os.listdir(str(tmp_path / "mnt")) == []
+
+
+def test_ab_keeps_the_baseline_side_with_each_candidate(tmp_path, monkeypatch, write_configs, fake_benchmark):
+	monkeypatch.setattr(SQLiteBenchmarker, "compile", lambda self: SQLiteBenchmarker.EXIT_SUCCESS)
+	config_files = write_configs(2)
+	for run in range(2):
+		ABScheduler(str(tmp_path), config_files, num_pairs=2, seed=1).run()
+	with open(str(tmp_path / ABScheduler.NAME_BASELINE_FILE)) as f:
+		assert "measurements" not in json.load(f)
+	with open(config_files[1]) as f:
+		measurements = json.load(f)["measurements"]
+	assert len(measurements) == 4
+	assert all(m["ab"]["baseline"]["cost_in_seconds"] == 1 for m in measurements)
+
+
+def test_schedulers_do_not_share_default_options(tmp_path):
+	first = RacingScheduler(str(tmp_path), [])
+	first.bmk_options["storage"] = None
+	assert RacingScheduler(str(tmp_path), []).bmk_options == {}
+	assert ABScheduler(str(tmp_path), [], num_pairs=1).bmk_options == {}
+
+
+@pytest.mark.skipif(len(os.sched_getaffinity(0)) < 2, reason="needs at least two cpus")
+def test_pipeline_compiles_and_benchmarks_on_disjoint_cpus(tmp_path, monkeypatch, write_configs, fake_benchmark):
+	affinity_file = tmp_path / "compile-cpus.json"
+	def compile(self):
+		affinity_file.write_text(json.dumps(sorted(os.sched_getaffinity(0))))
+		return SQLiteBenchmarker.EXIT_SUCCESS
+	benchmark_cpus = []
+	def run_cycle(self):
+		benchmark_cpus.append(sorted(os.sched_getaffinity(0)))
+		self.current_measurement = {"cost_in_seconds": 1}
+	monkeypatch.setattr(SQLiteBenchmarker, "compile", compile)
+	monkeypatch.setattr(SQLiteBenchmarker, "run_cycle", run_cycle)
+	own_cpus = os.sched_getaffinity(0)
+	scheduler = PipelineScheduler(str(tmp_path), write_configs(2), 1, jobs=1)
+	report = scheduler.run()
+	assert report["benchmarked"] == 2
+	compile_cpus = set(json.loads(affinity_file.read_text()))
+	assert compile_cpus == scheduler.compile_cpus
+	assert all(set(cpus) == scheduler.benchmark_cpus for cpus in benchmark_cpus)
+	assert not compile_cpus & scheduler.benchmark_cpus
+	assert os.sched_getaffinity(0) == own_cpus
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import pytest
+from sqlite_bmk import SQLiteBenchmarker, BenchmarkError
+from campaign import CampaignManifest
+
+TPCC_OUTPUT = (b"Execution Results after 2.5 seconds\n"
+	b"------------------------------------------------------------------\n"
+	b"                  Executed        Time (\xc2\xb5s)       Rate\n"
+	b"  DELIVERY        10              2000.0          4.0 txn/s\n"
+	b"  TOTAL           10              2000.0          4.0 txn/s\n")
+
+
+def get_benchmarker(tmp_path, features=None, **options):
+	config_file = tmp_path / "config.cfg"
+	config_file.write_text(json.dumps({"features": features if features is not None else {}}))
+	return SQLiteBenchmarker(base_dir=str(tmp_path), config_file=str(config_file), num_cycles=1, **options)
+
+
+def test_run_env_puts_build_first_on_path(tmp_path):
+	env = get_benchmarker(tmp_path).get_run_env()
+	assert env["PATH"].split(os.pathsep)[0] == str(tmp_path / "builds" / "config")
+	assert "SQLITE3_BINARY" not in env
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"),
+	reason="cpu affinity is not supported")
+def test_benchmark_process_is_pinned(tmp_path):
+	cpu = min(os.sched_getaffinity(0))
+	bmk = get_benchmarker(tmp_path, cpus={cpu})
+	bmk.bm_exec_path = str(tmp_path)
+	code = "import os, time; time.sleep(0.5); print(sorted(os.sched_getaffinity(0)))"
+	(out, ru, duration_ns, returncode) = bmk.run_process([sys.executable, "-c", code], os.environ.copy())
+	assert out.decode().strip() == str([cpu])
+	assert returncode == 0
+	assert duration_ns > 0
+	assert ru.ru_utime >= 0
+
+
+def test_failed_load_aborts_the_config(tmp_path, monkeypatch):
+	bmk = get_benchmarker(tmp_path, snapshot=True, manifest=CampaignManifest(str(tmp_path)))
+	bmk.bm_exec_path = str(tmp_path)
+	monkeypatch.setattr(bmk, "get_benchmark_command", lambda phase=None: [sys.executable, "-c", "raise SystemExit(3)"])
+	with pytest.raises(BenchmarkError):
+		bmk.create_snapshot(os.environ.copy())
+
+	def failing_setup():
+		bmk.create_snapshot(os.environ.copy())
+	monkeypatch.setattr(bmk, "setup_benchmark", failing_setup)
+	assert bmk.run_benchmark() == SQLiteBenchmarker.EXIT_ERROR
+	entry = bmk.manifest.get_entry("config")
+	assert entry["status"] == CampaignManifest.STATUS_FAILED
+	assert bmk.measurements == []
+
+
+def test_snapshot_cycle_costs_the_execute_phase(tmp_path, monkeypatch):
+	bmk = get_benchmarker(tmp_path, snapshot=True)
+	bmk.benchmark_command = None
+	bmk.env = None
+	bmk.load_in_seconds = 1.0
+	monkeypatch.setattr(bmk, "run_process", lambda command, env: (TPCC_OUTPUT, None, 4000000000, 0))
+	monkeypatch.setattr("sqlite_bmk.get_rusage_dict", lambda ru: {})
+	monkeypatch.setattr("sqlite_bmk.perf_usable", lambda: False)
+	measurement = bmk.run_process_cycle()
+	assert measurement["duration_ns"] == 2500000000
+	assert measurement["cost_in_seconds"] == 2.5
+	assert measurement["process_ns"] == 4000000000
+
+
+class SkippingSuite:
+	def run(self):
+		return {"point-lookup": {"operations": 10, "duration_ns": 1000}, "rtree": {"skipped": "no such module: rtree"}}
+
+
+def test_skipped_workload_fails_the_config(tmp_path, monkeypatch):
+	bmk = get_benchmarker(tmp_path, workloads=["point-lookup", "rtree"], manifest=CampaignManifest(str(tmp_path)))
+	def setup():
+		bmk.suite = SkippingSuite()
+	monkeypatch.setattr(bmk, "setup_benchmark", setup)
+	setup()
+	bmk.current_measurement = {}
+	with pytest.raises(BenchmarkError):
+		bmk.add_workload_metrics()
+	assert bmk.run_benchmark() == SQLiteBenchmarker.EXIT_ERROR
+	assert bmk.manifest.get_entry("config")["status"] == CampaignManifest.STATUS_FAILED
+	assert bmk.measurements == []
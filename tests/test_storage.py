@@ -0,0 +1,122 @@
+import os
+import sys
+import shutil
+import subprocess
+import pytest
+import storage
+from storage import StoragePolicy, IOCounter, install_hooks, sum_io
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+needs_gcc = pytest.mark.skipif(shutil.which("gcc") is None, reason="gcc is needed to build the sync counter")
+
+
+def test_pragmas_of_policy():
+	policy = StoragePolicy(journal_mode="wal", synchronous="full")
+	assert policy.get_pragmas() == "PRAGMA journal_mode=WAL;PRAGMA synchronous=FULL;"
+	assert StoragePolicy().get_pragmas() == ""
+
+
+def test_unknown_settings_are_rejected():
+	with pytest.raises(ValueError):
+		StoragePolicy(journal_mode="sideways")
+	with pytest.raises(ValueError):
+		StoragePolicy(synchronous="sometimes")
+	with pytest.raises(ValueError):
+		StoragePolicy(cache="lukewarm")
+
+
+def test_db_dir_of_locations(tmp_path):
+	run_dir = str(tmp_path / "runs" / "config_a")
+	assert StoragePolicy().get_db_dir(run_dir, "config_a") == run_dir
+	assert StoragePolicy(location=str(tmp_path / "mnt")).get_db_dir(run_dir, "config_a") == str(
+		tmp_path / "mnt" / "config_a")
+	assert StoragePolicy(location="tmpfs").get_db_dir(run_dir, "config_a").startswith(StoragePolicy.TMPFS_DIR)
+
+
+def test_cache_states_leave_files_intact(tmp_path):
+	db_path = tmp_path / "bench.db"
+	db_path.write_bytes(b"x" * 10000)
+	StoragePolicy(cache="cold").set_cache_state(str(db_path))
+	StoragePolicy(cache="warm").set_cache_state(str(db_path))
+	assert db_path.read_bytes() == b"x" * 10000
+
+
+def test_sum_io_leaves_out_missing_parts():
+	io = {"fsync": 1, "fdatasync": 2, "syncs": 3, "bytes_written": 4096, "in_process_syncs_counted": False}
+	total = sum_io([None, io, io])
+	assert total["syncs"] == 6
+	assert total["bytes_written"] == 8192
+	assert not total["in_process_syncs_counted"]
+
+
+@needs_gcc
+def test_syncs_of_child_processes_are_counted(tmp_path):
+	base_dir = str(tmp_path)
+	install_hooks(base_dir)
+	sync_file = str(tmp_path / "syncs.txt")
+	env = StoragePolicy(journal_mode="wal", synchronous="full").get_env(os.environ.copy(), base_dir, sync_file)
+	db_path = str(tmp_path / "child.db")
+	code = ("import sqlite3; c = sqlite3.connect(" + repr(db_path) + "); "
+		"print(c.execute('pragma journal_mode').fetchone()[0]); "
+		"c.execute('create table t (x)'); c.execute('insert into t values (1)'); c.commit()")
+	counter = IOCounter(sync_file)
+	counter.start()
+	out = subprocess.check_output([sys.executable, "-c", code], env=env)
+	io = counter.stop()
+	assert out.strip() == b"wal"
+	assert io["syncs"] > 0
+
+
+@needs_gcc
+def test_hooks_build_in_folder_with_space(tmp_path):
+	base_dir = tmp_path / "with space"
+	base_dir.mkdir()
+	assert install_hooks(str(base_dir)) is not None
+
+
+def test_child_blocks_are_added():
+	counter = IOCounter()
+	counter.start()
+	io = counter.stop(child_blocks=2)
+	assert io["bytes_written"] >= 2 * storage.SIZE_RUSAGE_BLOCK
+
+
+@needs_gcc
+def test_preloaded_counter_counts_calling_thread(tmp_path):
+	sync_counter = install_hooks(str(tmp_path))
+	code = ("import os, threading, storage\n"
+		"counter = storage.IOCounter()\n"
+		"counter.start()\n"
+		"fd = os.open(" + repr(str(tmp_path / "f")) + ", os.O_CREAT | os.O_WRONLY)\n"
+		"os.fsync(fd)\n"
+		"thread = threading.Thread(target=os.fsync, args=(fd,))\n"
+		"thread.start()\n"
+		"thread.join()\n"
+		"io = counter.stop()\n"
+		"print(io['fsync'], io['in_process_syncs_counted'])\n")
+	env = dict(os.environ, PYTHONPATH=ROOT, LD_PRELOAD=sync_counter)
+	out = subprocess.check_output([sys.executable, "-c", code], env=env, timeout=60).decode()
+	assert out.split() == ["1", "True"]
+
+
+@needs_gcc
+def test_preload_hint_without_preload(tmp_path):
+	sync_counter = install_hooks(str(tmp_path))
+	hint = storage.get_preload_hint(sync_counter)
+	if storage.get_own_sync_counts() is None:
+		assert "LD_PRELOAD=" + sync_counter in hint
+	else:
+		assert hint is None
+
+
+def test_other_sitecustomize_still_runs(tmp_path):
+	hook_dir = tmp_path / "hooks"
+	hook_dir.mkdir()
+	(hook_dir / "sitecustomize.py").write_text(storage.SITECUSTOMIZE)
+	other_dir = tmp_path / "other"
+	other_dir.mkdir()
+	(other_dir / "sitecustomize.py").write_text("import builtins\nbuiltins.other_sitecustomize = True\n")
+	env = dict(os.environ, PYTHONPATH=str(hook_dir) + os.pathsep + str(other_dir))
+	out = subprocess.check_output([sys.executable, "-c", "print(other_sitecustomize)"], env=env, timeout=60)
+	assert out.strip() == b"True"
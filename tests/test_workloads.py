@@ -0,0 +1,40 @@
+import random
+import ctypes.util
+import pytest
+from sqlite_lib import SQLiteLibrary
+from workloads import Workload, WorkloadSuite, FsyncWorkload
+from metrics import LatencyRecorder
+
+LIBRARY_PATH = ctypes.util.find_library("sqlite3")
+
+
+class BrokenWorkload(Workload):
+	NAME = "broken"
+
+	def run(self, conn, rnd, recorder):
+		conn.execute("SELECT * FROM missing_table")
+		return {"operations": 1}
+
+
+@pytest.mark.skipif(LIBRARY_PATH is None, reason="there is no sqlite library to load")
+def test_failing_workload_is_reported(tmp_path):
+	suite = WorkloadSuite(LIBRARY_PATH, str(tmp_path), [])
+	metrics = suite.run_workload(SQLiteLibrary(LIBRARY_PATH), BrokenWorkload())
+	assert "missing_table" in metrics["failed"]
+	assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.skipif(LIBRARY_PATH is None, reason="there is no sqlite library to load")
+@pytest.mark.parametrize("journal_mode, expected", [(None, "wal"), ("TRUNCATE", "truncate")])
+def test_fsync_workload_keeps_a_declared_journal_mode(tmp_path, journal_mode, expected):
+	conn = SQLiteLibrary(LIBRARY_PATH).connect(str(tmp_path / "fsync.db"))
+	try:
+		if journal_mode is not None:
+			conn.executescript("PRAGMA journal_mode=" + journal_mode)
+		workload = FsyncWorkload(scale=0.01, journal_mode=journal_mode)
+		workload.setup(conn, random.Random(1))
+		metrics = workload.run(conn, random.Random(1), LatencyRecorder())
+		assert conn.execute("PRAGMA journal_mode")[0][0] == expected
+		assert metrics["operations"] == 6
+	finally:
+		conn.close()
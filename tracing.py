@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import json
+import time
+import glob
+import functools
+import shutil
+import threading
+
+
+def main(argv):
+	## default values
+	trace_dir = os.path.join(os.path.abspath(os.getcwd()), Tracer.NAME_TRACE_FOLDER)
+	output = None
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"d:o:h",["tracedir=","output=","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(Tracer.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-d", "--tracedir"):
+			trace_dir = os.path.abspath(arg)
+		elif opt in ("-o", "--output"):
+			output = os.path.abspath(arg)
+		else:
+			print (help_str())
+			sys.exit(Tracer.EXIT_ERROR)
+
+	events = read_events(trace_dir)
+	if output is not None:
+		write_chrome_trace(output, events)
+	print_summary(events)
+
+
+class Tracer:
+	""" Times the phases of a campaign. Every finished span is appended as
+	a Chrome trace event ("X", complete event) to a file of its own process
+	in the trace folder, so that compile workers, which are separate
+	processes, are traced as well and nothing is lost if a campaign is
+	interrupted. Tracing is off until enable is called, and a span is
+	nearly free then """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	NAME_TRACE_FOLDER = 'trace'
+	NAME_TRACE_FILE = 'campaign-trace.json'
+	PREFIX_EVENTS_FILE = 'events-'
+
+	## tells processes that are not forked, e.g. with the spawn start method, where to trace to
+	ENV_TRACE_DIR = 'SQLITE_BMK_TRACE_DIR'
+
+	def __init__(self):
+		self.trace_dir = os.environ.get(Tracer.ENV_TRACE_DIR)
+		self.lock = threading.Lock()
+		self.events_file = None
+		self.pid = None
+
+
+	def enable(self, trace_dir):
+		""" starts tracing into trace_dir, removing the events of earlier runs """
+		if not os.path.exists(trace_dir):
+			os.makedirs(trace_dir)
+		for path in glob.glob(os.path.join(trace_dir, Tracer.PREFIX_EVENTS_FILE + "*")):
+			os.remove(path)
+		self.trace_dir = trace_dir
+		os.environ[Tracer.ENV_TRACE_DIR] = trace_dir
+
+	def is_enabled(self):
+		return self.trace_dir is not None
+
+	def span(self, name, category="phase", **args):
+		""" returns a context manager that traces the code it wraps """
+		if self.trace_dir is None:
+			return _NO_SPAN
+		return _Span(self, name, category, args)
+
+	@staticmethod
+	def clean(base_dir):
+		trace_dir = os.path.join(base_dir, Tracer.NAME_TRACE_FOLDER)
+		if os.path.exists(trace_dir):
+			shutil.rmtree(trace_dir)
+		trace_file = os.path.join(base_dir, Tracer.NAME_TRACE_FILE)
+		if os.path.exists(trace_file):
+			os.remove(trace_file)
+
+	def add_event(self, event):
+		with self.lock:
+			## a forked compile worker writes to a file of its own
+			if self.pid != os.getpid():
+				self.pid = os.getpid()
+				path = os.path.join(self.trace_dir, Tracer.PREFIX_EVENTS_FILE + str(self.pid) + ".jsonl")
+				self.events_file = open(path, 'a', buffering=1)
+			event["pid"] = self.pid
+			self.events_file.write(json.dumps(event, sort_keys=True) + "\n")
+
+
+class _Span:
+
+	def __init__(self, tracer, name, category, args):
+		self.tracer = tracer
+		self.name = name
+		self.category = category
+		self.args = args
+
+	def __enter__(self):
+		self.ts = time.time_ns() // 1000
+		self.start = time.perf_counter_ns()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		event = {}
+		event["name"] = self.name
+		event["cat"] = self.category
+		event["ph"] = "X"
+		event["ts"] = self.ts
+		event["dur"] = (time.perf_counter_ns() - self.start) // 1000
+		event["tid"] = threading.get_ident()
+		if exc_type is not None:
+			self.args["error"] = exc_type.__name__
+		if self.args:
+			event["args"] = self.args
+		self.tracer.add_event(event)
+		return False
+
+
+class _NoSpan:
+	""" the span of a disabled tracer """
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		return False
+
+
+_NO_SPAN = _NoSpan()
+
+## the tracer of this process
+TRACER = Tracer()
+
+
+def trace(name, category="phase", **args):
+	""" traces a phase: with trace("compile", config=name): ... """
+	return TRACER.span(name, category, **args)
+
+
+def traced(name):
+	""" decorator that traces every call of a function or method as phase
+	name, together with the config of the object it is called on """
+	def decorator(function):
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			if not TRACER.is_enabled():
+				return function(*args, **kwargs)
+			span_args = {}
+			config_name = getattr(args[0], "config_name", None) if args else None
+			if isinstance(config_name, str):
+				span_args["config"] = config_name
+			with TRACER.span(name, **span_args):
+				return function(*args, **kwargs)
+		return wrapper
+	return decorator
+
+
+def read_events(trace_dir):
+	""" returns the events of all processes, ordered by start time """
+	events = []
+	for path in glob.glob(os.path.join(trace_dir, Tracer.PREFIX_EVENTS_FILE + "*.jsonl")):
+		with open(path) as f:
+			for line in f:
+				## the last line of a killed process may be cut off
+				if line.endswith("\n"):
+					events.append(json.loads(line))
+	events.sort(key=lambda event: event["ts"])
+	return events
+
+
+def write_chrome_trace(path, events):
+	""" writes the events in the trace event format of chrome://tracing
+	and Perfetto """
+	with open(path, 'w') as f:
+		f.write(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, sort_keys=True))
+
+
+def get_summary(events):
+	""" returns per phase the number of spans and their total, mean and
+	maximum duration in seconds, and the wall time covered by all events """
+	phases = {}
+	for event in events:
+		phase = phases.setdefault(event["name"], {"count": 0, "total": 0.0, "max": 0.0})
+		duration = event["dur"] / 1e6
+		phase["count"] += 1
+		phase["total"] += duration
+		phase["max"] = max(phase["max"], duration)
+	for phase in phases.values():
+		phase["mean"] = phase["total"] / phase["count"]
+	wall = 0.0
+	if events:
+		wall = (max(event["ts"] + event["dur"] for event in events) - events[0]["ts"]) / 1e6
+	return (phases, wall)
+
+
+def print_summary(events):
+	""" prints the phases sorted by their total time. Phases nest, e.g.
+	execute contains the micro-workloads, so the shares add up to more than
+	100% """
+	phases, wall = get_summary(events)
+	print("__ trace summary, " + str(round(wall, 2)) + " s wall time __")
+	print("{:<24} {:>7} {:>11} {:>10} {:>10} {:>7}".format("phase", "count", "total s", "mean s", "max s", "wall"))
+	for name, phase in sorted(phases.items(), key=lambda item: -item[1]["total"]):
+		share = 100 * phase["total"] / wall if wall > 0 else 0.0
+		print("{:<24} {:>7} {:>11.3f} {:>10.3f} {:>10.3f} {:>6.1f}%".format(name, phase["count"], phase["total"],
+			phase["mean"], phase["max"], share))
+
+
+def help_str():
+	return "USAGE: tracing.py [-d tracedir] [-o campaign-trace.json]"
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+import sys
+import os
+import getopt
+import json
+import time
+import random
+from sqlite_lib import SQLiteLibrary, SQLiteError
+from metrics import LatencyRecorder, summarize_latencies, get_rusage_delta, get_thread_rusage
+from tracing import trace
+from storage import IOCounter
+
+
+def main(argv):
+	## default values
+	library_path = ''
+	work_dir = os.path.abspath(os.getcwd())
+	names = list(MICRO_WORKLOADS)
+	scale = WorkloadSuite.DEFAULT_SCALE
+	found_library = False
+
+	## first read terminal arguments
+	try:
+		opts, args = getopt.getopt(argv,"l:d:w:s:h",["library=","workdir=","workloads=","scale=","help"])
+	except getopt.GetoptError as err:
+		print(str(err))
+		print(help_str())
+		sys.exit(WorkloadSuite.EXIT_ERROR)
+	for opt, arg in opts:
+		if opt in ("-l", "--library"):
+			library_path = os.path.abspath(arg)
+			found_library = True
+		elif opt in ("-d", "--workdir"):
+			work_dir = os.path.abspath(arg)
+		elif opt in ("-w", "--workloads"):
+			names = parse_workloads(arg)
+		elif opt in ("-s", "--scale"):
+			scale = float(arg)
+		else:
+			print (help_str())
+			sys.exit(WorkloadSuite.EXIT_ERROR)
+
+	if not found_library:
+		print (help_str())
+		sys.exit(WorkloadSuite.EXIT_ERROR)
+
+	suite = WorkloadSuite(library_path, work_dir, names, scale=scale)
+	print(json.dumps(suite.run(), indent=4, sort_keys=True))
+
+
+class Workload:
+	""" A micro-workload run against a compiled libsqlite3.so. setup fills a
+	fresh database and is not timed; run does the measured work, records the
+	latency of its operations and returns its own metrics, at least the
+	number of operations. A workload is added to the suite by decorating it
+	with register_workload """
+	NAME = None
+
+	def __init__(self, scale=1.0, journal_mode=None):
+		self.scale = scale
+		## the journal mode the storage policy declares, if any
+		self.journal_mode = journal_mode
+
+
+	def size(self, n):
+		""" returns n scaled by the size of the suite, at least one """
+		return max(1, int(n * self.scale))
+
+	def setup(self, conn, rnd):
+		pass
+
+	def run(self, conn, rnd, recorder):
+		raise NotImplementedError
+
+	def timed(self, recorder, conn, sql, params=()):
+		""" runs a statement and records its latency """
+		start = time.perf_counter_ns()
+		rows = conn.execute(sql, params)
+		recorder.record(self.NAME, time.perf_counter_ns() - start)
+		return rows
+
+
+## all known workloads by name, in the order they run
+WORKLOADS = {}
+
+## the TPC-C workload, which runs through py-tpcc or the in-process driver
+TPCC = "tpcc"
+
+
+def register_workload(cls):
+	""" class decorator that makes a workload selectable by its NAME """
+	WORKLOADS[cls.NAME] = cls
+	return cls
+
+
+@register_workload
+class BulkInsertWorkload(Workload):
+	""" inserts many rows into an indexed table in one transaction """
+	NAME = "bulk-insert"
+
+	def setup(self, conn, rnd):
+		conn.executescript("CREATE TABLE t (id INTEGER PRIMARY KEY, k INTEGER, v TEXT); CREATE INDEX t_k ON t (k);")
+		## the rows are made up here, so that only sqlite is timed
+		num_rows = self.size(50000)
+		self.rows = [(i, rnd.randrange(num_rows), random_text(rnd, 100)) for i in range(num_rows)]
+
+	def run(self, conn, rnd, recorder):
+		conn.executescript("BEGIN")
+		for row in self.rows:
+			self.timed(recorder, conn, "INSERT INTO t VALUES (?, ?, ?)", row)
+		conn.executescript("COMMIT")
+		return {"operations": len(self.rows)}
+
+
+@register_workload
+class PointLookupWorkload(Workload):
+	""" looks up single rows by their primary key """
+	NAME = "point-lookup"
+
+	def setup(self, conn, rnd):
+		self.rows = fill_table(conn, rnd, self.size(50000))
+
+	def run(self, conn, rnd, recorder):
+		lookups = self.size(20000)
+		found = 0
+		for i in range(lookups):
+			found += len(self.timed(recorder, conn, "SELECT v FROM t WHERE id = ?", (rnd.randrange(self.rows),)))
+		return {"operations": lookups, "rows": found}
+
+
+@register_workload
+class RangeScanWorkload(Workload):
+	""" scans ranges of an index, one percent of the table at a time """
+	NAME = "range-scan"
+
+	def setup(self, conn, rnd):
+		self.rows = fill_table(conn, rnd, self.size(50000))
+
+	def run(self, conn, rnd, recorder):
+		scans = self.size(500)
+		width = max(1, self.rows // 100)
+		scanned = 0
+		for i in range(scans):
+			low = rnd.randrange(self.rows)
+			scanned += self.timed(recorder, conn, "SELECT count(*), sum(length(v)) FROM t WHERE k BETWEEN ? AND ?",
+				(low, low + width))[0][0]
+		return {"operations": scans, "rows": scanned}
+
+
+@register_workload
+class SortWorkload(Workload):
+	""" sorts and groups a table that has no index for it and copies it
+	sorted into a temp table, which stresses the sorter and temp storage """
+	NAME = "sort"
+
+	def setup(self, conn, rnd):
+		self.rows = fill_table(conn, rnd, self.size(100000))
+
+	def run(self, conn, rnd, recorder):
+		self.timed(recorder, conn, "CREATE TEMP TABLE sorted AS SELECT * FROM t ORDER BY v")
+		self.timed(recorder, conn, "SELECT v FROM t ORDER BY v LIMIT 1 OFFSET ?", (self.rows - 1,))
+		self.timed(recorder, conn, "SELECT k % 1000, count(*), max(v) FROM t GROUP BY 1")
+		self.timed(recorder, conn, "SELECT count(DISTINCT substr(v, 1, 8)) FROM sorted")
+		self.timed(recorder, conn, "CREATE INDEX temp.sorted_v ON sorted (v)")
+		self.timed(recorder, conn, "DROP TABLE sorted")
+		return {"operations": 6, "rows": self.rows}
+
+
+@register_workload
+class FullTextWorkload(Workload):
+	""" full-text queries on an FTS4 table (needs SQLITE_ENABLE_FTS3) """
+	NAME = "fts"
+	VOCABULARY = 2000
+
+	def setup(self, conn, rnd):
+		conn.executescript("CREATE VIRTUAL TABLE docs USING fts4(body)")
+		conn.executescript("BEGIN")
+		for i in range(self.size(5000)):
+			words = [get_word(rnd.randrange(FullTextWorkload.VOCABULARY)) for w in range(50)]
+			conn.execute("INSERT INTO docs (body) VALUES (?)", (" ".join(words),))
+		conn.executescript("COMMIT")
+
+	def run(self, conn, rnd, recorder):
+		queries = self.size(1000)
+		matches = 0
+		for i in range(queries):
+			terms = [get_word(rnd.randrange(FullTextWorkload.VOCABULARY)) for t in range(1 + i % 3)]
+			if i % 3 == 2:
+				query = '"' + " ".join(terms[:2]) + '"'
+			else:
+				query = " ".join(terms)
+			matches += self.timed(recorder, conn, "SELECT count(*) FROM docs WHERE docs MATCH ?", (query,))[0][0]
+		return {"operations": queries, "rows": matches}
+
+
+@register_workload
+class RTreeWorkload(Workload):
+	""" window queries on an R-tree index (needs SQLITE_ENABLE_RTREE) """
+	NAME = "rtree"
+
+	def setup(self, conn, rnd):
+		conn.executescript("CREATE VIRTUAL TABLE boxes USING rtree(id, min_x, max_x, min_y, max_y)")
+		conn.executescript("BEGIN")
+		for i in range(self.size(20000)):
+			x = rnd.uniform(0, 1000)
+			y = rnd.uniform(0, 1000)
+			conn.execute("INSERT INTO boxes VALUES (?, ?, ?, ?, ?)", (i, x, x + rnd.uniform(0, 5), y, y + rnd.uniform(0, 5)))
+		conn.executescript("COMMIT")
+
+	def run(self, conn, rnd, recorder):
+		queries = self.size(2000)
+		found = 0
+		for i in range(queries):
+			x = rnd.uniform(0, 980)
+			y = rnd.uniform(0, 980)
+			found += self.timed(recorder, conn, "SELECT count(*) FROM boxes WHERE max_x >= ? AND min_x <= ? AND "
+				"max_y >= ? AND min_y <= ?", (x, x + 20, y, y + 20))[0][0]
+		return {"operations": queries, "rows": found}
+
+
+@register_workload
+class FsyncWorkload(Workload):
+	""" many small transactions that each commit (and sync) on their own,
+	first with the rollback journal and then in WAL mode. This is where the
+	default synchronous settings show. A journal mode declared by the
+	storage policy is kept for all of them """
+	NAME = "fsync"
+
+	def setup(self, conn, rnd):
+		conn.executescript("CREATE TABLE log (id INTEGER PRIMARY KEY, v TEXT)")
+
+	def run(self, conn, rnd, recorder):
+		commits = self.size(300)
+		for i in range(commits):
+			self.timed(recorder, conn, "INSERT INTO log (v) VALUES (?)", (random_text(rnd, 50),))
+		if self.journal_mode is None:
+			conn.execute("PRAGMA journal_mode=WAL")
+		for i in range(commits):
+			self.timed(recorder, conn, "UPDATE log SET v = ? WHERE id = ?", (random_text(rnd, 50), rnd.randint(1, commits)))
+		if self.journal_mode is not None:
+			return {"operations": 2 * commits, "commits": 2 * commits, "journal_mode": self.journal_mode}
+		return {"operations": 2 * commits, "journal_commits": commits, "wal_commits": commits}
+
+
+## the built-in workloads besides TPC-C
+MICRO_WORKLOADS = list(WORKLOADS)
+
+
+class WorkloadSuite:
+	""" Runs a selection of workloads against one libsqlite3.so. Every
+	workload gets a fresh database in work_dir, so they do not influence
+	each other. A workload the build does not support, e.g. an R-tree query
+	without SQLITE_ENABLE_RTREE, is reported as skipped. A storage policy
+	sets the pragmas of every connection and the page cache state of the
+	database between setup and the timed run """
+	## exit flags
+	EXIT_SUCCESS = 0
+	EXIT_ERROR = 2
+
+	DEFAULT_SCALE = 1.0
+	DEFAULT_SEED = 42
+
+
+	def __init__(self, library_path, work_dir, names, scale=DEFAULT_SCALE, seed=DEFAULT_SEED, storage=None):
+		self.library_path = library_path
+		self.work_dir = work_dir
+		self.names = names
+		self.scale = scale
+		self.seed = seed
+		self.storage = storage
+
+
+	def run(self):
+		""" runs all selected workloads and returns their metrics by name """
+		library = SQLiteLibrary(self.library_path)
+		journal_mode = self.storage.journal_mode if self.storage is not None else None
+		results = {}
+		for name in self.names:
+			with trace("workload-" + name):
+				results[name] = self.run_workload(library, WORKLOADS[name](self.scale, journal_mode=journal_mode))
+		return results
+
+	def run_workload(self, library, workload):
+		""" sets up and runs a single workload on a fresh database """
+		db_path = os.path.join(self.work_dir, "workload-" + workload.NAME + ".db")
+		remove_database(db_path)
+		conn = self.connect(library, db_path)
+		rnd = random.Random(self.seed)
+		try:
+			try:
+				workload.setup(conn, rnd)
+			except SQLiteError as err:
+				print("skipping workload " + workload.NAME + ": " + str(err))
+				return {"skipped": str(err)}
+			## a new connection does not bring the pages of setup along
+			if self.storage is not None and self.storage.cache is not None:
+				conn.close()
+				self.storage.set_cache_state(db_path)
+				conn = self.connect(library, db_path)
+			recorder = LatencyRecorder()
+			io_counter = IOCounter()
+			io_counter.start()
+			rusage_before = get_thread_rusage()
+			start = time.perf_counter_ns()
+			try:
+				metrics = workload.run(conn, rnd, recorder)
+			except SQLiteError as err:
+				io_counter.stop()
+				print("workload " + workload.NAME + " failed: " + str(err))
+				return {"failed": str(err)}
+			duration_ns = time.perf_counter_ns() - start
+			rusage_after = get_thread_rusage()
+			io = io_counter.stop()
+		finally:
+			conn.close()
+			remove_database(db_path)
+
+		metrics["duration_ns"] = duration_ns
+		metrics["operations_per_second"] = metrics["operations"] / (duration_ns / 1e9) if duration_ns > 0 else 0.0
+		metrics["latency_ns"] = summarize_latencies(recorder.latencies.get(workload.NAME, []))
+		metrics["rusage"] = get_rusage_delta(rusage_before, rusage_after)
+		if self.storage is not None:
+			metrics["io"] = io
+		return metrics
+
+	def connect(self, library, db_path):
+		conn = library.connect(db_path)
+		if self.storage is not None:
+			self.storage.apply_pragmas(conn)
+		return conn
+
+
+def fill_table(conn, rnd, rows):
+	""" creates table t with rows rows and an index on k, returns rows """
+	conn.executescript("CREATE TABLE t (id INTEGER PRIMARY KEY, k INTEGER, v TEXT); CREATE INDEX t_k ON t (k);")
+	conn.executescript("BEGIN")
+	for i in range(rows):
+		conn.execute("INSERT INTO t VALUES (?, ?, ?)", (i, rnd.randrange(rows), random_text(rnd, 100)))
+	conn.executescript("COMMIT")
+	return rows
+
+
+def random_text(rnd, length):
+	return "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz") for i in range(length))
+
+
+def get_word(n):
+	""" returns the n-th word of a made up vocabulary """
+	word = ""
+	n += 1
+	while n > 0:
+		n, letter = divmod(n - 1, 26)
+		word += "abcdefghijklmnopqrstuvwxyz"[letter]
+	return word + "x"
+
+
+def remove_database(db_path):
+	for path in (db_path, db_path + "-journal", db_path + "-wal", db_path + "-shm"):
+		if os.path.exists(path):
+			os.remove(path)
+
+
+def parse_workloads(arg):
+	""" parses a comma separated list of workload names; "micro" stands
+	for all built-in micro-workloads """
+	names = []
+	for name in arg.split(","):
+		name = name.strip()
+		if name == "micro":
+			names += MICRO_WORKLOADS
+		elif name == TPCC or name in WORKLOADS:
+			names.append(name)
+		else:
+			raise ValueError("unknown workload " + name + ", use tpcc, micro or one of " + ", ".join(WORKLOADS))
+	return names
+
+
+def help_str():
+	return "USAGE: workloads.py -l libsqlite3.so [-d workdir] [-w " + ",".join(MICRO_WORKLOADS) + "] [-s scale]"
+
+
+if __name__ == "__main__":
+   main(sys.argv[1:])